@@ -1,5 +1,7 @@
 from . import imperfections
 from .abaqus_i_coupling_writer import AbaqusICouplingWriter
+from .abaqus_inp_writer import AbaqusMergedInpWriter
 from .component_reader import AbaqusInpToComponentReader
+from .model_session import ModelSession
 from .processing import gen_aba_couples_imperfections, gen_aba_couples, gen_aba_imperfections
 from .dir_maker import dir_maker
@@ -1,18 +1,23 @@
-import os
 from .abaqus_writer import AbaqusWriter
+from .compressed_io import open_text
 
 
 class AbaqusLinearCouplingWriter(AbaqusWriter):
     """ Writes the constraints for using in an Abaqus input file. """
 
-    def __init__(self, output_dir, input_path_prepend=''):
+    def __init__(self, output_dir, input_path_prepend='', num_shards=None, compression=None):
         """ Constructor.
         :param str output_dir: Directory where files will be saved.
         :param str input_path_prepend: String prepended to the input specification in the keyword line.
+        :param int num_shards: If not None, the equations are written to this number of data files.
+        :param str compression: If not None, the keyword and data files are compressed, 'gzip' or 'xz'.
 
         Notes:
             - Writes one file containing all they keywords to be added to the input file.
             - Writes one file per keyword containing the data lines.
+            - By default, there is one keyword and one data file per constraint equation.
+            If num_shards is specified, the equations are split in order over num_shards data files, and there is one
+            keyword per data file (e.g., num_shards=1 writes all the equations under a single *Equation keyword).
             - Deletes any previous data or keyword files in the output directory upon construction.
             - If input_path_prepend is not empty, then the keyword line is modified as follows:
                 *Equation, input=<input_path_prepend><filename>
@@ -20,9 +25,11 @@ class AbaqusLinearCouplingWriter(AbaqusWriter):
                 *Equation, input=constr_files/<filename>
             This parameter is useful to specify the absolute path of the files or a relative path to the
             Abaqus working directory.
+            - With compression, the keyword lines reference the data files by their decompressed names.
         """
-        AbaqusWriter.__init__(self, output_dir)
+        AbaqusWriter.__init__(self, output_dir, compression)
         self.input_path_prepend = input_path_prepend
+        self.num_shards = num_shards
         self.DATAFILE_BASE = 'Constr_Eqn_Def_'
         self.KEYWFILE_BASE = 'Equation_Keywords.txt'
         self._clear_output()
@@ -36,38 +43,74 @@ class AbaqusLinearCouplingWriter(AbaqusWriter):
             - The keywords that need to be added are written in a single file.
             - The written files contain the data lines used in the analysis are written to separate files.
         """
+        if self.num_shards is not None:
+            self._write_shards(couplings)
+            return
         file_list = []
         constraint_num = 0
         for couple in couplings:
-            for constraint in couple.constraints:
+            for equation in self._iter_equation_strings(couple):
                 # todo: make the filename based on the node and DOF
                 filename = self.DATAFILE_BASE + str(constraint_num) + '.txt'
-                filepath = os.path.join(self.output_dir, filename)
+                filepath = self._output_path(filename)
                 file_list.append(self.input_path_prepend + filename)
-                self._constraint_file_writer(constraint, filepath)
+                with open_text(filepath, 'w') as f:
+                    f.write(equation)
                 constraint_num += 1
-        keyword_file = os.path.join(self.output_dir, self.KEYWFILE_BASE)
+        keyword_file = self._output_path(self.KEYWFILE_BASE)
         self._keyword_file_writer(file_list, keyword_file)
         return
 
-    def _constraint_file_writer(self, constraint, file):
-        """ Writes the data lines for the *EQUATION keyword for a given constraint.
-        :param Constraint constraint: The constraint to write.
-        :param str file: Full path to the file to write.
+    def _write_shards(self, couplings):
+        """ Writes the equations of all the couplings to num_shards data files.
+        :param list couplings: [Coupling] The couplings to be written to file.
         """
-        def term_string(t):
-            return ', '.join([str(t.node), str(t.dof), str(t.coef)]) + '\n'
-        with open(file, 'w') as f:
-            f.write(str(len(constraint.terms)) + '\n')
-            for term in constraint.terms:
-                f.write(term_string(term))
+        num_constraints = sum(len(couple.constraint_table) for couple in couplings)
+        num_shards = max(1, min(self.num_shards, num_constraints))
+        file_list = []
+        shard = -1
+        f = None
+        constraint_num = 0
+        try:
+            for couple in couplings:
+                for equation in self._iter_equation_strings(couple):
+                    # Contiguous blocks of equations are written to each shard
+                    constraint_shard = constraint_num * num_shards // num_constraints
+                    if constraint_shard != shard:
+                        if f is not None:
+                            f.close()
+                        shard = constraint_shard
+                        filename = self.DATAFILE_BASE + str(shard) + '.txt'
+                        file_list.append(self.input_path_prepend + filename)
+                        f = open_text(self._output_path(filename), 'w', buffering=2 ** 20)
+                    f.write(equation)
+                    constraint_num += 1
+        finally:
+            if f is not None:
+                f.close()
+        keyword_file = self._output_path(self.KEYWFILE_BASE)
+        self._keyword_file_writer(file_list, keyword_file)
         return
 
+    def _iter_equation_strings(self, couple):
+        """ Yields the data lines of the *Equation keyword for each equation of the coupling.
+        :param BSCoupling couple: The coupling to write, its constraint table is used.
+        :return generator: (str) Number of terms followed by the node, DOF, and coefficient of each term.
+        """
+        table = couple.constraint_table
+        bounds = table.bounds().tolist()
+        terms = table.terms
+        # repr of a float is the same as str
+        lines = ['%d, %d, %r\n' % row for row in zip(terms['node'].tolist(), terms['dof'].tolist(),
+                                                    terms['coef'].tolist())]
+        for i in range(len(table)):
+            yield '{0}\n'.format(bounds[i + 1] - bounds[i]) + ''.join(lines[bounds[i]:bounds[i + 1]])
+
     def _keyword_file_writer(self, constraint_files, file):
         """ Writes the keyword file. """
         def keyword_string(input):
             return '*Equation, input=' + input + '\n'
-        with open(file, 'w') as f:
+        with open_text(file, 'w') as f:
             for c in constraint_files:
                 f.write(keyword_string(c))
         return
@@ -1,68 +1,166 @@
 import os
 from .abaqus_writer import AbaqusWriter
 from .abaqus_writer import AbaqusNonLinearCouplingWriter
+from .compressed_io import open_text
+
+# Buffer size of the keyword file
+WRITE_BUFFER_SIZE = 2 ** 20
+# Number of characters copied at a time from an existing data file
+COPY_BLOCK_SIZE = 2 ** 20
+
+
+def _copy_text(f_in, f_out, n_chars):
+    """ Copies the first n_chars characters of f_in to f_out, in blocks. """
+    while n_chars > 0:
+        block = f_in.read(min(n_chars, COPY_BLOCK_SIZE))
+        if not block:
+            break
+        f_out.write(block)
+        n_chars -= len(block)
+    return
 
 
 class AbaqusICouplingWriter(AbaqusNonLinearCouplingWriter):
     """ Writes the keywords for insertion from a set of ICoupling's. """
 
-    def __init__(self, output_dir):
-        AbaqusWriter.__init__(self, output_dir)
-        self.KEYWFILE_BASE = 'MPC_Keywords.txt'
+    def __init__(self, output_dir, compact_mpc=False, external_data=False, input_path_prepend='', compression=None,
+                 keyword_file_base='MPC_Keywords.txt', data_file_base='WIKC_Data_'):
+        """ Constructor.
+        :param str output_dir: Directory where files will be saved.
+        :param bool compact_mpc: If True, all the MPCs of a coupling are defined under a single *MPC keyword.
+        :param bool external_data: If True, the *MPC and *Field data lines are written to separate data files.
+        :param str input_path_prepend: String prepended to the input specification in the keyword line.
+        :param str compression: If not None, the keyword and data files are compressed, 'gzip' or 'xz'.
+        :param str keyword_file_base: Name of the keyword file.
+        :param str data_file_base: Prefix of the names of the data files, existing files with this prefix are removed.
+
+        Notes:
+            - The keyword file is streamed to disk section by section, the lines are not kept in memory.
+            - With compact_mpc=False, each continuum node has its own *MPC keyword.
+            - If external_data is True, there is one data file per keyword, referenced in the keyword line as:
+                *MPC, MODE=NODE, USER, input=<input_path_prepend><filename>
+            The MPCs of each coupling are defined under a single *MPC keyword in this case.
+            Data files are only re-written if their contents change, so unchanged files are kept across runs.
+            See AbaqusLinearCouplingWriter for the use of input_path_prepend.
+            - With compression, the keyword lines reference the data files by their decompressed names.
+        """
+        AbaqusWriter.__init__(self, output_dir, compression)
+        self.KEYWFILE_BASE = keyword_file_base
+        self.DATAFILE_BASE = data_file_base
         self.JTYPE_DEFAULT = 0
-        self._clear_output()
+        self.compact_mpc = compact_mpc
+        self.external_data = external_data
+        self.input_path_prepend = input_path_prepend
+        self._data_files = set()
+        self._clear_output(clear_data=not external_data)
         return
 
     def write(self, couplings):
         """ Writes the coupling to file for insertion to the input file. 
         :param list couplings: [ICoupling] Couplings to write to file.
         """
-        field_strings = []
-        mpc_strings = []
-        field_dir_strings = []
-        all_normals = dict()
-        for couple in couplings:
-            jtype = self._gen_jtype(couple)
-            beam_node = list(couple.beam_node.keys())[0]
-            shell_node_ids = list(couple.continuum_nodes.keys())
-            warping_values = couple.warping_fun
-            field_strings += self._gen_field_strings(warping_values)
-            mpc_strings += self._gen_mpc_strings(beam_node, shell_node_ids, jtype)
-            all_normals[beam_node] = couple.normal_direction
-        # Write the strings
-        amp_strings = self._gen_amp_strings()
-        field_dir_strings = self._gen_dir_field_strings(all_normals)
-        self._write_keyw_file(field_strings, mpc_strings, amp_strings, field_dir_strings)
-        return
-
-    def _write_keyw_file(self, field_strings, mpc_strings, amp_strings, normal_strings):
-        """ Writes the file containing the keyword additions. """
-        keyw_file = os.path.join(self.output_dir, self.KEYWFILE_BASE)
-        with open(keyw_file, 'w') as file:
+        keyw_file = self._output_path(self.KEYWFILE_BASE)
+        self._data_files = set()
+        with open_text(keyw_file, 'w', buffering=WRITE_BUFFER_SIZE) as file:
             file.write('** MPC Keywords\n** Copy these in the model definition\n')
-            file.writelines(mpc_strings)
+            file.writelines(self._iter_mpc_lines(couplings))
             file.write('\n\n** Amplitude Keyword\n** Copy these in the model definition\n')
-            file.writelines(amp_strings)
+            file.writelines(self._gen_amp_strings())
             file.write('\n\n** Field Keywords\n** Copy these in the first step\n')
-            file.writelines(field_strings)
+            file.writelines(self._iter_field_lines(couplings))
             file.write('\n\n** Normal Direction Field Keywords\n** Copy these in the first step\n')
-            file.writelines(normal_strings)
+            file.writelines(self._iter_dir_field_lines(couplings))
+        self._remove_stale_data_files()
         return
 
-    def _gen_dir_field_strings(self, normal_directions):
-        """ Returns the strings that define the initial cross-section normal directions at each beam node. """
-        direc_1_strings = []
-        direc_2_strings = []
-        direc_3_strings = []
-        for node, d in normal_directions.items():
-            direc_1_strings.append(', '.join([str(node), str(d[0]) + '\n']))
-            direc_2_strings.append(', '.join([str(node), str(d[1]) + '\n']))
-            direc_3_strings.append(', '.join([str(node), str(d[2]) + '\n']))
-        strings = []
-        strings.append(', '.join(['*Field', 'variable=2', 'amplitude=warp_fun_amp\n']))
-        strings += direc_1_strings
-        strings.append(', '.join(['*Field', 'variable=3', 'amplitude=warp_fun_amp\n']))
-        strings += direc_2_strings
-        strings.append(', '.join(['*Field', 'variable=4', 'amplitude=warp_fun_amp\n']))
-        strings += direc_3_strings
-        return strings
+    def _iter_mpc_lines(self, couplings):
+        """ Yields the lines of the MPC keywords for all the couplings. """
+        mpc_keyw = ', '.join(['*MPC', 'MODE=NODE', 'USER\n'])
+        for k, couple in enumerate(couplings):
+            jtype = str(self._gen_jtype(couple))
+            beam_node = str(couple.beam_id)
+            data = (', '.join([jtype, str(node), beam_node + '\n']) for node in couple.continuum_nodes.ids.tolist())
+            if self.external_data:
+                yield self._external_keyword(mpc_keyw, 'MPC_{0}.txt'.format(k), data)
+            elif self.compact_mpc:
+                yield mpc_keyw
+                yield from data
+            else:
+                for line in data:
+                    yield mpc_keyw
+                    yield line
+
+    def _iter_field_lines(self, couplings):
+        """ Yields the lines of the warping function field keywords for all the couplings. """
+        field_keyw = ', '.join(['*Field', 'variable=1', 'amplitude=warp_fun_amp\n'])
+        for k, couple in enumerate(couplings):
+            data = (', '.join([str(node), str(val) + '\n'])
+                    for node, val in zip(couple.continuum_nodes.ids.tolist(), couple.warping_fun.tolist()))
+            if self.external_data:
+                yield self._external_keyword(field_keyw, 'Warp_{0}.txt'.format(k), data)
+            else:
+                yield field_keyw
+                yield from data
+
+    def _iter_dir_field_lines(self, couplings):
+        """ Yields the lines that define the initial cross-section normal directions at each beam node. """
+        normal_directions = dict()
+        for couple in couplings:
+            normal_directions[couple.beam_id] = couple.normal_direction
+        for i in range(3):
+            field_keyw = ', '.join(['*Field', 'variable={0}'.format(i + 2), 'amplitude=warp_fun_amp\n'])
+            data = (', '.join([str(node), str(d[i]) + '\n']) for node, d in normal_directions.items())
+            if self.external_data:
+                yield self._external_keyword(field_keyw, 'Normal_{0}.txt'.format(i + 2), data)
+            else:
+                yield field_keyw
+                yield from data
+
+    def _external_keyword(self, keyword_line, name, data_lines):
+        """ Writes the data lines to a data file and returns the keyword line that references it.
+        :param str keyword_line: Keyword line without the input option, ends with a new line.
+        :param str name: Name of the data file, prepended by DATAFILE_BASE.
+        :param iterable data_lines: [str] Data lines of the keyword.
+
+        Notes:
+            - The lines are compared with the existing data file while they are generated, the file is kept if they
+            are the same. Otherwise, the part that is the same is copied from the existing file to a temporary file,
+            the remaining lines are written after it, and the temporary file replaces the existing file.
+        """
+        filename = self.DATAFILE_BASE + name
+        filepath = self._output_path(filename)
+        data_lines = iter(data_lines)
+        # Characters at the start that are the same as the existing file, and the first line that differs
+        n_same = 0
+        line = None
+        is_same = False
+        if os.path.isfile(filepath):
+            with open_text(filepath, 'r') as f:
+                for line in data_lines:
+                    if f.read(len(line)) != line:
+                        break
+                    n_same += len(line)
+                else:
+                    line = None
+                    is_same = f.read(1) == ''
+        if not is_same:
+            tmp_path = self._output_path(filename + '.tmp')
+            with open_text(tmp_path, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+                if n_same > 0:
+                    with open_text(filepath, 'r') as f_old:
+                        _copy_text(f_old, f, n_same)
+                if line is not None:
+                    f.write(line)
+                f.writelines(data_lines)
+            os.replace(tmp_path, filepath)
+        self._data_files.add(os.path.basename(filepath))
+        return keyword_line[:-1] + ', input=' + self.input_path_prepend + filename + '\n'
+
+    def _remove_stale_data_files(self):
+        """ Removes the data files from previous runs that were not written in this run. """
+        if not self.external_data:
+            return
+        for f in os.listdir(self.output_dir):
+            if f[:len(self.DATAFILE_BASE)] == self.DATAFILE_BASE and f not in self._data_files:
+                os.remove(os.path.join(self.output_dir, f))
+        return
@@ -0,0 +1,136 @@
+import os
+from .abaqus_i_coupling_writer import AbaqusICouplingWriter, WRITE_BUFFER_SIZE
+from .compressed_io import open_text, strip_compression
+from .inp_include import include_path
+
+# Prefix of the data files referenced by the new input file
+DATA_FILE_BASE = 'WIKC_Inp_Data_'
+
+
+def _keyword(line):
+    """ Returns the lower-case keyword of a keyword line, '' for data and comment lines. """
+    li = line.strip()
+    if li[:1] != '*' or li[:2] == '**':
+        return ''
+    return li.split(',')[0].strip().lower()
+
+
+def _include_line(line, including_file, output_dir):
+    """ Returns the *Include line with its input file given relative to the output directory.
+    :param str line: *Include keyword line.
+    :param str including_file: Path to the file that contains the line.
+    :param str output_dir: Directory of the new input file.
+    """
+    l_list = line.rstrip('\r\n').split(',')
+    for i, li in enumerate(l_list[1:], 1):
+        opt = li.split('=', 1)
+        if len(opt) == 2 and opt[0].strip().lower() == 'input':
+            file_name = include_path(including_file, opt[1])
+            try:
+                file_name = os.path.relpath(file_name, os.path.abspath(output_dir))
+            except ValueError:
+                # Different drives (Windows), keep the absolute path
+                pass
+            if opt[1].strip()[:1] in ['"', "'"]:
+                file_name = '"{0}"'.format(file_name)
+            l_list[i] = ' input={0}'.format(file_name)
+    return ','.join(l_list) + '\n'
+
+
+class AbaqusMergedInpWriter(AbaqusICouplingWriter):
+    """ Writes a copy of an input file with the coupling and imperfection keywords added. """
+
+    def __init__(self, output_dir, inp_file, imperfection_input=None, compact_mpc=False, external_data=False,
+                 input_path_prepend='', compression=None):
+        """ Constructor.
+        :param str output_dir: Directory where files will be saved.
+        :param str inp_file: Path to the Abaqus input file that defines the model.
+        :param str imperfection_input: If not None, adds *Imperfection, input=<imperfection_input> to the model.
+        :param bool compact_mpc: If True, all the MPCs of a coupling are defined under a single *MPC keyword.
+        :param bool external_data: If True, the *MPC and *Field data lines are written to separate data files.
+        :param str input_path_prepend: String prepended to the input specification of the data files.
+        :param str compression: If not None, the new input file and the data files are compressed, 'gzip' or 'xz'.
+
+        Notes:
+            - The new input file is named <inp_file name>-WIKC.inp, the input file can be compressed.
+            - The input file is streamed through once, it is never fully loaded in memory.
+            - The keywords are added at the following locations:
+                *MPC: before *End Assembly if there is an assembly, otherwise before the first *Step.
+                *Amplitude and *Imperfection: before the first *Step.
+                *Field: before the *End Step of the first step.
+            - The input file should not already contain the keywords added by pywikc.
+            - The input files of *Include keywords are written relative to output_dir, so the new input file refers to
+            the same files as the input file. The included files are not copied or changed, so the first step needs to
+            be in the input file itself.
+            - See AbaqusICouplingWriter for the external data files. The data files are prefixed by DATA_FILE_BASE,
+            so the data files of an AbaqusICouplingWriter in the same directory are kept.
+        """
+        file_name = strip_compression(os.path.basename(os.path.normpath(inp_file)))
+        super().__init__(output_dir, compact_mpc, external_data, input_path_prepend, compression,
+                         keyword_file_base=os.path.splitext(file_name)[0] + '-WIKC.inp', data_file_base=DATA_FILE_BASE)
+        self.inp_file = inp_file
+        self.imperfection_input = imperfection_input
+        return
+
+    def write(self, couplings):
+        """ Writes the input file with the coupling keywords.
+        :param list couplings: [ICoupling] Couplings to add to the input file.
+        :return str: Path to the new input file.
+        """
+        out_file = self._output_path(self.KEYWFILE_BASE)
+        mpc_written = False
+        step_count = 0
+        fields_written = False
+        has_includes = False
+        self._data_files = set()
+        with open_text(self.inp_file, 'r') as inp, open_text(out_file, 'w', buffering=WRITE_BUFFER_SIZE) as out:
+            for line in inp:
+                keyword = _keyword(line)
+                if keyword == '*end assembly' and not mpc_written:
+                    self._write_mpc(out, couplings)
+                    mpc_written = True
+                elif keyword == '*step':
+                    step_count += 1
+                    if step_count == 1:
+                        if not mpc_written:
+                            self._write_mpc(out, couplings)
+                            mpc_written = True
+                        self._write_model_data(out)
+                elif keyword == '*end step' and step_count == 1 and not fields_written:
+                    self._write_fields(out, couplings)
+                    fields_written = True
+                elif keyword == '*include':
+                    line = _include_line(line, self.inp_file, self.output_dir)
+                    has_includes = True
+                out.write(line)
+        self._remove_stale_data_files()
+        if not fields_written:
+            os.remove(out_file)
+            if has_includes:
+                raise ValueError('No *Step and *End Step found in {0}, steps in files added with *Include are not '
+                                 'supported. Move the first step to the input file.'.format(self.inp_file))
+            raise ValueError('No *Step found in {0}, the keywords could not be added.'.format(self.inp_file))
+        return out_file
+
+    def _write_mpc(self, out, couplings):
+        """ Writes the MPC keywords. """
+        out.write('** MPC Keywords (pywikc)\n')
+        out.writelines(self._iter_mpc_lines(couplings))
+        return
+
+    def _write_model_data(self, out):
+        """ Writes the amplitude and imperfection keywords. """
+        out.write('** Amplitude Keyword (pywikc)\n')
+        out.writelines(self._gen_amp_strings())
+        if self.imperfection_input is not None:
+            out.write('** Imperfection Keyword (pywikc)\n')
+            out.write('*Imperfection, input={0}\n'.format(self.imperfection_input))
+        return
+
+    def _write_fields(self, out, couplings):
+        """ Writes the warping function and normal direction field keywords. """
+        out.write('** Field Keywords (pywikc)\n')
+        out.writelines(self._iter_field_lines(couplings))
+        out.write('** Normal Direction Field Keywords (pywikc)\n')
+        out.writelines(self._iter_dir_field_lines(couplings))
+        return
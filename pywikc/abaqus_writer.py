@@ -1,16 +1,25 @@
 import os
+from .compressed_io import compressed_name, COMPRESSION_EXTENSIONS
+from .constraint import TERM_SHELL, TERM_WARPING
 
 
 class AbaqusWriter:
 
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, compression=None):
         """ Constructor.
         :param str output_dir: Directory where files will be saved.
+        :param str compression: If not None, the output files are compressed, 'gzip' or 'xz'.
 
         Notes:
             - Implementations should overwrite self.KEYWFILE_BASE and self.DATAFILE_BASE to use these parameters.
+            - Compressed files have the .gz or .xz extension appended to their names. Abaqus only reads plain text
+            files, so compressed output needs to be decompressed before it is used in an analysis.
         """
+        if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError('Unknown compression {0}, use one of {1}.'.format(compression,
+                                                                             list(COMPRESSION_EXTENSIONS.keys())))
         self.output_dir = output_dir
+        self.compression = compression
         self.KEYWFILE_BASE = 'NOT IMPLEMENTED'
         self.DATAFILE_BASE = 'NOT IMPLEMENTED'
         return
@@ -22,12 +31,19 @@ class AbaqusWriter:
         raise NotImplementedError('write not implemented')
         return
 
-    def _clear_output(self):
-        # Clear any existing files written in the output directory
+    def _output_path(self, file_name):
+        """ Returns the path of an output file, with the compression extension if compression is used. """
+        return os.path.join(self.output_dir, compressed_name(file_name, self.compression))
+
+    def _clear_output(self, clear_data=True):
+        """ Clears any existing files written in the output directory.
+        :param bool clear_data: If False, only the keyword files are removed.
+        """
         file_list = os.listdir(self.output_dir)
         for f in file_list:
             # todo: make this clearing more robust - will raise an index error if have short file names
-            if f[:len(self.DATAFILE_BASE)] == self.DATAFILE_BASE or f[:len(self.KEYWFILE_BASE)] == self.KEYWFILE_BASE:
+            is_data = f[:len(self.DATAFILE_BASE)] == self.DATAFILE_BASE
+            if (is_data and clear_data) or f[:len(self.KEYWFILE_BASE)] == self.KEYWFILE_BASE:
                 os.remove(os.path.join(self.output_dir, f))
         return
 
@@ -43,27 +59,19 @@ class AbaqusNonLinearCouplingWriter(AbaqusWriter):
 
     def write(self, couplings):
         """ Writes the nonlinear coupling to file for insertion to the input file. """
-        # todo: these should be imported names from Coupling
-        DISP_Z_NAME = 'disp-z'
-        WARP_NAME = 'warping-term'
-        SHELL_NAME = 'shell-term'
         field_strings = []
         mpc_strings = []
         for couple in couplings:
             jtype = self._gen_jtype(couple)
             beam_node = couple.beam_node
             shell_node_ids = couple.shell_nodes.keys()
-            warping_values = dict()
-            # Extract the value of the warping function from the constraints
-            for constraint in couple.constraints:
-                if constraint.constr_name == DISP_Z_NAME:
-                    for term in constraint.terms:
-                        if term.name == SHELL_NAME:
-                            node = term.node
-                        if term.name == WARP_NAME:
-                            # Since the negative of the warping function is stored
-                            w = -1.0 * term.coef
-                    warping_values[node] = w
+            # Extract the value of the warping function from the constraint table, each disp-z equation has one shell
+            # term and one warping term
+            terms = couple.constraint_table.terms
+            shell_nodes = terms['node'][terms['kind'] == TERM_SHELL]
+            # Since the negative of the warping function is stored
+            warping = -terms['coef'][terms['kind'] == TERM_WARPING]
+            warping_values = dict(zip(shell_nodes.tolist(), warping.tolist()))
             field_strings += self._gen_field_strings(warping_values)
             mpc_strings += self._gen_mpc_strings(beam_node, shell_node_ids, jtype)
         # Write the strings
@@ -1,4 +1,5 @@
 import numpy as np
+from .node_table import NodeTable
 
 
 class ICoupling:
@@ -7,12 +8,22 @@ class ICoupling:
     def __init__(self, beam_node, continuum_nodes, normal_direction, use_nonlinear, include_warping):
         """ Constructor.
         :param dict beam_node: {int: [float, float]} Beam node in the coupling in local coords.
-        :param dict continuum_nodes: {int: [float, float]} Continuum nodes in the coupling in local coords.
+        :param NodeTable continuum_nodes: Continuum nodes in the coupling in local coords, a dict
+        {int: [float, float, float]} is also accepted.
         :param np.ndarray normal_direction: (3,) Orientation of cross-section normal vector.
         :param bool use_nonlinear: If True, then nonlinear version of coupling used.
         :param bool include_warping: If True, then use warping-inclusive coupling.
+
+        Notes:
+            - warping_fun is the (N,) array of the warping function at the continuum nodes, in the row order of
+            continuum_nodes.
         """
+        if isinstance(continuum_nodes, dict):
+            continuum_nodes = NodeTable(np.array(list(continuum_nodes.keys()), dtype=np.int64),
+                                        np.array([np.pad(np.asarray(c, dtype=np.float64), (0, 3 - len(c)))
+                                                  for c in continuum_nodes.values()]).reshape((-1, 3)))
         self.beam_node = beam_node
+        self.beam_id = list(beam_node.keys())[0]
         self.continuum_nodes = continuum_nodes
         self.normal_direction = normal_direction
         self.use_nonlinear = use_nonlinear
@@ -22,10 +33,8 @@ class ICoupling:
 
     def _compute_warping_fun(self):
         """ Returns the warping function evaluated at each continuum node. """
-        wfun = dict()
-        for node_id, coords in self.continuum_nodes.items():
-            wfun[node_id] = coords[0] * coords[1]
-        return wfun
+        coords = self.continuum_nodes.coords
+        return coords[:, 0] * coords[:, 1]
 
 
 class CoordSys:
@@ -66,8 +75,8 @@ class IComponent:
         :param str component_id: Unique identifier for the component.
         :param ISection section: Defines the geometry of the cross-section.
         :param CoordSys coord_sys: Origin and orientation of the component.
-        :param dict beam_nodes: {int: [float, float]} Defines all the beam nodes in local coords.
-        :param dict continuum_nodes: {int: [float, float]} Defines all the continuum nodes in local coords.
+        :param NodeTable beam_nodes: Defines all the beam nodes in local coords.
+        :param NodeTable continuum_nodes: Defines all the continuum nodes in local coords.
         :param list couplings: [Coupling] Defines the couplings in the component.
         """
         self.id = component_id
@@ -85,29 +94,38 @@ class IComponent:
         # Offsets in component 3-axis for each coord system
         self.coord_sys_offsets = dict()
         # All beam and continuum nodes in the component
-        self.beam_nodes = dict()
-        self.continuum_nodes = dict()
+        self.beam_nodes = NodeTable()
+        self.continuum_nodes = NodeTable()
+        # Continuum node rows sorted along the n3-axis, and the node table they were computed for
+        self._continuum_z_order = None
+        self._continuum_z_order_nodes = None
         # Couplings in the component
         self.couplings = list()
         # Component length along n3-axis
         self.length = 0.
 
-        # Container for imperfections
-        self.node_imperfections = dict()
+        # Container for imperfections, beam nodes followed by continuum nodes
+        self.node_imperfections = NodeTable()
         # Defines the imperfection properties
         self.imperfection_props = dict()
+        # Imperfection properties from the definition file, kept when imperfection_props is replaced
+        self.definition_imperfection_props = dict()
 
     def _compute_length(self):
         """ Computes the length of the component from the beam and continuum node coordinates. """
         max_z = 0.
-        for node_id, coords in self.beam_nodes.items():
-            if coords[2] > max_z:
-                max_z = coords[2]
-        for node_id, coords in self.continuum_nodes.items():
-            if coords[2] > max_z:
-                max_z = coords[2]
+        for nodes in [self.beam_nodes, self.continuum_nodes]:
+            if len(nodes) > 0:
+                max_z = max(max_z, nodes.coords[:, 2].max())
         self.length = max_z
 
+    def get_continuum_z_order(self):
+        """ Returns the rows of the continuum nodes sorted by their n3-axis coordinate. """
+        if self._continuum_z_order_nodes is not self.continuum_nodes:
+            self._continuum_z_order = np.argsort(self.continuum_nodes.coords[:, 2], kind='stable')
+            self._continuum_z_order_nodes = self.continuum_nodes
+        return self._continuum_z_order
+
     def _check_imperfection_props(self):
         """ Checks if all the scales are defined in the imperfection props. """
         if 'local_scale' not in self.imperfection_props:
@@ -119,9 +137,8 @@ class IComponent:
 
     def get_imperfect_nodes(self):
         """ Returns the node coordinates with the imperfection. """
-        self.imperfect_nodes = dict()
-        for node_id, coord in self.continuum_nodes.items():
-            self.imperfect_nodes[node_id] = np.array(coord) + np.array(self.node_imperfections[node_id])
-        for node_id, coord in self.beam_nodes.items():
-            self.imperfect_nodes[node_id] = np.array(coord) + np.array(self.node_imperfections[node_id])
+        ids = np.concatenate((self.continuum_nodes.ids, self.beam_nodes.ids))
+        coords = np.concatenate((self.continuum_nodes.coords, self.beam_nodes.coords))
+        imps = self.node_imperfections.coords[self.node_imperfections.rows(ids)]
+        self.imperfect_nodes = NodeTable(ids, coords + imps)
         return self.imperfect_nodes
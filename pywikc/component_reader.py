@@ -1,16 +1,20 @@
+import os
 import numpy as np
 from .coupling import BSCoupling
 from .component import IComponent, ISection, CoordSys, ICoupling
+from .inp_tokenizer import NSET_KEYW, NODE_KEYW, SYSTEM_KEYW, INCLUDE_KEYW
+from .node_table import NodeTable, unique_ids
+from .model_cache import cache_key, cache_file_path, load_parsed_model, save_parsed_model
+from .inp_index import IndexedInpFile, get_inp_index, build_inp_index
+from .inp_buffer import worker_pool
+from .inp_include import scan_include_tree
+from .compressed_io import open_text, file_compression
 
 # definition file prototype:
 # *coupling
 # <beam_n_set_string>, <shell_n_set_string>, <local_coord_sys_string>
 # repeat lines
 
-NSET_KEYW = '*Nset'
-NODE_KEYW = '*Node'
-SYSTEM_KEYW = '*System'
-
 
 def peek_line(f):
     """ Checks the next line, then goes back to the current line. """
@@ -25,62 +29,171 @@ def line_lister(line):
     return [li.strip() for li in line.split(',')]
 
 
+def concatenate_sets(node_sets):
+    """ Returns the IDs in all the node sets as a single int64 array. """
+    return np.concatenate([np.asarray(ns, dtype=np.int64) for ns in node_sets] + [np.zeros(0, dtype=np.int64)])
+
+
+# Reader stages: {stage: (method, [stages it depends on])}
+READ_STAGES = {
+    'def_file': ('_read_def_file', []),
+    'inp_file': ('_read_inp_file', ['def_file']),
+    'node_domains': ('_organize_beam_continuum_nodes', ['inp_file']),
+    'cys_transforms': ('_compute_cys_transforms', ['inp_file']),
+    'local_nodes': ('_cys_transform_part_to_local', ['node_domains']),
+    'component_transforms': ('_setup_component_transformations', ['cys_transforms']),
+    'component_domains': ('_define_component_domains', ['local_nodes', 'component_transforms']),
+    'component_coord_sys': ('_assign_component_coord_sys', ['component_transforms']),
+    'component_couplings': ('_assign_component_couplings', ['local_nodes', 'component_coord_sys']),
+    'component_lengths': ('_compute_all_lengths', ['component_domains']),
+    # Targets
+    'couplings': (None, ['component_couplings']),
+    'imperfections': (None, ['component_domains', 'component_coord_sys', 'component_lengths']),
+}
+READ_TARGETS = ['couplings', 'imperfections']
+
+
 class AbaqusInpToComponentReader:
     """ Reads an input file into Components. """
 
-    def __init__(self):
-        """ Constructor. """
+    def __init__(self, cache_dir=None, use_index=False, use_mmap=False, workers=None):
+        """ Constructor.
+        :param str cache_dir: If not None, the data parsed from the input file is cached in this directory.
+        :param bool use_index: If True, the input file is read using a sidecar index of its keyword blocks.
+        :param bool use_mmap: If True, the input file is memory-mapped and its data blocks are parsed in bulk.
+        :param int workers: If > 1, large *Node and *Nset blocks, and the included files, are parsed using this
+        number of processes.
+
+        Notes:
+            - The cache is reused if the input file is unchanged and the same node sets are requested.
+            - The index is built on the first read and stored next to the input file, see inp_index.
+            With the index, only the requested node sets and the *Node blocks that contain their nodes are read.
+            A *Node block is skipped if its node IDs are increasing and no requested node is in their range, so the
+            last definition of a node is used as with the other readers.
+            - The input file is always memory-mapped if use_index, see inp_buffer. The memory used while parsing is
+            close to the size of the parsed arrays, instead of creating Python strings for every line.
+            - The input file is also memory-mapped if workers > 1, each worker process parses a range of lines of the
+            large blocks, see inp_buffer.parallel_node_arrays.
+            - *Include, input=<file> is followed recursively, relative paths are relative to the including file.
+            Decks with includes are read with the text reader, see inp_include.
+            - Input files with a .gz or .xz extension are decompressed while they are read, see compressed_io.
+            Compressed files cannot be memory-mapped, they are always read with the text reader.
+        """
+        self.cache_dir = cache_dir
+        self.use_index = use_index
+        self.use_mmap = use_mmap
+        self.workers = workers
         self.sections = dict()
         self.components = list()
         # Sets for all the node sets defined in any component
         self.beam_sets = dict()
         self.continuum_sets = dict()
-        self.all_nodes = dict()
-        self.all_beam_nodes = set()
-        self.all_continuum_nodes = set()
-        self.all_nodes_local = dict()
+        # Nodes in any of the sets, in part and local coordinates
+        self.all_nodes = NodeTable()
+        self.all_beam_nodes = np.zeros(0, dtype=np.int64)
+        self.all_continuum_nodes = np.zeros(0, dtype=np.int64)
+        self.all_nodes_local = NodeTable()
         # The global coord sys is denoted as system "0"
         self.coord_syss = {0: [0., 0., 0., 1., 0., 0., 0., 1., 0.]}
-        self.node_systems = dict()
+        # Coord sys of each node in all_nodes (same row order)
+        self.node_systems = np.zeros(0, dtype=np.int64)
         self.cs_transforms = dict()
-
-    def read(self, inp_file, definition_file):
-        """ Returns the components defined. """
-        self._read_def_file(definition_file)
-        self._read_inp_file(inp_file)
-        self._organize_beam_continuum_nodes()
-        self._compute_cys_transforms()
-        self._cys_transform_part_to_local()
-        self._setup_component_transformations()
-        self._define_component_domains()
-        self._assign_component_coord_sys()
-        self._assign_component_couplings()
-        self._compute_all_lengths()
+        # Files included by the input file, directly or not
+        self.include_files = list()
+        # Files and stages done by read
+        self._inp_file = None
+        self._def_file = None
+        self._done_stages = set()
+        # If False, only the node sets of the couplings are read in full, see require
+        self._read_all_sets = True
+
+    def read(self, inp_file, definition_file, targets=None, all_sets=False):
+        """ Returns the components defined.
+        :param str inp_file: Path to the Abaqus input file.
+        :param str definition_file: Path to the component definition file.
+        :param list targets: [str] Outputs to prepare, any of READ_TARGETS, all of them if None.
+        :param bool all_sets: If True, all the node sets are read in full even if only the couplings are required.
+
+        Notes:
+            - Only the stages needed for the targets are run, the others can be run later using require.
+            - Use all_sets if the other targets will be required later, so that the input file is parsed once.
+        """
+        self._inp_file = inp_file
+        self._def_file = definition_file
+        self._done_stages = set()
+        self._read_all_sets = all_sets
+        if targets is None:
+            targets = READ_TARGETS
+        self.require(*targets)
         return self.components
 
+    def require(self, *targets):
+        """ Runs the stages needed for the targets that are not already done.
+        :param str targets: Outputs to prepare, any of READ_TARGETS.
+            'couplings': Components with the couplings and coordinate systems.
+            'imperfections': Components with the beam and continuum nodes, coordinate systems, and lengths.
+
+        Notes:
+            - If only the couplings are required, only the node sets used by the couplings are read in full. Of the
+            other node sets of the components only the first node is read, which gives the coord sys of the set.
+            - If the input file was read for the couplings only, the other node sets and the nodes they add are read
+            for the other targets, see _read_head_sets.
+        """
+        for target in targets:
+            if target not in READ_TARGETS:
+                raise ValueError('Unknown read target {0}, should be one of {1}.'.format(target, READ_TARGETS))
+        if not self._read_all_sets and any(target != 'couplings' for target in targets):
+            head_names = self._node_set_scope()[1]
+            self._read_all_sets = True
+            if 'inp_file' in self._done_stages:
+                self._read_head_sets(self._inp_file, head_names)
+                # Keep the couplings, the stages that use all the node sets are run again
+                self._done_stages -= {'node_domains', 'local_nodes'}
+        for target in targets:
+            self._run_stage(target)
+        pass
+
+    def _run_stage(self, stage):
+        """ Runs the stage after its dependencies, does nothing if the stage is already done. """
+        if stage in self._done_stages:
+            return
+        method_name, dependencies = READ_STAGES[stage]
+        for dep in dependencies:
+            self._run_stage(dep)
+        stage_args = {'def_file': [self._def_file], 'inp_file': [self._inp_file]}
+        if method_name is not None:
+            getattr(self, method_name)(*stage_args.get(stage, []))
+        self._done_stages.add(stage)
+        return
+
     def _define_component_domains(self):
         """ Assigns all the nodes in the beam and continuum domains for each component. """
         for c in self.components:
-            for node_set in c.beam_node_sets:
-                for node_id in self.beam_sets[node_set]:
-                    local_coords = self.all_nodes_local[node_id]
-                    o_val = c.coord_sys_offsets[self.node_systems[node_id]]
-                    c.beam_nodes[node_id] = local_coords + np.array([0., 0., o_val])
-            for node_set in c.continuum_node_sets:
-                for node_id in self.continuum_sets[node_set]:
-                    local_coords = self.all_nodes_local[node_id]
-                    o_val = c.coord_sys_offsets[self.node_systems[node_id]]
-                    c.continuum_nodes[node_id] = self.all_nodes_local[node_id] + np.array([0., 0., o_val])
+            c.beam_nodes = self._component_nodes(c, [self.beam_sets[ns] for ns in c.beam_node_sets])
+            c.continuum_nodes = self._component_nodes(c, [self.continuum_sets[ns] for ns in c.continuum_node_sets])
+
+    def _component_nodes(self, component, node_sets):
+        """ Returns the NodeTable of the nodes in the sets in the component coordinate system.
+        :param IComponent component: Component that contains the nodes.
+        :param list node_sets: [np.ndarray] IDs of the nodes in each set.
+        """
+        node_ids = unique_ids(concatenate_sets(node_sets))
+        rows = self.all_nodes_local.rows(node_ids)
+        coords = self.all_nodes_local.coords[rows]
+        systems = self.node_systems[rows]
+        # Offset each node along the component axis based on its coord sys
+        offsets = np.zeros(len(node_ids))
+        for cys_id in np.unique(systems):
+            offsets[systems == cys_id] = component.coord_sys_offsets[cys_id]
+        return NodeTable(node_ids, coords + np.column_stack((np.zeros((len(node_ids), 2)), offsets)))
 
     def _assign_component_couplings(self):
         """ Parse and assign the couplings to the component. """
         for c in self.components:
             for ci in c.couplings_info:
-                beam_id = self.beam_sets[ci['beam_set']][0]
+                beam_id = int(self.beam_sets[ci['beam_set']][0])
                 beam_node = {beam_id: self.all_nodes_local[beam_id]}
-                cont_nodes = dict()
-                for node_ids in self.continuum_sets[ci['continuum_set']]:
-                    cont_nodes[node_ids] = self.all_nodes_local[node_ids]
+                cont_nodes = self.all_nodes_local.subset(unique_ids(self.continuum_sets[ci['continuum_set']]))
                 constr_def = self._parse_jtype(ci['jtype'])
                 n3 = c.coord_sys.basis[:, 2]
                 c.couplings.append(ICoupling(beam_node, cont_nodes, n3, **constr_def))
@@ -94,10 +207,8 @@ class AbaqusInpToComponentReader:
 
     def _organize_beam_continuum_nodes(self):
         """ Organize all the nodes into either beam or continuum. """
-        for set_names, set_nodes in self.beam_sets.items():
-            self.all_beam_nodes = self.all_beam_nodes | set(set_nodes)
-        for set_names, set_nodes in self.continuum_sets.items():
-            self.all_continuum_nodes = self.all_continuum_nodes | set(set_nodes)
+        self.all_beam_nodes = np.unique(concatenate_sets(self.beam_sets.values()))
+        self.all_continuum_nodes = np.unique(concatenate_sets(self.continuum_sets.values()))
 
     def _read_def_file(self, def_file):
         """ Reads the information in coupling definition file. """
@@ -118,7 +229,7 @@ class AbaqusInpToComponentReader:
                 line = file.readline()
                 peeked_line = peek_line(file).strip()
 
-        with open(def_file, 'r') as file:
+        with open_text(def_file, 'r') as file:
             line = file.readline()
             while line:
                 l_list = line_lister(line)
@@ -180,6 +291,7 @@ class AbaqusInpToComponentReader:
                                 imp_opts[li2[0].strip()] = float(li2[1])
                     self.components[-1].imperfection_props = imp_opts
                     self.components[-1]._check_imperfection_props()
+                    self.components[-1].definition_imperfection_props = dict(imp_opts)
                     handle_empty(file, peeked_line)
 
                 line = file.readline()
@@ -191,75 +303,208 @@ class AbaqusInpToComponentReader:
             c._compute_length()
         pass
 
+    def _node_set_scope(self):
+        """ Returns the names of the node sets to read in full, and of the node sets of which only the first node is
+        read.
+        :return list: [set, set] Names of the full and the head node sets.
+        """
+        set_names = set(self.beam_sets.keys()) | set(self.continuum_sets.keys())
+        if self._read_all_sets:
+            return [set_names, set()]
+        full_names = set()
+        for c in self.components:
+            for ci in c.couplings_info:
+                full_names.update([ci['beam_set'], ci['continuum_set']])
+        return [full_names, set_names - full_names]
+
     def _read_inp_file(self, inp_file):
-        """ Reads the coupling information in the input file. """
-        node_reading = False
-        system_reading = False
-        active_system = 0
-        coord_sys_tag = 1
+        """ Reads the node sets, nodes, and coordinate systems from the cache or the input file. """
+        full_names, head_names = self._node_set_scope()
+        self._read_cached_inp_file(inp_file, full_names, head_names, NodeTable())
+        return
 
-        with open(inp_file, 'r') as file:
-            # Read the Nsets
-            line = file.readline()
-            while line:
-                li = line.strip()
-                if li[:len(NSET_KEYW)] == NSET_KEYW:
-                    l_list = line_lister(line)
-                    n_set_name = l_list[1].split('=')[1]
-                    if len(l_list) > 2:
-                        if l_list[2] == 'generate':
-                            generate_option = True
-                        else:
-                            generate_option = False
-                    else:
-                        generate_option = False
-                    if n_set_name in self.continuum_sets:
-                        self.continuum_sets[n_set_name] = self._read_n_set(file, generate_option)
-                    elif n_set_name in self.beam_sets:
-                        self.beam_sets[n_set_name] = self._read_n_set(file, generate_option)
-                line = file.readline()
+    def _read_head_sets(self, inp_file, head_names):
+        """ Reads in full the node sets of which only the first node was read, and the nodes they add.
+        :param str inp_file: Path to the Abaqus input file.
+        :param set head_names: {str} Names of the node sets to read in full.
 
-            # Get coordinates of all registered nodes
-            file.seek(0)
-            line = file.readline()
-            while line:
-                l_list = [li.strip() for li in line.split(',')]
-                if l_list[0][0] == '*':
-                    # Stop at any keyword
-                    node_reading = False
-                    if system_reading:
-                        system_reading = False
-                        coord_sys_tag += 1
-                # Read keywords
-                if l_list[0] == SYSTEM_KEYW:
-                    peeked_line = peek_line(file)
-                    if peeked_line.strip()[0] == '*':
-                        # Set to global coord sys and don't read
-                        active_system = 0
-                    else:
-                        system_reading = True
-                        active_system = coord_sys_tag
-                        coord_sys_tag += 1
-
-                elif l_list[0] == NODE_KEYW:
-                    node_reading = True
-
-                elif node_reading:
-                    node_id = int(l_list[0])
-                    if node_id in self.all_nodes:
-                        coords = [float(c) for c in l_list[1:]]
-                        self.all_nodes[node_id] = coords
-                        self.node_systems[node_id] = active_system
-
-                elif system_reading:
-                    f_list = [float(li) for li in l_list]
-                    if active_system in self.coord_syss:
-                        self.coord_syss[active_system] += f_list
-                    else:
-                        self.coord_syss[active_system] = f_list
-                line = file.readline()
+        Notes:
+            - The nodes already read are kept. With the sidecar index only the *Node blocks that contain the added
+            nodes are read, otherwise the input file is scanned again but only the added node sets are parsed.
+        """
+        self._read_cached_inp_file(inp_file, head_names, set(), self.all_nodes)
+        return
+
+    def _read_cached_inp_file(self, inp_file, full_names, head_names, known_nodes):
+        """ Reads the node sets, nodes, and coordinate systems from the cache or the input file.
+
+        See _parse_inp_file for the parameters, the cache is keyed on the node set scope of the reader.
+        """
+        if self.cache_dir is None:
+            self._parse_inp_file(inp_file, full_names, head_names, known_nodes)
+            return
+        key = cache_key(inp_file, *self._node_set_scope())
+        cache_file = cache_file_path(self.cache_dir, inp_file, key)
+        cached = load_parsed_model(cache_file, key)
+        if cached is None:
+            self._parse_inp_file(inp_file, full_names, head_names, known_nodes)
+            node_sets = {**self.beam_sets, **self.continuum_sets}
+            save_parsed_model(cache_file, key, node_sets, self.all_nodes.ids, self.all_nodes.coords,
+                              self.node_systems, self.coord_syss, self.include_files)
+        else:
+            for name, ids in cached['node_sets'].items():
+                if name in self.continuum_sets:
+                    self.continuum_sets[name] = ids
+                elif name in self.beam_sets:
+                    self.beam_sets[name] = ids
+            self.all_nodes = NodeTable(cached['node_ids'], cached['node_coords'])
+            self.node_systems = cached['node_systems']
+            self.coord_syss = cached['coord_syss']
+            self.include_files = cached['include_files']
         return
 
+    def _parse_inp_file(self, inp_file, full_names, head_names, known_nodes):
+        """ Reads the node sets, nodes, and coordinate systems of the input file.
+        :param str inp_file: Path to the Abaqus input file.
+        :param set full_names: {str} Names of the node sets to read in full.
+        :param set head_names: {str} Names of the node sets of which only the first node is read.
+        :param NodeTable known_nodes: Nodes already read, their coordinates and coord sys are kept.
+        """
+        self.coord_syss = {0: [0., 0., 0., 1., 0., 0., 0., 1., 0.]}
+        node_blocks = None
+        use_mapped = self.use_index or self.use_mmap or (self.workers is not None and self.workers > 1)
+        if use_mapped and file_compression(inp_file) is None:
+            if self.use_index:
+                index = get_inp_index(inp_file)
+            else:
+                index = build_inp_index(inp_file, node_ranges=False, with_hash=False)
+            if not any(block['keyword'] == INCLUDE_KEYW for block in index['blocks']):
+                node_blocks = self._parse_mapped_inp_file(inp_file, index, full_names, head_names, known_nodes.ids)
+        if node_blocks is None:
+            node_blocks = self._scan_inp_file(inp_file, full_names, head_names)
+        # Keep the coordinates of all registered nodes
+        part_nodes = NodeTable(np.concatenate([b[0] for b in node_blocks] + [np.zeros(0, dtype=np.int64)]),
+                               np.concatenate([b[1] for b in node_blocks] + [np.zeros((0, 3))]))
+        part_systems = np.concatenate([b[2] for b in node_blocks] + [np.zeros(0, dtype=np.int64)])
+        registered = unique_ids(concatenate_sets(list(self.beam_sets.values()) + list(self.continuum_sets.values())))
+        is_known = np.isin(registered, known_nodes.ids)
+        coords = np.zeros((len(registered), 3))
+        systems = np.zeros(len(registered), dtype=np.int64)
+        known_rows = known_nodes.rows(registered[is_known])
+        coords[is_known] = known_nodes.coords[known_rows]
+        systems[is_known] = self.node_systems[known_rows]
+        rows = part_nodes.rows(registered[~is_known])
+        coords[~is_known] = part_nodes.coords[rows]
+        systems[~is_known] = part_systems[rows]
+        self.all_nodes = NodeTable(registered, coords)
+        self.node_systems = systems
+        return
+
+    def _scan_inp_file(self, inp_file, full_names, head_names):
+        """ Reads the node sets, nodes, and coordinate systems of the input file and the files it includes.
+        :param str inp_file: Path to the Abaqus input file.
+        :param set full_names: {str} Names of the node sets to read in full.
+        :param set head_names: {str} Names of the node sets of which only the first node is read.
+        :return list: [[np.ndarray, np.ndarray, np.ndarray]] IDs, coordinates, and coord sys of each *Node block.
+
+        Notes:
+            - The files are scanned in one pass each (concurrently if workers > 1), then merged in deck order.
+        """
+        file_items = scan_include_tree(inp_file, full_names, self.workers, head_names)
+        root = os.path.abspath(inp_file)
+        self.include_files = sorted(f for f in file_items if f != root)
+        node_blocks = []
+        self._merge_inp_items(root, file_items, node_blocks, 0, [])
+        return node_blocks
+
+    def _merge_inp_items(self, inp_file, file_items, node_blocks, active_system, include_chain):
+        """ Stores the items of the file in order, the items of included files are merged in place of the *Include.
+        :param str inp_file: Absolute path of the file.
+        :param dict file_items: {str: list} Items of each file, see inp_include.scan_include_tree.
+        :param list node_blocks: [[np.ndarray, np.ndarray, np.ndarray]] *Node blocks, the blocks of the file are added.
+        :param int active_system: Coord sys active at the start of the file.
+        :param list include_chain: [str] Files that include this file, up to the input file.
+        :return int: Coord sys active at the end of the file.
+        """
+        if inp_file in include_chain:
+            raise ValueError('Circular *Include of {0}.'.format(inp_file))
+        for keyword, data in file_items[inp_file]:
+            if keyword == NSET_KEYW:
+                self._store_node_set(data[0], data[1])
+            elif keyword == NODE_KEYW:
+                # Node sets may be defined after the nodes, so keep all the nodes until the end of the deck
+                node_blocks.append([data[0], data[1], np.full(len(data[0]), active_system, dtype=np.int64)])
+            elif keyword == SYSTEM_KEYW:
+                active_system = self._add_coord_sys(data)
+            elif keyword == INCLUDE_KEYW:
+                active_system = self._merge_inp_items(data, file_items, node_blocks, active_system,
+                                                      include_chain + [inp_file])
+        return active_system
+
+    def _parse_mapped_inp_file(self, inp_file, index, full_names, head_names, known_ids):
+        """ Reads the node sets, coordinate systems, and nodes from the memory-mapped input file.
+        :param str inp_file: Path to the Abaqus input file, without *Include keywords.
+        :param dict index: Index of the input file, see inp_index.build_inp_index.
+        :param set full_names: {str} Names of the node sets to read in full.
+        :param set head_names: {str} Names of the node sets of which only the first node is read.
+        :param np.ndarray known_ids: (N,) IDs of the nodes already read, they are not needed from the *Node blocks.
+        :return list: [[np.ndarray, np.ndarray, np.ndarray]] IDs, coordinates, and coord sys of each *Node block read.
+
+        Notes:
+            - With the sidecar index, the *Node blocks with strictly increasing IDs whose ID range does not contain
+            registered nodes that are not known are skipped. The blocks with IDs that are not increasing are always
+            read.
+            - The worker processes of the large blocks are shared by all the blocks of the file.
+        """
+        node_blocks = []
+        active_system = 0
+        with IndexedInpFile(inp_file, index) as inp, worker_pool(self.workers) as pool:
+            # Read the node sets first to know which *Node blocks are needed
+            for block in inp.blocks(NSET_KEYW):
+                n_set_name = inp.block_options(block)['nset']
+                if n_set_name in full_names:
+                    self._store_node_set(n_set_name, inp.n_set_ids(block, self.workers, pool))
+                elif n_set_name in head_names:
+                    self._store_node_set(n_set_name, inp.n_set_first_id(block))
+            registered = np.unique(concatenate_sets(list(self.beam_sets.values()) +
+                                                    list(self.continuum_sets.values())))
+            registered = registered[~np.isin(registered, known_ids)]
+            for block in inp.blocks():
+                if block['keyword'] == NODE_KEYW:
+                    if block.get('increasing', False):
+                        # Skip the block if none of the registered nodes are in its ID range
+                        if block['min_id'] is None:
+                            continue
+                        lo = np.searchsorted(registered, block['min_id'], side='left')
+                        hi = np.searchsorted(registered, block['max_id'], side='right')
+                        if hi == lo:
+                            continue
+                    ids, coords = inp.node_arrays(block, self.workers, pool)
+                    node_blocks.append([ids, coords, np.full(len(ids), active_system, dtype=np.int64)])
+                elif block['keyword'] == SYSTEM_KEYW:
+                    active_system = self._add_coord_sys(inp.data_lines(block))
+        return node_blocks
+
+    def _store_node_set(self, n_set_name, ids):
+        """ Stores the IDs of the node set if it is in any component, otherwise does nothing. """
+        if n_set_name in self.continuum_sets:
+            self.continuum_sets[n_set_name] = ids
+        elif n_set_name in self.beam_sets:
+            self.beam_sets[n_set_name] = ids
+        pass
+
+    def _add_coord_sys(self, data_lines):
+        """ Stores the coord sys defined by the *System data lines.
+        :return int: Tag of the new active coord sys, 0 (global) if the data lines are empty.
+        """
+        cs_data = [float(li) for line in data_lines for li in line.split(',') if li.strip() != '']
+        if not cs_data:
+            # Set to global coord sys
+            return 0
+        coord_sys_tag = len(self.coord_syss)
+        self.coord_syss[coord_sys_tag] = cs_data
+        return coord_sys_tag
+
     def _parse_jtype(self, jtype):
         """ Returns the options from jtype. """
         val = int(jtype)
@@ -275,31 +520,6 @@ class AbaqusInpToComponentReader:
             raise ValueError('Incorrect JTYPE provided.')
         return constr_def
 
-    def _read_n_set(self, fp, use_generate):
-        """ Returns the IDs of the nodes in the node set.
-        :param FileObject fp: Pointer to the file being read.
-        :param bool use_generate: If True, generate the node set.
-        """
-        if use_generate:
-            line = fp.readline()
-            l_list = line_lister(line)
-            l_list = [int(li) for li in l_list]
-            node_set = list(range(l_list[0], l_list[1] + 1, l_list[2]))
-            for n in node_set:
-                self.all_nodes[n] = []
-        else:
-            node_set = []
-            peeked_line = 'START'
-            while peeked_line[0] != '*':
-                li = fp.readline().strip()
-                nodes = li.split(',')
-                for n in nodes:
-                    if n != '':
-                        node_set.append(int(n))
-                        self.all_nodes[int(n)] = []
-                peeked_line = peek_line(fp).strip()
-        return node_set
-
     def _compute_cys_transforms(self):
         """ Compute the transformations implied by each cooridinate system . """
         for cs_tag, cs_data in self.coord_syss.items():
@@ -340,23 +560,17 @@ class AbaqusInpToComponentReader:
 
     def _cys_transform_part_to_local(self):
         """ Transforms nodes from part to local coordinate systems. """
-        rmat_continuum = np.identity(3)
         rmat_beam = np.array([[0.,  0., -1.],
                               [0.,  1.,  0.],
                               [1.,  0.,  0.]])
-        for node_id, coord in self.all_nodes.items():
-            if node_id in self.all_beam_nodes:
-                rmat = rmat_beam
-            elif node_id in self.all_continuum_nodes:
-                rmat = rmat_continuum
-            else:
-                raise ValueError('Node ID not found in beam or continuum domains.')
-            c = np.array(coord)
-            # o = self.cs_transforms[self.node_systems[node_id]]['origin']
-            transf_coord = np.dot(rmat, c)
-            # Keep only 8 digits of precision (neglect values < 10^-8)
-            transf_coord = transf_coord.round(8)
-            self.all_nodes_local[node_id] = transf_coord
+        is_beam = np.isin(self.all_nodes.ids, self.all_beam_nodes)
+        if not np.all(is_beam | np.isin(self.all_nodes.ids, self.all_continuum_nodes)):
+            raise ValueError('Node ID not found in beam or continuum domains.')
+        # Continuum nodes use the identity transformation
+        local_coords = self.all_nodes.coords.copy()
+        local_coords[is_beam] = np.dot(local_coords[is_beam], rmat_beam.T)
+        # Keep only 8 digits of precision (neglect values < 10^-8)
+        self.all_nodes_local = NodeTable(self.all_nodes.ids, local_coords.round(8))
         pass
 
     def _setup_component_transformations(self):
@@ -367,11 +581,11 @@ class AbaqusInpToComponentReader:
             for node_set in c.beam_node_sets:
                 # Assumed that all nodes in the set have the same coord sys
                 node_in_set = self.beam_sets[node_set][0]
-                node_set_to_cys[node_set] = self.node_systems[node_in_set]
+                node_set_to_cys[node_set] = int(self.node_systems[self.all_nodes.row(node_in_set)])
             for node_set in c.continuum_node_sets:
                 # Assumed that all nodes in the set have the same coord sys
                 node_in_set = self.continuum_sets[node_set][0]
-                node_set_to_cys[node_set] = self.node_systems[node_in_set]
+                node_set_to_cys[node_set] = int(self.node_systems[self.all_nodes.row(node_in_set)])
             c.node_set_to_coordsys = node_set_to_cys
 
             # Determine the base coord sys for the component
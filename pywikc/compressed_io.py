@@ -0,0 +1,71 @@
+""" Text files that are transparently compressed with gzip or xz.
+
+The compression of a file is given by its extension (.gz or .xz), so compressed input files are read by the same
+code as plain files, and the writers only need to append the extension to the output file names.
+
+Compressed files are written with a zero modification time in the gzip header, so writing the same contents twice
+gives identical files.
+"""
+import gzip
+import io
+import lzma
+
+# {compression: extension}
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'xz': '.xz'}
+GZIP_LEVEL = 6
+XZ_PRESET = 6
+
+
+def file_compression(file_path):
+    """ Returns the compression of the file from its extension, None if it is not compressed. """
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if file_path.lower().endswith(extension):
+            return compression
+    return None
+
+
+def strip_compression(file_path):
+    """ Returns the path without the compression extension. """
+    compression = file_compression(file_path)
+    if compression is None:
+        return file_path
+    return file_path[:-len(COMPRESSION_EXTENSIONS[compression])]
+
+
+def compressed_name(file_path, compression):
+    """ Returns the path with the extension of the compression appended.
+    :param str file_path: Path of the uncompressed file.
+    :param str compression: One of COMPRESSION_EXTENSIONS, or None for no compression.
+    """
+    if compression is None:
+        return file_path
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError('Unknown compression {0}, use one of {1}.'.format(compression,
+                                                                         list(COMPRESSION_EXTENSIONS.keys())))
+    return file_path + COMPRESSION_EXTENSIONS[compression]
+
+
+def open_text(file_path, mode='r', buffering=-1):
+    """ Opens a text file, decompresses or compresses it if it has a compression extension.
+    :param str file_path: Path to the file.
+    :param str mode: 'r' to read or 'w' to write.
+    :param int buffering: Buffer size of plain files, see open.
+    :return FileObject: Text file, lines are streamed through the compression.
+    """
+    compression = file_compression(file_path)
+    if compression is None:
+        return open(file_path, mode, buffering=buffering)
+    if mode not in ['r', 'w']:
+        raise ValueError('Compressed files can only be opened with mode r or w.')
+    if compression == 'gzip':
+        if mode == 'r':
+            binary = gzip.GzipFile(file_path, 'rb')
+        else:
+            binary = gzip.GzipFile(file_path, 'wb', compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        if mode == 'r':
+            binary = lzma.LZMAFile(file_path, 'rb')
+        else:
+            binary = lzma.LZMAFile(file_path, 'wb', preset=XZ_PRESET)
+    return io.TextIOWrapper(binary)
+
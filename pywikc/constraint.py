@@ -1,3 +1,14 @@
+import numpy as np
+
+# Kind of each term in a constraint table, the index in TERM_NAMES
+TERM_OTHER = 0
+TERM_SHELL = 1
+TERM_WARPING = 2
+TERM_NAMES = ['', 'shell-term', 'warping-term']
+# Columns of a constraint table, one row per term
+CONSTRAINT_DTYPE = np.dtype([('equation', np.int64), ('node', np.int64), ('dof', np.int64), ('coef', np.float64),
+                             ('kind', np.int8)])
+
 
 class ConstraintTerm:
     """ A single term in a linear constraint equation. """
@@ -39,3 +50,48 @@ class Constraint:
     def add_term(self, node, dof, coef, name=''):
         self.terms.append(ConstraintTerm(node, dof, coef, name))
         return
+
+
+class ConstraintTable:
+    """ Linear constraint equations stored as a structured array of terms.
+
+    Each row of the terms array is a term (equation, node, dof, coef, kind), see CONSTRAINT_DTYPE.
+    The rows of each equation are contiguous and the equations are numbered 0, 1, ... in order.
+    """
+
+    def __init__(self, terms, names):
+        """ Constructor.
+        :param np.ndarray terms: (M,) CONSTRAINT_DTYPE Terms of all the equations, grouped by equation.
+        :param list names: [str] Identifier of each equation.
+        """
+        self.terms = terms
+        self.names = names
+        self._bounds = None
+        return
+
+    def __len__(self):
+        """ Returns the number of equations. """
+        return len(self.names)
+
+    def bounds(self):
+        """ Returns the (N + 1,) offsets of the first term of each equation in the terms array. """
+        if self._bounds is None:
+            self._bounds = np.searchsorted(self.terms['equation'], np.arange(len(self) + 1), side='left')
+        return self._bounds
+
+    def equation_terms(self, i):
+        """ Returns the rows of the terms array in equation i. """
+        bounds = self.bounds()
+        return self.terms[bounds[i]:bounds[i + 1]]
+
+    def to_constraints(self):
+        """ Returns the equations as a list of Constraint. """
+        constraints = []
+        bounds = self.bounds()
+        rows = self.terms.tolist()
+        for i, name in enumerate(self.names):
+            constr = Constraint(constr_name=name)
+            for _, node, dof, coef, kind in rows[bounds[i]:bounds[i + 1]]:
+                constr.add_term(node, dof, coef, TERM_NAMES[kind])
+            constraints.append(constr)
+        return constraints
@@ -0,0 +1,174 @@
+""" Sparse matrix of the coupling constraints, and checks for redundant or conflicting constraints.
+
+The constraint equations of all the couplings are assembled in a scipy.sparse CSR matrix with one row per equation
+and one column per constrained (node, DOF) pair. BSCoupling equations are used as written to the *Equation data files.
+ICoupling (WIKC) constraints are linearized at the reference configuration, where the linear (JTYPE 16, 17) and
+nonlinear (JTYPE 26, 27) forms have the same linearization.
+
+The first term of each equation is its dependent DOF, i.e., the DOF that is eliminated by Abaqus.
+
+Requires scipy, which is an optional dependency of pywikc.
+"""
+import numpy as np
+import scipy.sparse
+from .component import ICoupling
+from .constraint import ConstraintTable, CONSTRAINT_DTYPE, TERM_OTHER, TERM_SHELL, TERM_WARPING
+
+# Column key of a (node, DOF) pair is node * DOF_STRIDE + DOF
+DOF_STRIDE = 16
+# Largest number of equations in a coupling for the rank to be computed
+MAX_BLOCK_ROWS = 3000
+
+
+def wikc_constraint_table(couple):
+    """ Returns the WIKC constraints of the coupling linearized at the reference configuration.
+    :param ICoupling couple: The coupling.
+    :return ConstraintTable: Three equations per continuum node, see Notes.
+
+    Notes:
+        - For each continuum node, with link = continuum node - beam node and t = (0, 0, 1) the normal direction:
+            u_c - u_b + skew(link) . theta_b - warping_fun * t * w_b = 0
+        The coefficients are in the local coordinates of the coupling, the x and y axes are in the cross-section
+        plane. The rank of the constraints does not depend on this choice of axes.
+        - The warping DOF (7) of the beam node is only included if include_warping.
+    """
+    ids = couple.continuum_nodes.ids
+    link = couple.continuum_nodes.coords - np.asarray(couple.beam_node[couple.beam_id], dtype=np.float64)[:3]
+    n = len(ids)
+    beam = np.full(n, couple.beam_id, dtype=np.int64)
+    # skew(link) rows: [0, -l3, l2], [l3, 0, -l1], [-l2, l1, 0]
+    skew = [[None, -link[:, 2], link[:, 1]], [link[:, 2], None, -link[:, 0]], [-link[:, 1], link[:, 0], None]]
+    layout = []
+    for i in range(3):
+        layout.append((i, ids, i + 1, 1., TERM_SHELL if i == 2 else TERM_OTHER))
+        layout.append((i, beam, i + 1, -1., TERM_OTHER))
+        for j in range(3):
+            if skew[i][j] is not None:
+                layout.append((i, beam, j + 4, skew[i][j], TERM_OTHER))
+    if couple.include_warping:
+        layout.append((2, beam, 7, -couple.warping_fun, TERM_WARPING))
+    terms = np.zeros((n, len(layout)), dtype=CONSTRAINT_DTYPE)
+    for j, (offset, nodes, dof, coef, kind) in enumerate(layout):
+        terms['equation'][:, j] = 3 * np.arange(n) + offset
+        terms['node'][:, j] = nodes
+        terms['dof'][:, j] = dof
+        terms['coef'][:, j] = coef
+        terms['kind'][:, j] = kind
+    # Sort the terms by equation, keeping the dependent DOF first
+    terms = terms.ravel()[np.argsort(terms['equation'].ravel(), kind='stable')]
+    return ConstraintTable(terms, ['disp-x', 'disp-y', 'disp-z'] * n)
+
+
+def coupling_constraint_table(couple):
+    """ Returns the constraint table of a BSCoupling or the linearized constraint table of an ICoupling. """
+    if isinstance(couple, ICoupling):
+        return wikc_constraint_table(couple)
+    return couple.constraint_table
+
+
+def constraint_matrix(couplings):
+    """ Returns the constraints of all the couplings assembled in a sparse matrix.
+    :param list couplings: [BSCoupling or ICoupling] Couplings to assemble.
+    :return list: [scipy.sparse.csr_matrix, np.ndarray, np.ndarray, np.ndarray] See Notes.
+
+    Notes:
+        - The returned values are:
+            (M, K) CSR matrix with one row per equation and one column per (node, DOF) pair.
+            (K, 2) Node and DOF of each column, sorted by node then DOF.
+            (M, 2) Node and DOF of the dependent (first) term of each row.
+            (M,) Index of the coupling of each row.
+        - Repeated (node, DOF) terms in an equation are summed, and zero coefficients are not stored.
+    """
+    tables = [coupling_constraint_table(couple) for couple in couplings]
+    row_offsets = np.cumsum([0] + [len(t) for t in tables])
+    terms = np.concatenate([t.terms for t in tables] + [np.zeros(0, dtype=CONSTRAINT_DTYPE)])
+    rows = np.concatenate([t.terms['equation'] + row_offsets[k] for k, t in enumerate(tables)] +
+                          [np.zeros(0, dtype=np.int64)])
+    keys = terms['node'] * DOF_STRIDE + terms['dof']
+    col_keys, cols = np.unique(keys, return_inverse=True)
+    n_rows = int(row_offsets[-1])
+    matrix = scipy.sparse.csr_matrix((terms['coef'], (rows, cols.ravel())), shape=(n_rows, len(col_keys)))
+    matrix.eliminate_zeros()
+    columns = np.column_stack((col_keys // DOF_STRIDE, col_keys % DOF_STRIDE))
+    first_terms = np.concatenate([t.terms[t.bounds()[:-1]] for t in tables] + [np.zeros(0, dtype=CONSTRAINT_DTYPE)])
+    dependents = np.column_stack((first_terms['node'], first_terms['dof']))
+    row_couplings = np.repeat(np.arange(len(tables)), np.diff(row_offsets))
+    return [matrix, columns, dependents, row_couplings]
+
+
+def _block_rank(block, rank_tol):
+    """ Returns the numerical rank and condition number of a dense block of equations. """
+    sv = np.linalg.svd(block, compute_uv=False)
+    if len(sv) == 0 or sv[0] == 0.:
+        return [0, np.inf]
+    if rank_tol is None:
+        rank_tol = max(block.shape) * np.finfo(np.float64).eps
+    rank = int(np.sum(sv > rank_tol * sv[0]))
+    return [rank, float(sv[0] / sv[rank - 1])]
+
+
+def _has_pivot_rows(block, dep_cols):
+    """ Returns True if each row of the block has its own dependent column that no other row of the block uses.
+    :param scipy.sparse.csr_matrix block: Equations of one coupling.
+    :param np.ndarray dep_cols: (M,) Column of the dependent DOF of each row.
+    """
+    used_cols, col_counts = np.unique(block.indices, return_counts=True)
+    pos = np.minimum(np.searchsorted(used_cols, dep_cols), max(len(used_cols) - 1, 0))
+    if len(used_cols) == 0 or np.any(used_cols[pos] != dep_cols):
+        return False
+    return len(np.unique(dep_cols)) == len(dep_cols) and bool(np.all(col_counts[pos] == 1))
+
+
+def check_constraints(couplings, max_block_rows=MAX_BLOCK_ROWS, rank_tol=None):
+    """ Returns a report of the redundant or conflicting constraints of the couplings.
+    :param list couplings: [BSCoupling or ICoupling] Couplings to check.
+    :param int max_block_rows: Couplings with more equations than this are not checked with an SVD.
+    :param float rank_tol: Singular values <= rank_tol * largest singular value are zero, defaults to max(M, K) * eps.
+    :return dict: See Notes.
+
+    Notes:
+        - The report contains:
+            duplicate_dofs: (D, 2) Node and DOF of the dependent DOFs of more than one equation.
+            shared_nodes: (S,) Nodes with dependent DOFs in more than one coupling.
+            block_ranks: [[int, int, float]] For each coupling, the number of equations, the numerical rank, and the
+            condition number of its equations. The condition number is None if it is not computed, and the rank is
+            also None if the coupling is too large to be checked.
+            is_valid: True if there are no duplicate DOFs, no shared nodes, and all the couplings have full row
+            rank. False if any of these checks fail, None (unverified) if they pass but any coupling was not checked.
+        - If each equation of a coupling has a dependent DOF that no other equation of the coupling uses, the
+        equations have full row rank and no SVD is needed. This is always the case for ICoupling (WIKC) equations,
+        where the dependent DOFs are the distinct continuum DOFs with coefficient 1.
+        - Otherwise, the rank of each coupling is computed with an SVD of its equations over the columns it uses.
+        Equations of different couplings only interact through shared DOFs, which are reported by duplicate_dofs and
+        shared_nodes.
+    """
+    matrix, columns, dependents, row_couplings = constraint_matrix(couplings)
+    dep_keys = dependents[:, 0] * DOF_STRIDE + dependents[:, 1]
+    unique_keys, key_counts = np.unique(dep_keys, return_counts=True)
+    duplicates = unique_keys[key_counts > 1]
+    duplicate_dofs = np.column_stack((duplicates // DOF_STRIDE, duplicates % DOF_STRIDE))
+    # Nodes with dependent DOFs in more than one coupling
+    node_couplings = np.unique(np.column_stack((dependents[:, 0], row_couplings)), axis=0)
+    nodes, node_counts = np.unique(node_couplings[:, 0], return_counts=True)
+    shared_nodes = nodes[node_counts > 1]
+    col_keys = columns[:, 0] * DOF_STRIDE + columns[:, 1]
+    dep_cols = np.searchsorted(col_keys, dep_keys)
+    block_ranks = []
+    bounds = np.searchsorted(row_couplings, np.arange(len(couplings) + 1))
+    for k in range(len(couplings)):
+        block = matrix[bounds[k]:bounds[k + 1]]
+        n_eqs = block.shape[0]
+        if _has_pivot_rows(block, dep_cols[bounds[k]:bounds[k + 1]]):
+            block_ranks.append([n_eqs, n_eqs, None])
+            continue
+        if n_eqs > max_block_rows:
+            block_ranks.append([n_eqs, None, None])
+            continue
+        used_cols = np.unique(block.indices)
+        block_ranks.append([n_eqs] + _block_rank(block[:, used_cols].toarray(), rank_tol))
+    is_valid = len(duplicate_dofs) == 0 and len(shared_nodes) == 0 and \
+        all(r[1] is None or r[1] == r[0] for r in block_ranks)
+    if is_valid and any(r[1] is None for r in block_ranks):
+        is_valid = None
+    return {'duplicate_dofs': duplicate_dofs, 'shared_nodes': shared_nodes, 'block_ranks': block_ranks,
+            'is_valid': is_valid}
@@ -0,0 +1,229 @@
+""" Streaming check of the WIKC constraints on the nodal results of an analysis.
+
+The nodal results are read from a CSV table with one row per node and frame (the frame column is optional), e.g.,
+the displacements U1-U3, rotations UR1-UR3, and warping DOF exported from the output database. The table is read in
+chunks of RESULT_CHUNK_ROWS rows and joined by node ID against the couplings from AbaqusInpToComponentReader.
+
+The file is read twice: the first pass keeps the results of the beam nodes, the second pass evaluates the constraint
+violation of the continuum nodes in each chunk with wikc_mpc. The memory used is bounded by the chunk size, plus a
+few values per frame for each coupling, so result tables that do not fit in memory can be checked.
+
+Notes:
+    - The violation of a continuum node is the norm of its displacement minus UE, see wikc_mpc.wikc_violation. It is
+    computed for both the linear and the nonlinear forms of each coupling, whatever form was used in the analysis.
+    - The results are in the global coordinate system, as exported by Abaqus.
+"""
+import itertools
+import numpy as np
+from .node_table import NodeTable
+from .compressed_io import open_text
+from .wikc_mpc import wikc_mpc
+
+RESULT_CHUNK_ROWS = 2 ** 16
+# Headers of the result table columns, the frame and warping columns are optional
+RESULT_COLUMNS = {'frame': 'frame', 'node': 'node', 'disp': ['U1', 'U2', 'U3'], 'rot': ['UR1', 'UR2', 'UR3'],
+                  'warping': 'W'}
+# Forms of the constraint that are checked, {name: use_nonlinear}
+CHECK_FORMS = {'linear': False, 'nonlinear': True}
+
+
+def global_node_coords(reader):
+    """ Returns the global coordinates of the nodes read by the reader.
+    :param AbaqusInpToComponentReader reader: Reader, the couplings should be read.
+    :return NodeTable: Nodes of reader.all_nodes with their coordinates transformed by their *System.
+    """
+    coords = reader.all_nodes.coords.copy()
+    for cs_tag in np.unique(reader.node_systems).tolist():
+        rows = reader.node_systems == cs_tag
+        transform = reader.cs_transforms[cs_tag]
+        coords[rows] = transform['origin'] + np.dot(coords[rows], transform['basis'].T)
+    return NodeTable(reader.all_nodes.ids, coords)
+
+
+def _form_jtype(couple, use_nonlinear):
+    """ Returns the JTYPE of the linear or nonlinear form of the coupling. """
+    if use_nonlinear:
+        return 27 if couple.include_warping else 26
+    return 17 if couple.include_warping else 16
+
+
+def _result_columns(header_line, columns):
+    """ Returns the indices of the frame, node, and DOF columns of the result table.
+    :param str header_line: First line of the table.
+    :param dict columns: Column headers, see RESULT_COLUMNS.
+    :return list: [int, int, list] Frame column (None if absent), node column, and the 7 DOF columns (None for the
+    warping DOF if absent).
+    """
+    header = [h.strip().strip('"') for h in header_line.split(',')]
+    for name in [columns['node']] + columns['disp'] + columns['rot']:
+        if name not in header:
+            raise ValueError('Column {0} not found in the result table header {1}.'.format(name, header))
+    frame_col = header.index(columns['frame']) if columns['frame'] in header else None
+    warp_col = header.index(columns['warping']) if columns['warping'] in header else None
+    dof_cols = [header.index(name) for name in columns['disp'] + columns['rot']] + [warp_col]
+    return [frame_col, header.index(columns['node']), dof_cols]
+
+
+def iter_result_chunks(results_file, columns=None, chunk_rows=RESULT_CHUNK_ROWS):
+    """ Yields the rows of the result table in chunks.
+    :param str results_file: Path to the CSV result table, can be compressed, see compressed_io.
+    :param dict columns: Column headers, defaults to RESULT_COLUMNS.
+    :param int chunk_rows: Number of rows in each chunk.
+    :return list: [np.ndarray, np.ndarray, np.ndarray] (M,) frame, (M,) node ID, and (M, 7) DOFs of each row.
+
+    Notes:
+        - The frame is 0 if the table has no frame column, the warping DOF is 0 if it has no warping column.
+    """
+    if columns is None:
+        columns = RESULT_COLUMNS
+    with open_text(results_file, 'r') as file:
+        frame_col, node_col, dof_cols = _result_columns(file.readline(), columns)
+        use_cols = [c for c in [frame_col, node_col] + dof_cols if c is not None]
+        while True:
+            lines = list(itertools.islice(file, chunk_rows))
+            if not lines:
+                break
+            data = np.loadtxt(lines, delimiter=',', usecols=use_cols, ndmin=2)
+            data_cols = dict(zip(use_cols, range(len(use_cols))))
+            frames = data[:, data_cols[frame_col]] if frame_col is not None else np.zeros(len(data))
+            dofs = np.zeros((len(data), 7))
+            for i, c in enumerate(dof_cols):
+                if c is not None:
+                    dofs[:, i] = data[:, data_cols[c]]
+            yield [frames, data[:, data_cols[node_col]].astype(np.int64), dofs]
+    return
+
+
+class ResidualAccumulator:
+    """ Maximum and sum of squares of the constraint violation for each frame and coupling. """
+
+    def __init__(self, n_frames, n_couplings):
+        """ Constructor.
+        :param int n_frames: Number of frames.
+        :param int n_couplings: Number of couplings.
+        """
+        self.max = {form: np.zeros((n_frames, n_couplings)) for form in CHECK_FORMS}
+        self.sum_sq = {form: np.zeros((n_frames, n_couplings)) for form in CHECK_FORMS}
+        self.counts = np.zeros((n_frames, n_couplings), dtype=np.int64)
+
+    def add(self, frame_rows, coupling_rows, violations):
+        """ Adds the violation of the nodes to the statistics of their frame and coupling.
+        :param np.ndarray frame_rows: (M,) Frame of each node.
+        :param np.ndarray coupling_rows: (M,) Coupling of each node.
+        :param dict violations: {str: np.ndarray} (M,) Violation of each node for each of CHECK_FORMS.
+        """
+        np.add.at(self.counts, (frame_rows, coupling_rows), 1)
+        for form, violation in violations.items():
+            np.maximum.at(self.max[form], (frame_rows, coupling_rows), violation)
+            np.add.at(self.sum_sq[form], (frame_rows, coupling_rows), violation ** 2)
+        pass
+
+    def report(self):
+        """ Returns the statistics, see check_result_constraints. """
+        report = {'counts': self.counts}
+        for form in CHECK_FORMS:
+            report[form] = {'max': self.max[form], 'rms': np.sqrt(self.sum_sq[form] / np.maximum(self.counts, 1))}
+        return report
+
+
+def _beam_results(results_file, beam_ids, columns, chunk_rows):
+    """ Returns the frames of the result table and the DOFs of the beam nodes in each frame.
+    :param np.ndarray beam_ids: (B,) Sorted IDs of the beam nodes.
+    :return list: [np.ndarray, np.ndarray, np.ndarray] See Notes.
+
+    Notes:
+        - The returned values are:
+            (F,) Frames with beam node results, sorted.
+            (F,) Row of each sorted frame in the order the frames first appear in the table.
+            (F, B, 7) DOFs of each beam node in each frame in order of appearance, NaN if not in the table.
+    """
+    beam_table = NodeTable(beam_ids)
+    frame_chunks, row_chunks, dof_chunks = [np.zeros(0)], [np.zeros(0, dtype=np.int64)], [np.zeros((0, 7))]
+    for frames, node_ids, dofs in iter_result_chunks(results_file, columns, chunk_rows):
+        rows = beam_table.lookup(node_ids)
+        is_beam = rows >= 0
+        frame_chunks.append(frames[is_beam])
+        row_chunks.append(rows[is_beam])
+        dof_chunks.append(dofs[is_beam])
+    frames = np.concatenate(frame_chunks)
+    sorted_frames, first_rows, inverse = np.unique(frames, return_index=True, return_inverse=True)
+    frame_order = np.empty(len(sorted_frames), dtype=np.int64)
+    frame_order[np.argsort(first_rows, kind='stable')] = np.arange(len(sorted_frames))
+    beam_dofs = np.full((len(sorted_frames), len(beam_ids), 7), np.nan)
+    beam_dofs[frame_order[inverse.ravel()], np.concatenate(row_chunks)] = np.concatenate(dof_chunks)
+    return [sorted_frames, frame_order, beam_dofs]
+
+
+def check_result_constraints(reader, results_file, columns=None, chunk_rows=RESULT_CHUNK_ROWS):
+    """ Returns the constraint violation of each coupling in each frame of the result table.
+    :param AbaqusInpToComponentReader reader: Reader of the analysis input file, the couplings should be read.
+    :param str results_file: Path to the CSV result table, can be compressed.
+    :param dict columns: Column headers, defaults to RESULT_COLUMNS.
+    :param int chunk_rows: Number of rows of the table read at once.
+    :return dict: See Notes.
+
+    Notes:
+        - The report contains:
+            interfaces: [[int, int]] Component ID and beam node ID of each coupling.
+            frames: [float] Frames in the order they first appear in the table.
+            counts: (F, K) Number of continuum nodes checked for each frame and coupling.
+            linear, nonlinear: {'max': (F, K), 'rms': (F, K)} Maximum and RMS violation for each frame and coupling.
+        - The rows of nodes that are not in a coupling are skipped.
+        - Each continuum node can only be in one coupling.
+    :raises ValueError: If a frame has results for continuum nodes but not for their beam node.
+    """
+    couplings = []
+    interfaces = []
+    for c in reader.components:
+        for couple in c.couplings:
+            couplings.append(couple)
+            interfaces.append([c.id, couple.beam_id])
+    nodes = global_node_coords(reader)
+    beam_ids = np.array([couple.beam_id for couple in couplings], dtype=np.int64)
+    cont_ids = np.concatenate([couple.continuum_nodes.ids for couple in couplings] + [np.zeros(0, dtype=np.int64)])
+    if len(np.unique(cont_ids)) != len(cont_ids):
+        raise ValueError('Continuum nodes are in more than one coupling.')
+    cont_nodes = NodeTable(cont_ids, nodes.coords[nodes.rows(cont_ids)])
+    cont_couplings = np.repeat(np.arange(len(couplings)), [len(couple.continuum_nodes) for couple in couplings])
+    warp_fun = np.concatenate([couple.warping_fun for couple in couplings] + [np.zeros(0)])
+    x_beams = nodes.coords[nodes.rows(beam_ids)].reshape((-1, 3))
+    normals = np.array([couple.normal_direction for couple in couplings], dtype=np.float64).reshape((-1, 3))
+    form_jtypes = {form: np.array([_form_jtype(couple, nl) for couple in couplings], dtype=np.int64)
+                   for form, nl in CHECK_FORMS.items()}
+
+    sorted_frames, frame_order, beam_dofs = _beam_results(results_file, np.unique(beam_ids), columns, chunk_rows)
+    beam_rows = np.searchsorted(np.unique(beam_ids), beam_ids)
+    stats = ResidualAccumulator(len(sorted_frames), len(couplings))
+    for frames, node_ids, dofs in iter_result_chunks(results_file, columns, chunk_rows):
+        rows = cont_nodes.lookup(node_ids)
+        is_cont = rows >= 0
+        frames, rows, disp_cont = frames[is_cont], rows[is_cont], dofs[is_cont, 0:3]
+        if len(rows) == 0:
+            continue
+        k = cont_couplings[rows]
+        pos = np.minimum(np.searchsorted(sorted_frames, frames), max(len(sorted_frames) - 1, 0))
+        if len(sorted_frames) == 0 or np.any(sorted_frames[pos] != frames):
+            missing = np.setdiff1d(frames, sorted_frames)
+            raise ValueError('No beam node results in frames {0}.'.format(missing[:10].tolist()))
+        frame_rows = frame_order[pos]
+        u_beam = beam_dofs[frame_rows, beam_rows[k]]
+        if np.any(np.isnan(u_beam)):
+            missing = np.unique(beam_ids[k[np.isnan(u_beam[:, 0])]])
+            raise ValueError('No results for beam nodes {0}.'.format(missing[:10].tolist()))
+        violations = dict()
+        for form, jtypes in form_jtypes.items():
+            violation = np.zeros(len(rows))
+            node_jtypes = jtypes[k]
+            for jtype in np.unique(node_jtypes).tolist():
+                j = node_jtypes == jtype
+                ue = wikc_mpc(jtype, cont_nodes.coords[rows[j]], x_beams[k[j]], u_beam[j, 0:3], u_beam[j, 3:6],
+                              u_beam[j, 6], warp_fun[rows[j]], normals[k[j]])[0]
+                violation[j] = np.linalg.norm(disp_cont[j] - ue, axis=1)
+            violations[form] = violation
+        stats.add(frame_rows, k, violations)
+    report = stats.report()
+    frames = np.empty(len(sorted_frames))
+    frames[frame_order] = sorted_frames
+    report['frames'] = frames.tolist()
+    report['interfaces'] = interfaces
+    return report
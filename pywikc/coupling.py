@@ -1,4 +1,5 @@
-from .constraint import Constraint
+import numpy as np
+from .constraint import ConstraintTable, CONSTRAINT_DTYPE, TERM_OTHER, TERM_SHELL, TERM_WARPING
 
 
 class BSCoupling:
@@ -19,7 +20,8 @@ class BSCoupling:
         self.beam_node = beam_node
         self.coord_sys = coord_sys
 
-        self.constraints = list()
+        self.constraint_table = None
+        self._constraints = None
 
         # Constraint type specification
         self.include_warping = include_warping
@@ -28,57 +30,53 @@ class BSCoupling:
         # Parameters
         self.SHELL_COEF = 1.0
         self.BEAM_DISP_COEF = -1.0
+        self.EQUATION_NAMES = ['disp-x', 'disp-y', 'disp-z']
 
         # Process constraints
         self._construct_constraint_equations()
         return
 
-    def _construct_constraint_equations(self):
-        """ Adds all the constraint equations to the set of constraints. """
-        for shell_id in self.shell_nodes.keys():
-            self._add_x_constraint(shell_id)
-            self._add_y_constraint(shell_id)
-            self._add_z_constraint(shell_id)
-        return
-
-    def _add_x_constraint(self, shell_id):
-        """ Constraint for shell x displacement. """
-        constr = Constraint(constr_name='disp-x')
-        # Shell disp x
-        constr.add_term(node=shell_id, dof=1, coef=self.SHELL_COEF)
-        # Beam disp x
-        constr.add_term(node=self.beam_node, dof=1, coef=self.BEAM_DISP_COEF)
-        # Beam twist z
-        constr.add_term(node=self.beam_node, dof=6, coef=self.shell_nodes[shell_id][1])
-        self.constraints.append(constr)
-        return
+    @property
+    def constraints(self):
+        """ Returns the constraint equations as a list of Constraint, created from the constraint table on request. """
+        if self._constraints is None:
+            self._constraints = self.constraint_table.to_constraints()
+        return self._constraints
 
-    def _add_y_constraint(self, shell_id):
-        """ Constraint for shell y displacement. """
-        constr = Constraint(constr_name='disp-y')
-        # Shell disp y
-        constr.add_term(node=shell_id, dof=2, coef=self.SHELL_COEF)
-        # Beam disp y
-        constr.add_term(node=self.beam_node, dof=2, coef=self.BEAM_DISP_COEF)
-        # Beam twist z
-        constr.add_term(node=self.beam_node, dof=6, coef=-self.shell_nodes[shell_id][0])
-        self.constraints.append(constr)
-        return
+    def _construct_constraint_equations(self):
+        """ Creates the table of the constraint equations of all the shell nodes.
 
-    def _add_z_constraint(self, shell_id):
-        """ Constraint for shell y displacement. """
-        constr = Constraint(constr_name='disp-z')
-        # Shell disp z
-        constr.add_term(node=shell_id, dof=3, coef=self.SHELL_COEF,
-                        name='shell-term')
-        # Beam disp z
-        constr.add_term(node=self.beam_node, dof=3, coef=self.BEAM_DISP_COEF)
-        # Beam rot x
-        constr.add_term(node=self.beam_node, dof=4, coef=-self.shell_nodes[shell_id][1])
-        # Beam rot y
-        constr.add_term(node=self.beam_node, dof=5, coef=self.shell_nodes[shell_id][0])
-        # Beam warping
-        constr.add_term(node=self.beam_node, dof=7, coef=-self.shell_nodes[shell_id][0]*self.shell_nodes[shell_id][1],
-                        name='warping-term')
-        self.constraints.append(constr)
+        Notes:
+            - Each shell node has three equations in order (disp-x, disp-y, disp-z), with the terms:
+                disp-x: shell u1, beam u1, beam ur3 (y)
+                disp-y: shell u2, beam u2, beam ur3 (-x)
+                disp-z: shell u3, beam u3, beam ur1 (-y), beam ur2 (x), beam warping (-x * y)
+            where x and y are the local coordinates of the shell node.
+        """
+        shell_ids = np.array(list(self.shell_nodes.keys()), dtype=np.int64)
+        xy = np.array([coords[:2] for coords in self.shell_nodes.values()], dtype=np.float64).reshape((-1, 2))
+        x = xy[:, 0]
+        y = xy[:, 1]
+        n = len(shell_ids)
+        beam = np.full(n, self.beam_node, dtype=np.int64)
+        # Columns of the 11 terms of each shell node: equation offset, node, dof, coef, kind
+        layout = [(0, shell_ids, 1, self.SHELL_COEF, TERM_OTHER),
+                  (0, beam, 1, self.BEAM_DISP_COEF, TERM_OTHER),
+                  (0, beam, 6, y, TERM_OTHER),
+                  (1, shell_ids, 2, self.SHELL_COEF, TERM_OTHER),
+                  (1, beam, 2, self.BEAM_DISP_COEF, TERM_OTHER),
+                  (1, beam, 6, -x, TERM_OTHER),
+                  (2, shell_ids, 3, self.SHELL_COEF, TERM_SHELL),
+                  (2, beam, 3, self.BEAM_DISP_COEF, TERM_OTHER),
+                  (2, beam, 4, -y, TERM_OTHER),
+                  (2, beam, 5, x, TERM_OTHER),
+                  (2, beam, 7, -x * y, TERM_WARPING)]
+        terms = np.zeros((n, len(layout)), dtype=CONSTRAINT_DTYPE)
+        for j, (offset, nodes, dof, coef, kind) in enumerate(layout):
+            terms['equation'][:, j] = 3 * np.arange(n) + offset
+            terms['node'][:, j] = nodes
+            terms['dof'][:, j] = dof
+            terms['coef'][:, j] = coef
+            terms['kind'][:, j] = kind
+        self.constraint_table = ConstraintTable(terms.ravel(), self.EQUATION_NAMES * n)
         return
@@ -1,2 +1,3 @@
-from .generate_imperfections import set_imperfection_properties, generate_component_imp
+from .generate_imperfections import set_imperfection_properties, generate_component_imp, generate_all_imp
 from .abaqus_txt_writer import AbaqusTxtWriter
+from .imperfection_modes import ImperfectionModes
@@ -1,4 +1,108 @@
 import os
+import numpy as np
+from ..compressed_io import open_text, strip_compression
+
+# Number of nodes formatted at a time
+FORMAT_BLOCK_SIZE = 65536
+WRITE_BUFFER_SIZE = 2 ** 20
+IMP_LINE_FORMAT = '{0:d}, {1:0.6f}, {2:0.6f}, {3:0.6f}\n'
+# Largest |value| * 10^6 that is formatted with integer arithmetic
+_MAX_SCALED = 2. ** 52
+
+_DIGITS = np.frombuffer(b'0123456789', dtype=np.uint8)
+_MINUS = ord('-')
+_POINT = ord('.')
+_FRAC_POWERS = 10 ** np.arange(5, -1, -1, dtype=np.int32)
+
+
+def _int_chars(values):
+    """ Returns the characters of non-negative integers, right-aligned.
+    :param np.ndarray values: (N,) int64 Non-negative integers.
+    :return list: [np.ndarray, np.ndarray] (N, W) uint8 characters and (N, W) bool mask of the used characters.
+    """
+    n_digits = np.ones(len(values), dtype=np.int64)
+    power = 10
+    while np.any(values >= power):
+        n_digits += values >= power
+        power *= 10
+    width = int(n_digits.max()) if len(values) > 0 else 1
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    chars = _DIGITS[(values[:, None] // powers) % 10]
+    used = np.arange(width) >= (width - n_digits)[:, None]
+    return [chars, used]
+
+
+def _fixed6_chars(values):
+    """ Returns the characters of the values formatted as '{:0.6f}', None if any value can not be formatted exactly.
+    :param np.ndarray values: (N,) float64 Values to format.
+    :return list: [np.ndarray, np.ndarray] (N, W) uint8 characters and (N, W) bool mask of the used characters.
+    """
+    with np.errstate(invalid='ignore'):
+        scaled = np.abs(values) * 1.e6
+        if not np.all(scaled < _MAX_SCALED):
+            # nan, inf, or too large for exact integer arithmetic
+            return None
+        # Values close to a rounding tie may be rounded differently than by the string formatting
+        dist_to_tie = np.abs(scaled - np.floor(scaled) - 0.5)
+        if np.any(dist_to_tie <= scaled * 4.e-16):
+            return None
+    rounded = np.rint(scaled).astype(np.int64)
+    int_chars, int_used = _int_chars(rounded // 10 ** 6)
+    frac = (rounded % 10 ** 6).astype(np.int32)
+    frac_chars = _DIGITS[(frac[:, None] // _FRAC_POWERS) % 10]
+    n = len(values)
+    # The sign is placed before the integer part, unused integer digits are removed afterwards
+    sign_chars = np.full((n, 1), _MINUS, dtype=np.uint8)
+    sign_used = np.signbit(values)[:, None]
+    point_chars = np.full((n, 1), _POINT, dtype=np.uint8)
+    chars = np.hstack((sign_chars, int_chars, point_chars, frac_chars))
+    used = np.hstack((sign_used, int_used, np.ones((n, 7), dtype=bool)))
+    return [chars, used]
+
+
+def format_imperfections(ids, imps):
+    """ Returns the imperfection file lines of the nodes.
+    :param np.ndarray ids: (N,) Node IDs.
+    :param np.ndarray imps: (N, 3) Nodal imperfections.
+    :return str: Lines formatted as '<id>, <imp x>, <imp y>, <imp z>' with 6 decimal precision.
+
+    Notes:
+        - Identical to formatting each line with IMP_LINE_FORMAT.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    imps = np.asarray(imps, dtype=np.float64)
+    n = len(ids)
+    if n == 0:
+        return ''
+    # All the components are formatted together, then split into the columns
+    imp_chars = _fixed6_chars(imps.ravel())
+    if np.any(ids < 0) or imp_chars is None:
+        return ''.join(IMP_LINE_FORMAT.format(nid, imp[0], imp[1], imp[2]) for nid, imp in zip(ids.tolist(),
+                                                                                               imps.tolist()))
+    # Build a fixed-width character table of the lines, then drop the unused characters
+    sep_chars = np.tile(np.frombuffer(b', ', dtype=np.uint8), (n, 1))
+    sep_used = np.ones((n, 2), dtype=bool)
+    id_chars, id_used = _int_chars(ids)
+    imp_chars, imp_used = [a.reshape(n, 3, -1) for a in imp_chars]
+    chars = [id_chars]
+    used = [id_used]
+    for i in range(3):
+        chars += [sep_chars, imp_chars[:, i]]
+        used += [sep_used, imp_used[:, i]]
+    chars.append(np.full((n, 1), ord('\n'), dtype=np.uint8))
+    used.append(np.ones((n, 1), dtype=bool))
+    return np.hstack(chars)[np.hstack(used)].tobytes().decode('ascii')
+
+
+def write_imperfection_lines(f, ids, imps):
+    """ Writes the imperfection lines of the nodes in blocks.
+    :param FileObject f: Text file to write to.
+    :param np.ndarray ids: (N,) Node IDs.
+    :param np.ndarray imps: (N, 3) Nodal imperfections.
+    """
+    for i in range(0, len(ids), FORMAT_BLOCK_SIZE):
+        f.write(format_imperfections(ids[i:i + FORMAT_BLOCK_SIZE], imps[i:i + FORMAT_BLOCK_SIZE]))
+    return
 
 
 class AbaqusTxtWriter:
@@ -10,16 +114,33 @@ class AbaqusTxtWriter:
         """
         self.components = components
 
-    def write_imperfections(self, output_file):
+    def write_imperfections(self, output_file, sparse_tol=None):
         """ Writes the imperfection file.
-        :param str output_file: File to be written.
+        :param str output_file: File to be written, compressed if it has a .gz or .xz extension.
+        :param float sparse_tol: If not None, nodes with an imperfection magnitude <= sparse_tol are not written.
+        :return list: [int, int] Number of nodes written and number of nodes skipped.
+
+        Notes:
+            - Nodes that are not in the imperfection file have zero imperfection in Abaqus, so sparse_tol=0. gives
+            the same imperfect geometry as writing every node.
         """
+        n_written = 0
+        n_skipped = 0
         # 6 decimal precision on the output
-        with open(output_file, 'w') as f:
+        with open_text(output_file, 'w', buffering=WRITE_BUFFER_SIZE) as f:
             for c in self.components:
-                for nid, imp in c.node_imperfections.items():
-                    f.write('{0:d}, {1:0.6f}, {2:0.6f}, {3:0.6f}\n'.format(nid, imp[0], imp[1], imp[2]))
+                ids = c.node_imperfections.ids
+                imps = c.node_imperfections.coords
+                if sparse_tol is not None:
+                    keep = np.linalg.norm(imps, axis=1) > sparse_tol
+                    ids = ids[keep]
+                    imps = imps[keep]
+                    n_skipped += len(c.node_imperfections) - len(ids)
+                write_imperfection_lines(f, ids, imps)
+                n_written += len(ids)
 
-        fname = os.path.basename(output_file)
+        fname = strip_compression(os.path.basename(output_file))
         print('Usage:\n\t*IMPERFECTION, input=<path>/{0}'.format(fname))
-        return
+        if sparse_tol is not None:
+            print('Nodes written: {0}, skipped: {1}'.format(n_written, n_skipped))
+        return [n_written, n_skipped]
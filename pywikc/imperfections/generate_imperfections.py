@@ -1,16 +1,35 @@
 """ Functions to generate the imperfection geometries.
 
 """
+import concurrent.futures
 import numpy as np
+from ..node_table import NodeTable
 from .i_sec_imperfections import flange_imperfection, web_imperfection, straightness_imperfection, \
     twisting_imperfection, plumbness_imperfection
+from . import i_sec_imperfections_array as array_imp
+
+# Nodes with |x| <= X_TOL are web nodes, the others are flange nodes
+X_TOL = 1.e-8
+# Relative widening of the local imperfection windows
+WINDOW_TOL = 1.e-6
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
 
 
 def set_imperfection_properties(component):
-    """ Sets all the imperfection properties for the component.
+    """ Sets all the imperfection properties for the component from the definition file properties.
+
+    See imperfection_properties for the properties set.
+    """
+    component.imperfection_props = imperfection_properties(component, component.imperfection_props)
+    pass
+
+
+def imperfection_properties(component, definition_props):
+    """ Returns all the imperfection properties for the component.
+    :param IComponent component: Component that the imperfections are applied to.
+    :param dict definition_props: Imperfection properties from the definition file (scales, num_of_waves, etc.).
 
     Properties dictionary contains:
     n1
@@ -62,60 +81,204 @@ def set_imperfection_properties(component):
     props['n1'] = component.coord_sys.basis[:, 0]
     props['n2'] = component.coord_sys.basis[:, 1]
     props['length'] = component.length
-    props['num_waves'] = component.imperfection_props['num_of_waves']
-    props['total_wave_length'] = component.imperfection_props['wave_length_factor'] * component.section.d
+    props['num_waves'] = definition_props['num_of_waves']
+    props['total_wave_length'] = definition_props['wave_length_factor'] * component.section.d
     props['flange_width'] = component.section.bf
     props['web_depth'] = component.section.d - 2. * component.section.tf
     # todo: other than constant, also for flange and web?
     props['epsilon'] = 0.2
     # RBS connection properties
-    if 'is_RBS' in component.imperfection_props:
-        props['is_RBS'] = component.imperfection_props['is_RBS']
-        props['RBS_offset'] = component.imperfection_props['RBS_offset']
+    if 'is_RBS' in definition_props:
+        props['is_RBS'] = definition_props['is_RBS']
+        props['RBS_offset'] = definition_props['RBS_offset']
     else:
         props['is_RBS'] = False
 
     # Compute maximum amplitudes
-    max_flange_amp = component.section.bf / FLANGE_FACTOR * component.imperfection_props['local_scale']
-    max_web_amp = component.section.d / WEB_FACTOR * component.imperfection_props['local_scale']
+    max_flange_amp = component.section.bf / FLANGE_FACTOR * definition_props['local_scale']
+    max_web_amp = component.section.d / WEB_FACTOR * definition_props['local_scale']
     local_amps = local_amplitudes(component.section, max_web_amp, max_flange_amp)
     props['delta_web'] = local_amps[0]
     props['delta_flange'] = local_amps[1]
-    oos_amp = props['length'] / STRAIGHT_FACTOR * component.imperfection_props['straight_scale']
+    oos_amp = props['length'] / STRAIGHT_FACTOR * definition_props['straight_scale']
     props['delta_global'] = oos_amp
     oop_amp = props['length'] * 0.
     props['delta_plumbness'] = oop_amp
-    props['theta_twist'] = TWIST_FACTOR * component.imperfection_props['twist_scale']
+    props['theta_twist'] = TWIST_FACTOR * definition_props['twist_scale']
     props['oos_axis'] = component.coord_sys.basis[:, 0]
     props['oop_axis'] = component.coord_sys.basis[:, 0]
 
-    component.imperfection_props = props
-    pass
+    return props
 
 
 def generate_component_imp(component):
     """ Generates the imperfections for a component. """
     props = component.imperfection_props
-    mid_height = component.length / 2.
+    beam_imps, continuum_imps = component_imp_arrays(component.beam_nodes.coords, component.continuum_nodes.coords,
+                                                     props, component.length / 2., component.get_continuum_z_order())
+    _set_node_imperfections(component, beam_imps, continuum_imps)
+    pass
+
+
+def generate_all_imp(components, workers=None):
+    """ Sets the imperfection properties and generates the imperfections for all the components.
+    :param list components: [IComponent] Components to generate the imperfections for.
+    :param int workers: If > 1, the components are processed in parallel using this number of processes.
+
+    Notes:
+        - Only the node coordinates and the imperfection properties are sent to the worker processes.
+        - The results are identical to the serial version, and are assigned in the order of components.
+        - On platforms that spawn processes (e.g., Windows), the calling script needs an
+        `if __name__ == '__main__':` guard when workers > 1.
+    """
+    for c in components:
+        set_imperfection_properties(c)
+    if workers is None or workers <= 1 or len(components) < 2:
+        for c in components:
+            generate_component_imp(c)
+        return
+    tasks = [(c.beam_nodes.coords, c.continuum_nodes.coords, c.imperfection_props, c.length / 2.,
+              c.get_continuum_z_order()) for c in components]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        # map returns the results in the order of the tasks
+        results = list(pool.map(_component_imp_task, tasks))
+    for c, (beam_imps, continuum_imps) in zip(components, results):
+        _set_node_imperfections(c, beam_imps, continuum_imps)
+    pass
+
+
+def _component_imp_task(task):
+    """ Worker process entry, task is (beam_coords, continuum_coords, props, mid_height, continuum_z_order). """
+    return component_imp_arrays(*task)
+
+
+def _set_node_imperfections(component, beam_imps, continuum_imps):
+    """ Assigns the imperfections to the component, beam nodes followed by continuum nodes. """
+    ids = np.concatenate((component.beam_nodes.ids, component.continuum_nodes.ids))
+    component.node_imperfections = NodeTable(ids, np.concatenate((beam_imps, continuum_imps)))
+    pass
+
+
+def component_imp_arrays(beam_coords, continuum_coords, props, mid_height, continuum_z_order=None):
+    """ Returns the imperfections of the beam and continuum nodes of a component.
+    :param np.ndarray beam_coords: (N, 3) Beam node positions in component coordinate system.
+    :param np.ndarray continuum_coords: (M, 3) Continuum node positions in component coordinate system.
+    :param dict props: Defines the properties of the imperfection.
+    :param float mid_height: Nodes above this z coordinate are in the top segment, if not an RBS.
+    :param np.ndarray continuum_z_order: (M,) Rows of continuum_coords sorted by z coordinate, computed if None.
+    :return list: [np.ndarray, np.ndarray] (N, 3) beam and (M, 3) continuum nodal imperfections.
+    """
     # Process the beam nodes
-    for node_id, coords in component.beam_nodes.items():
-        imp = np.array([0., 0., 0.])
-        imp += i_straight_imp(coords, props)
-        imp += i_plumb_imp(coords, props)
-        component.node_imperfections[node_id] = imp
+    beam_imps = i_beam_imp_array(beam_coords, props)
     # Process the continuum nodes
-    for node_id, coords in component.continuum_nodes.items():
-        if coords[2] > mid_height and props['is_RBS'] is False:
-            is_top = True
-        else:
-            is_top = False
-        imp = np.array([0., 0., 0.])
-        imp += i_straight_imp(coords, props)
-        imp += i_plumb_imp(coords, props)
-        imp += i_local_imp(coords, props, is_top)
-        imp += i_twist_imp(coords, props)
-        component.node_imperfections[node_id] = imp
-    pass
+    continuum_imps = i_continuum_imp_array(continuum_coords, props, mid_height, continuum_z_order)
+    return [beam_imps, continuum_imps]
+
+
+def i_beam_imp_array(coords, props):
+    """ Returns the imperfections of beam nodes.
+    :param np.ndarray coords: (N, 3) Node positions in component coordinate system.
+    :param dict props: Defines the properties of the imperfection.
+    :return np.ndarray: (N, 3) Nodal imperfections.
+    """
+    imp = np.zeros((len(coords), 3))
+    imp += array_imp.straightness_imperfection(coords[:, 2], **props)
+    imp += array_imp.plumbness_imperfection(coords[:, 2], **props)
+    return imp
+
+
+def i_continuum_imp_array(coords, props, mid_height, z_order=None):
+    """ Returns the imperfections of continuum nodes.
+    :param np.ndarray coords: (N, 3) Node positions in component coordinate system.
+    :param dict props: Defines the properties of the imperfection.
+    :param float mid_height: Nodes above this z coordinate are in the top segment, if not an RBS.
+    :param np.ndarray z_order: (N,) Rows of coords sorted by z coordinate, computed if None.
+    :return np.ndarray: (N, 3) Nodal imperfections.
+    """
+    x = coords[:, 0]
+    y = coords[:, 1]
+    z = coords[:, 2]
+    imp = np.zeros((len(coords), 3))
+    imp += array_imp.straightness_imperfection(z, **props)
+    imp += array_imp.plumbness_imperfection(z, **props)
+    imp += i_local_imp_array(coords, props, (z > mid_height) & (props['is_RBS'] is False), z_order)
+    imp += array_imp.twisting_imperfection(x, y, z, **props)
+    return imp
+
+
+def local_imp_windows(props):
+    """ Returns the z ranges that can have local imperfections.
+    :param dict props: Defines the properties of the imperfection.
+    :return list: [[float, float]] Lower and upper z bounds of each window.
+
+    Notes:
+        - The windows are widened by WINDOW_TOL relative to the component length so that nodes on the window
+        boundaries are always included, the nodes in the windows are still checked individually.
+    """
+    tol = WINDOW_TOL * max(props['length'], props['total_wave_length'], 1.)
+    wave_length = props['total_wave_length']
+    if props['is_RBS']:
+        return [[props['RBS_offset'] - tol, props['RBS_offset'] + wave_length + tol]]
+    # Bottom and top segments
+    return [[-wave_length - tol, wave_length + tol],
+            [props['length'] - wave_length - tol, props['length'] + wave_length + tol]]
+
+
+def local_imp_rows(z, props, z_order=None):
+    """ Returns the rows of the nodes that are in the local imperfection windows.
+    :param np.ndarray z: (N,) z coordinates of the nodes in the component coordinate system.
+    :param dict props: Defines the properties of the imperfection.
+    :param np.ndarray z_order: (N,) Rows of z sorted by z coordinate, computed if None.
+    :return np.ndarray: (M,) Sorted rows of the nodes in the windows.
+    """
+    if z_order is None:
+        z_order = np.argsort(z, kind='stable')
+    z_sorted = z[z_order]
+    rows = []
+    for z_min, z_max in local_imp_windows(props):
+        start = np.searchsorted(z_sorted, z_min, side='left')
+        end = np.searchsorted(z_sorted, z_max, side='right')
+        rows.append(z_order[start:end])
+    return np.unique(np.concatenate(rows + [np.zeros(0, dtype=np.int64)]))
+
+
+def i_local_imp_array(coords, props, is_top_seg, z_order=None):
+    """ Returns the local flange/web imperfections.
+    :param np.ndarray coords: (N, 3) Node positions in component coordinate system.
+    :param dict props: Defines the properties of the imperfection.
+    :param np.ndarray is_top_seg: (N,) True for the nodes in the top segment.
+    :param np.ndarray z_order: (N,) Rows of coords sorted by z coordinate, computed if None.
+    :return np.ndarray: (N, 3) Nodal imperfections.
+
+    Notes:
+        - Same as i_local_imp for all the nodes at once.
+        - Only the nodes in the local imperfection windows are evaluated, the others have zero imperfection.
+    """
+    x = coords[:, 0]
+    is_web_node = (np.abs(x) <= X_TOL)
+    # Zero imperfection, same as evaluating a node outside of the windows
+    local_imp = np.where(is_web_node[:, None], 0. * props['n1'], 0. * props['n2'])
+    rows = local_imp_rows(coords[:, 2], props, z_order)
+    x = x[rows]
+    y = coords[rows, 1]
+    z = coords[rows, 2]
+    is_top_seg = is_top_seg[rows]
+    # Top segment z_mod starts at the top of the column and is positive in -z direction
+    z_mod = np.where(is_top_seg, props['length'] - z, z)
+    # Account for the RBS offset, if RBS, will always be "bottom segment"
+    if props['is_RBS']:
+        in_rbs = (props['RBS_offset'] <= z) & (z <= props['RBS_offset'] + props['total_wave_length'])
+        # Large value so that will not be considered for local imperfections
+        z_mod = np.where(in_rbs, z_mod - props['RBS_offset'], 1.0e8)
+    # Separate flange and web
+    is_web_node = is_web_node[rows]
+    is_flange_node = ~is_web_node
+    local_imp[rows[is_web_node]] = array_imp.web_imperfection(y[is_web_node], z_mod[is_web_node],
+                                                              is_top_seg[is_web_node], **props)
+    local_imp[rows[is_flange_node]] = array_imp.flange_imperfection(x[is_flange_node], y[is_flange_node],
+                                                                    z_mod[is_flange_node],
+                                                                    is_top_seg[is_flange_node], **props)
+    return local_imp
 
 
 def i_local_imp(coord, props, is_top_seg):
@@ -145,8 +308,7 @@ def i_local_imp(coord, props, is_top_seg):
             z_mod = 1.0e8
     # Separate flange and web
     # todo: is seperating on x==0 the best condition? - is it necessary?
-    x_tol = 1.e-8
-    is_web_node = (abs(x) <= x_tol)
+    is_web_node = (abs(x) <= X_TOL)
     if is_web_node:
         # Web node
         local_imp = web_imperfection(y, z_mod, should_reverse, **props)
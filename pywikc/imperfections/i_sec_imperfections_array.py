@@ -0,0 +1,137 @@
+""" Array versions of the nodal imperfection functions in i_sec_imperfections.
+
+Each function has the same arguments as its counterpart in i_sec_imperfections, but the node coordinates (and
+reverse_wave) are (N,) arrays, and the result is an (N, 3) array of nodal imperfections in the global coordinates.
+The operations are evaluated in the same order as the scalar functions so that the results are identical.
+"""
+import numpy as np
+
+
+def z_dir_imp_factor(z, num_waves, total_wave_length, **kwargs):
+    """ Returns the imperfection factor based on the z-direction.
+    :param np.ndarray z: (N,) Coordinate in length direction.
+    :param int num_waves: Number of half-wave lengths, either 1 or 2.
+    :param float total_wave_length: Range of the local imperfection along the length.
+    :return np.ndarray: (N,) The factor in the length direction.
+    """
+    if num_waves == 2:
+        z_norm_factor = 0.3849  # to normalize h to maximum of 1.0
+        h = np.sin(np.pi * z / total_wave_length) ** 2 * \
+            np.cos(np.pi * z / total_wave_length) / z_norm_factor
+    elif num_waves == 1:
+        h = np.sin(np.pi * z / total_wave_length) ** 2
+    else:
+        raise ValueError('num_waves should be either 1 or 2')
+    return h
+
+
+def flange_imperfection(x, y, z, reverse_wave, flange_width, total_wave_length, delta_flange, num_waves, epsilon, n2,
+                        **kwargs):
+    """ Returns the local imperfection specification for nodes on the flanges.
+
+    :param np.ndarray x: (N,) x coordinates of nodes
+    :param np.ndarray y: (N,) y coordinates of nodes
+    :param np.ndarray z: (N,) z coordinates of nodes
+    :param np.ndarray reverse_wave: (N,) reverse the direction of the local buckle wave
+    :return np.ndarray: (N, 3) nodal imperfections in the global coordinates
+
+    See i_sec_imperfections.flange_imperfection for the other parameters.
+    """
+    # Factor in x-direction
+    a1 = -4.963
+    a2 = 9.852
+    a3 = -9.778
+    # x_b is normalized to between [-1, 1]
+    x_b = x / (flange_width / 2.0)
+    max_deflection = 1. + epsilon / (2. * a3) * (1. + a1 + a2 + a3)
+
+    # take care to do the same thing on the positive and negative half-flanges
+    x_b_abs = np.abs(x_b)
+    x_sign = np.where(x_b < 0, -1.0, 1.0)
+    f = x_b_abs + epsilon / (2 * a3) * (x_b_abs ** 3 + a1 * x_b_abs ** 4 + a2 * x_b_abs ** 3 + a3 * x_b_abs ** 2)
+    f = f * x_sign / max_deflection
+    # Negative flange, modify to be opposite to that of the positive flange
+    f = np.where(y < 0., -1.0 * f, f)
+
+    # Factor in z-direction
+    h = z_dir_imp_factor(z, num_waves, total_wave_length)
+    # Total imperfection
+    w = f * h * delta_flange
+    w = np.where(reverse_wave, -1.0 * w, w)
+    # if beyond the range, no local imperfections
+    w = np.where(np.abs(z) > total_wave_length, 0., w)
+    return np.outer(w, n2)
+
+
+def web_imperfection(y, z, reverse_wave, web_depth, total_wave_length, delta_web, num_waves, epsilon, n1,
+                     **kwargs):
+    """ Returns the local imperfection specification for nodes on the web.
+
+    :param np.ndarray y: (N,) y coordinates of nodes, -web_depth / 2 <= y <= web_depth / 2
+    :param np.ndarray z: (N,) z coordinates of nodes, 0 <= z <= total_wave_length
+    :param np.ndarray reverse_wave: (N,) reverse the direction of the local buckle wave
+    :return np.ndarray: (N, 3) nodal imperfections in the global coordinates
+
+    See i_sec_imperfections.web_imperfection for the other parameters.
+    """
+    # Factor in y-direction
+    g_norm_factor = 1.02146
+    y_b = y / web_depth
+    g = np.pi * epsilon / 2. * (y_b ** 2 - 0.25) + (1. + epsilon / 2.) * np.cos(np.pi * y_b)
+    g = g / g_norm_factor
+
+    # Factor in z-direction
+    h = z_dir_imp_factor(z, num_waves, total_wave_length)
+
+    w = g * h * delta_web
+    w = np.where(reverse_wave, -1.0 * w, w)
+    # if beyond the range, no local imperfections
+    w = np.where(np.abs(z) > total_wave_length, 0., w)
+    return np.outer(w, n1)
+
+
+def straightness_imperfection(z, length, delta_global, oos_axis, **kwargs):
+    """ Returns the out-of-straightness imperfection of the nodes.
+
+    :param np.ndarray z: (N,) z coordinates of nodes
+    :return np.ndarray: (N, 3) nodal imperfections in the global coordinates
+
+    See i_sec_imperfections.straightness_imperfection for the other parameters.
+    """
+    w = -1.0 * (np.cos(2.0 * np.pi * z / length) - 1.0) * delta_global / 2.
+    return np.outer(w, oos_axis)
+
+
+def plumbness_imperfection(z, length, delta_plumbness, oop_axis, **kwargs):
+    """  Returns the out-of-plumbness imperfection of the nodes.
+
+    :param np.ndarray z: (N,) z coordinates of nodes
+    :return np.ndarray: (N, 3) nodal imperfections in the global coordinates
+
+    See i_sec_imperfections.plumbness_imperfection for the other parameters.
+    """
+    w = delta_plumbness * z / length
+    return np.outer(w, oop_axis)
+
+
+def twisting_imperfection(x, y, z, length, theta_twist, n1, n2, **kwargs):
+    """ Returns the twisting imperfection of the nodes.
+
+    :param np.ndarray x: (N,) x coordinates of nodes
+    :param np.ndarray y: (N,) y coordinates of nodes
+    :param np.ndarray z: (N,) z coordinates of nodes
+    :return np.ndarray: (N, 3) nodal imperfections in the global coordinates
+
+    See i_sec_imperfections.twisting_imperfection for the other parameters.
+    """
+    theta = theta_twist * (np.sin(np.pi * z / length) ** 2)
+
+    u_web = -1.0 * y * np.sin(theta)
+    v_web = -1.0 * y * (1 - np.cos(theta))
+
+    u_flange = x * (1 - np.cos(theta))
+    v_flange = 1.0 * x * np.sin(theta)
+
+    u = u_web + u_flange
+    v = v_web + v_flange
+    return np.outer(u, n1) + np.outer(v, n2)
@@ -0,0 +1,85 @@
+""" Precomputed imperfection shapes for fast sweeps over the imperfection scales.
+
+The local, out-of-straightness, and out-of-plumbness imperfections are linear in their amplitudes, so they are
+computed once at unit scale and any combination of scales is a linear combination of these shapes.
+The twisting imperfection is a rigid rotation of the cross-section and is not linear in the twist angle, so only
+the angle distribution along the length is precomputed and the rotation is applied for each twist scale.
+"""
+import numpy as np
+from ..node_table import NodeTable
+from .generate_imperfections import imperfection_properties, i_local_imp_array
+from . import i_sec_imperfections_array as array_imp
+
+
+class ImperfectionModes:
+    """ Unit-amplitude imperfection shapes of a component. """
+
+    def __init__(self, component):
+        """ Constructor.
+        :param IComponent component: Component with the definition file imperfection properties.
+
+        Notes:
+            - Uses the definition file properties of the component, so it can be constructed before or after
+            set_imperfection_properties is called on the component.
+            - The component nodes are ordered as in generate_component_imp: beam nodes, then continuum nodes.
+        """
+        definition_props = component.definition_imperfection_props
+        if 'num_of_waves' not in definition_props:
+            raise ValueError('Component {0} does not have the definition file imperfection properties.'.format(
+                component.id))
+        unit_scales = {'local_scale': 1., 'straight_scale': 1., 'twist_scale': 1.}
+        self.props = imperfection_properties(component, {**definition_props, **unit_scales})
+        # Default scales from the definition file
+        self.default_scales = {k: definition_props[k] for k in unit_scales}
+        props = {**self.props, 'delta_plumbness': 1.}
+        beam_coords = component.beam_nodes.coords
+        cont_coords = component.continuum_nodes.coords
+        coords = np.concatenate((beam_coords, cont_coords))
+        self.n_beam = len(beam_coords)
+        self.ids = np.concatenate((component.beam_nodes.ids, component.continuum_nodes.ids))
+
+        # Linear modes
+        self.straight_mode = array_imp.straightness_imperfection(coords[:, 2], **props)
+        self.plumb_mode = array_imp.plumbness_imperfection(coords[:, 2], **props)
+        self.local_mode = np.zeros((len(coords), 3))
+        is_top = (cont_coords[:, 2] > component.length / 2.) & (props['is_RBS'] is False)
+        self.local_mode[self.n_beam:] = i_local_imp_array(cont_coords, props, is_top,
+                                                       component.get_continuum_z_order())
+        # Twist: unit angle distribution and position of the continuum nodes
+        self.twist_angle = self.props['theta_twist'] * (np.sin(np.pi * cont_coords[:, 2] / props['length']) ** 2)
+        self.twist_xy = cont_coords[:, :2].copy()
+
+    def imperfections(self, local_scale=None, straight_scale=None, twist_scale=None, delta_plumbness=0.):
+        """ Returns the nodal imperfections for the scales.
+        :param float local_scale: Scale of the local imperfections, definition file value if None.
+        :param float straight_scale: Scale of the out-of-straightness imperfection, definition file value if None.
+        :param float twist_scale: Scale of the twisting imperfection, definition file value if None.
+        :param float delta_plumbness: Amplitude of the out-of-plumbness imperfection.
+        :return np.ndarray: (N, 3) Nodal imperfections, rows correspond to self.ids.
+        """
+        if local_scale is None:
+            local_scale = self.default_scales['local_scale']
+        if straight_scale is None:
+            straight_scale = self.default_scales['straight_scale']
+        if twist_scale is None:
+            twist_scale = self.default_scales['twist_scale']
+        imp = straight_scale * self.straight_mode
+        if delta_plumbness != 0.:
+            imp += delta_plumbness * self.plumb_mode
+        if local_scale != 0.:
+            imp += local_scale * self.local_mode
+        if twist_scale != 0.:
+            theta = twist_scale * self.twist_angle
+            x = self.twist_xy[:, 0]
+            y = self.twist_xy[:, 1]
+            sin_t = np.sin(theta)
+            one_m_cos_t = 1 - np.cos(theta)
+            u = -1.0 * y * sin_t + x * one_m_cos_t
+            v = -1.0 * y * one_m_cos_t + 1.0 * x * sin_t
+            imp[self.n_beam:] += np.outer(u, self.props['n1']) + np.outer(v, self.props['n2'])
+        return imp
+
+    def apply(self, component, **scales):
+        """ Sets the nodal imperfections of the component for the scales, see imperfections for the arguments. """
+        component.node_imperfections = NodeTable(self.ids, self.imperfections(**scales))
+        pass
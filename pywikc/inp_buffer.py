@@ -0,0 +1,257 @@
+""" Bulk parsing of numeric data blocks directly from a memory-mapped Abaqus input file.
+
+A data block is given as a byte range of the mapped file. The block is parsed in chunks of about BUFFER_CHUNK_SIZE
+bytes that end on a line break: each chunk is validated and converted to numbers with a single NumPy call, so no
+Python string is created for the individual lines or values and the memory used in addition to the resulting arrays
+is bounded by the chunk size.
+
+Chunks that do not have a regular layout (comments, empty values, lines with differing numbers of values, values that
+are not plain numbers) are parsed line by line with the same functions as the text reader, so the results are
+identical to parsing the decoded lines.
+"""
+import concurrent.futures
+import contextlib
+import mmap
+import warnings
+import numpy as np
+from .inp_tokenizer import n_set_ids, COMMENT_START
+from .node_table import parse_node_lines, node_data_arrays
+
+BUFFER_CHUNK_SIZE = 2 ** 22
+# Blocks larger than this (bytes) are parsed in parallel if workers are requested
+PARALLEL_MIN_SIZE = 2 ** 25
+# Number of byte ranges per worker process, so that the work stays balanced
+RANGES_PER_WORKER = 4
+
+_WHITESPACE = b' \t\r\x0b\x0c'
+_NEWLINE_TO_COMMA = bytes.maketrans(b'\n', b',')
+_NEWLINE = ord('\n')
+_COMMA = ord(',')
+
+
+def chunk_ranges(buf, start, end, chunk_size=BUFFER_CHUNK_SIZE):
+    """ Returns the byte ranges of the chunks of the block, each chunk ends after a line break or at the end.
+    :param buffer buf: Memory-mapped file (or any bytes-like object with find and rfind).
+    :param int start: Offset of the first byte of the block.
+    :param int end: Offset after the last byte of the block.
+    :param int chunk_size: Target size of the chunks in bytes.
+    :return list: [[int, int]] Start and end offsets of each chunk.
+    """
+    ranges = []
+    a = start
+    while a < end:
+        b = min(a + chunk_size, end)
+        if b < end:
+            line_end = buf.rfind(b'\n', a, b)
+            if line_end < 0:
+                # Line longer than the chunk size
+                line_end = buf.find(b'\n', b, end)
+            b = end if line_end < 0 else line_end + 1
+        ranges.append([a, b])
+        a = b
+    return ranges
+
+
+def release_pages(buf, start, end):
+    """ Releases the pages of a memory-mapped file that are fully in the byte range, they are read again if needed.
+
+    Notes:
+        - Keeps the resident memory from growing to the size of the file while it is parsed.
+        - Does nothing if buf is not a memory-mapped file or the platform does not support it.
+    """
+    if not hasattr(buf, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    first_page = (start + mmap.PAGESIZE - 1) // mmap.PAGESIZE * mmap.PAGESIZE
+    last_page = end // mmap.PAGESIZE * mmap.PAGESIZE
+    if last_page > first_page:
+        buf.madvise(mmap.MADV_DONTNEED, first_page, last_page - first_page)
+    return
+
+
+def buffer_lines(buf, start, end):
+    """ Returns the stripped data lines of the block, comments and empty lines are skipped. """
+    lines = []
+    for line in bytes(buf[start:end]).decode().splitlines():
+        li = line.strip()
+        if li != '' and li[:len(COMMENT_START)] != COMMENT_START:
+            lines.append(li)
+    return lines
+
+
+def _parse_numbers(chunk, uniform_lines):
+    """ Returns the values in the chunk, None if the chunk needs to be parsed line by line.
+    :param bytes chunk: Data lines with comma separated values.
+    :param bool uniform_lines: If True, all the lines need the same number of values.
+    :return np.ndarray: (N, M) values of the N lines if uniform_lines, otherwise (K,) values in order.
+    """
+    packed = chunk.translate(None, _WHITESPACE).rstrip(b'\n')
+    if packed == b'':
+        return np.zeros((0, 1)) if uniform_lines else np.zeros(0)
+    if b'*' in packed:
+        # Comments
+        return None
+    chars = np.frombuffer(packed, dtype=np.uint8)
+    is_sep = (chars == _COMMA) | (chars == _NEWLINE)
+    if is_sep[0] or is_sep[-1] or np.any(is_sep[1:] & is_sep[:-1]):
+        # Empty values or empty lines
+        return None
+    with warnings.catch_warnings():
+        # Values that are not plain numbers raise a DeprecationWarning in np.fromstring
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(packed.translate(_NEWLINE_TO_COMMA), dtype=np.float64, sep=',')
+        except (ValueError, DeprecationWarning):
+            return None
+    if not uniform_lines:
+        return values
+    # Whether each value is the last one of its line
+    ends_line = np.append(chars[np.flatnonzero(is_sep)] == _NEWLINE, True)
+    n_values = int(np.argmax(ends_line)) + 1
+    if len(ends_line) != len(values) or len(values) % n_values != 0:
+        return None
+    ends_line = ends_line.reshape((-1, n_values))
+    if not np.all(ends_line[:, -1]) or np.any(ends_line[:, :-1]):
+        # Lines with differing numbers of values
+        return None
+    return values.reshape((-1, n_values))
+
+
+def _max_lines(buf, ranges):
+    """ Returns the number of lines in the chunks, an upper bound on the number of data lines. """
+    n_lines = 0
+    for a, b in ranges:
+        chunk = buf[a:b]
+        n_lines += chunk.count(b'\n') + (chunk[-1:] not in (b'\n', b''))
+        release_pages(buf, a, b)
+    return n_lines
+
+
+def buffer_node_arrays(buf, start, end):
+    """ Returns the IDs and coordinates of a *Node block.
+    :param buffer buf: Memory-mapped input file.
+    :param int start: Offset of the first data byte of the block.
+    :param int end: Offset after the last data byte of the block.
+    :return list: [np.ndarray, np.ndarray] (N,) IDs and (N, 3) coordinates.
+
+    Notes:
+        - The arrays are allocated once, with one row per line of the block, so that the chunks do not need to be
+        concatenated afterwards. If the block has comment or empty lines, the arrays are views of the filled rows.
+    """
+    ranges = chunk_ranges(buf, start, end)
+    n_max = _max_lines(buf, ranges)
+    ids = np.zeros(n_max, dtype=np.int64)
+    coords = np.zeros((n_max, 3))
+    n = 0
+    for a, b in ranges:
+        data = _parse_numbers(buf[a:b], uniform_lines=True)
+        if data is not None and data.shape[1] >= 2:
+            chunk_ids, chunk_coords = node_data_arrays(data)
+        else:
+            chunk_ids, chunk_coords = parse_node_lines(buffer_lines(buf, a, b))
+        release_pages(buf, a, b)
+        ids[n:n + len(chunk_ids)] = chunk_ids
+        coords[n:n + len(chunk_ids)] = chunk_coords
+        n += len(chunk_ids)
+    return [ids[:n], coords[:n]]
+
+
+def buffer_n_set_ids(buf, start, end, use_generate):
+    """ Returns the IDs of the nodes in a *Nset block.
+    :param buffer buf: Memory-mapped input file.
+    :param int start: Offset of the first data byte of the block.
+    :param int end: Offset after the last data byte of the block.
+    :param bool use_generate: If True, data lines are <first>, <last>, <increment>.
+    :return np.ndarray: (N,) int64 Node IDs in the set.
+    """
+    if use_generate:
+        # Only a few lines
+        return n_set_ids(buffer_lines(buf, start, end), use_generate)
+    id_chunks = [np.zeros(0, dtype=np.int64)]
+    for a, b in chunk_ranges(buf, start, end):
+        values = _parse_numbers(buf[a:b], uniform_lines=False)
+        if values is not None:
+            id_chunks.append(values.astype(np.int64))
+        else:
+            id_chunks.append(n_set_ids(buffer_lines(buf, a, b), use_generate))
+        release_pages(buf, a, b)
+    return np.concatenate(id_chunks)
+
+
+def _parallel_ranges(buf, start, end, workers):
+    """ Returns the byte ranges of the block for the worker processes, None if the block is parsed serially. """
+    if workers is None or workers <= 1 or end - start < PARALLEL_MIN_SIZE:
+        return None
+    range_size = -(-(end - start) // (workers * RANGES_PER_WORKER))
+    return chunk_ranges(buf, start, end, max(range_size, BUFFER_CHUNK_SIZE))
+
+
+@contextlib.contextmanager
+def worker_pool(workers=None):
+    """ Context manager of the process pool shared by the blocks of one read, gives None if workers <= 1.
+
+    Notes:
+        - The worker processes are only started when the first large block is parsed.
+    """
+    if workers is None or workers <= 1:
+        yield None
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        yield pool
+
+
+def _map_tasks(tasks, workers, pool):
+    """ Returns the results of the mapped tasks in order, uses a new pool for the tasks if pool is None. """
+    if pool is not None:
+        return list(pool.map(_mapped_task, tasks))
+    with worker_pool(workers) as pool:
+        return list(pool.map(_mapped_task, tasks))
+
+
+def _mapped_task(task):
+    """ Worker process entry, task is (parse function, inp_file, start, end, extra args). """
+    parse_function, inp_file, start, end, args = task
+    with open(inp_file, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_function(buf, start, end, *args)
+        finally:
+            buf.close()
+
+
+def parallel_node_arrays(buf, inp_file, start, end, workers=None, pool=None):
+    """ Returns the IDs and coordinates of a *Node block, large blocks are parsed in worker processes.
+    :param buffer buf: Memory-mapped input file.
+    :param str inp_file: Path to the input file, mapped again by each worker process.
+    :param int start: Offset of the first data byte of the block.
+    :param int end: Offset after the last data byte of the block.
+    :param int workers: If > 1, number of processes used for blocks larger than PARALLEL_MIN_SIZE.
+    :param concurrent.futures.Executor pool: Pool of the worker processes, see worker_pool. A pool is created for
+    the block if None.
+    :return list: [np.ndarray, np.ndarray] (N,) IDs and (N, 3) coordinates.
+
+    Notes:
+        - The block is split into byte ranges aligned on line breaks, the results are concatenated in order so that
+        they are identical to buffer_node_arrays.
+        - Pass the pool when parsing several blocks, so that the worker processes are started once per read.
+        - On platforms that spawn processes (e.g., Windows), the calling script needs an
+        `if __name__ == '__main__':` guard when workers > 1.
+    """
+    ranges = _parallel_ranges(buf, start, end, workers)
+    if ranges is None:
+        return buffer_node_arrays(buf, start, end)
+    tasks = [(buffer_node_arrays, inp_file, a, b, ()) for a, b in ranges]
+    results = _map_tasks(tasks, workers, pool)
+    return [np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])]
+
+
+def parallel_n_set_ids(buf, inp_file, start, end, use_generate, workers=None, pool=None):
+    """ Returns the IDs of the nodes in a *Nset block, large blocks are parsed in worker processes.
+
+    See buffer_n_set_ids and parallel_node_arrays for the parameters.
+    """
+    ranges = None if use_generate else _parallel_ranges(buf, start, end, workers)
+    if ranges is None:
+        return buffer_n_set_ids(buf, start, end, use_generate)
+    tasks = [(buffer_n_set_ids, inp_file, a, b, (use_generate,)) for a, b in ranges]
+    results = _map_tasks(tasks, workers, pool)
+    return np.concatenate(results)
@@ -0,0 +1,100 @@
+""" Reading of Abaqus input files split with *Include, input=<file>.
+
+Each file of the include tree is scanned on its own into a list of items in file order: the requested node sets,
+the *Node blocks, the *System definitions, and the *Include references. The files do not depend on each other, so
+they can be scanned concurrently in worker processes. The items are then merged by the reader in deck order, i.e.,
+the items of an included file replace its *Include line, so that the active *System carries across file boundaries
+as if the deck was a single file.
+"""
+import concurrent.futures
+import os
+from .inp_tokenizer import InpTokenizer, n_set_ids, n_set_first_id, NSET_KEYW, NODE_KEYW, SYSTEM_KEYW, INCLUDE_KEYW
+from .node_table import parse_node_lines
+from .compressed_io import open_text
+
+
+def include_path(including_file, input_option):
+    """ Returns the absolute path of an included file.
+    :param str including_file: Path to the file that contains the *Include keyword.
+    :param str input_option: Value of the input option, relative paths are relative to the including file.
+    """
+    file_name = input_option.strip().strip('"\'')
+    if not os.path.isabs(file_name):
+        file_name = os.path.join(os.path.dirname(os.path.abspath(including_file)), file_name)
+    return os.path.normpath(file_name)
+
+
+def scan_inp_items(inp_file, set_names, head_set_names=frozenset()):
+    """ Returns the items of a single input file in file order, included files are not read.
+    :param str inp_file: Path to the Abaqus input file.
+    :param set set_names: {str} Names of the node sets to read, the other node sets are skipped.
+    :param set head_set_names: {str} Names of the node sets of which only the first node is read.
+    :return list: [[str, object]] Keyword and data of each item, see Notes.
+
+    Notes:
+        - The items are:
+            [NSET_KEYW, [str, np.ndarray]]: Name and IDs of a requested node set, or its first ID for a head set.
+            [NODE_KEYW, [np.ndarray, np.ndarray]]: IDs and coordinates of a *Node block.
+            [SYSTEM_KEYW, [str]]: Data lines of a *System definition.
+            [INCLUDE_KEYW, str]: Absolute path of an included file.
+    """
+    items = []
+    with open_text(inp_file, 'r') as file:
+        for keyword, options, data in InpTokenizer(file).blocks():
+            if keyword == NSET_KEYW:
+                if options['nset'] in set_names:
+                    items.append([keyword, [options['nset'], n_set_ids(data, 'generate' in options)]])
+                elif options['nset'] in head_set_names:
+                    items.append([keyword, [options['nset'], n_set_first_id(data, 'generate' in options)]])
+            elif keyword == NODE_KEYW:
+                items.append([keyword, parse_node_lines(data)])
+            elif keyword == SYSTEM_KEYW:
+                items.append([keyword, list(data)])
+            elif keyword == INCLUDE_KEYW:
+                items.append([keyword, include_path(inp_file, options['input'])])
+    return items
+
+
+def included_files(items):
+    """ Returns the paths of the files included in the items, in file order. """
+    return [data for keyword, data in items if keyword == INCLUDE_KEYW]
+
+
+def scan_include_tree(inp_file, set_names, workers=None, head_set_names=frozenset()):
+    """ Returns the items of the input file and of all the files it includes, directly or not.
+    :param str inp_file: Path to the Abaqus input file.
+    :param set set_names: {str} Names of the node sets to read.
+    :param int workers: If > 1, the files are scanned concurrently using this number of processes.
+    :param set head_set_names: {str} Names of the node sets of which only the first node is read.
+    :return dict: {str: list} Items of each file keyed by absolute path, see scan_inp_items.
+
+    Notes:
+        - Each file is scanned once, even if it is included more than once.
+        - Included files are submitted as soon as the file that includes them is scanned, so the files of different
+        members are scanned at the same time.
+        - On platforms that spawn processes (e.g., Windows), the calling script needs an
+        `if __name__ == '__main__':` guard when workers > 1.
+    """
+    root = os.path.abspath(inp_file)
+    file_items = dict()
+    if workers is None or workers <= 1:
+        pending = [root]
+        while pending:
+            file_name = pending.pop(0)
+            if file_name not in file_items:
+                file_items[file_name] = scan_inp_items(file_name, set_names, head_set_names)
+                pending += included_files(file_items[file_name])
+        return file_items
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(scan_inp_items, root, set_names, head_set_names): root}
+        submitted = {root}
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                file_name = futures.pop(future)
+                file_items[file_name] = future.result()
+                for included in included_files(file_items[file_name]):
+                    if included not in submitted:
+                        submitted.add(included)
+                        futures[pool.submit(scan_inp_items, included, set_names, head_set_names)] = included
+    return file_items
@@ -0,0 +1,307 @@
+""" Sidecar index of the keyword blocks in Abaqus input files.
+
+The index records the byte offsets and line ranges of every *Nset, *Node, *System, and *Include block of an input file,
+and the range of the node IDs of each *Node block. It is built in one scan of the file and stored next to the input
+file, so that later reads can jump directly to the node sets and node blocks that are needed.
+
+The index is valid as long as the input file is unchanged: if the size or modification time of the file differ from
+the recorded values, the content hash is checked and the index is rebuilt if the contents changed.
+"""
+import json
+import mmap
+import os
+import numpy as np
+from .inp_tokenizer import parse_keyword_line, n_set_first_id, NSET_KEYW, NODE_KEYW, SYSTEM_KEYW, INCLUDE_KEYW, \
+    COMMENT_START
+from .model_cache import file_hash
+from .inp_buffer import chunk_ranges, release_pages, buffer_lines, buffer_node_arrays, parallel_node_arrays, \
+    parallel_n_set_ids, BUFFER_CHUNK_SIZE
+
+# Increment if the layout of the index file changes
+INDEX_VERSION = 4
+INDEX_EXTENSION = '.wikcidx'
+INDEXED_KEYWORDS = [NSET_KEYW, NODE_KEYW, SYSTEM_KEYW, INCLUDE_KEYW]
+# Bytes read at a time to find the first node of a *Nset block
+HEAD_CHUNK_SIZE = 2 ** 16
+
+
+def index_file_path(inp_file):
+    """ Returns the path of the sidecar index of the input file. """
+    return inp_file + INDEX_EXTENSION
+
+
+def _file_stamp(inp_file):
+    """ Returns the size and modification time (ns) of the file. """
+    stat = os.stat(inp_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def keyword_lines(buf):
+    """ Yields the lines of the buffer whose first non-whitespace character is '*', including comment lines.
+    :param buffer buf: Memory-mapped input file.
+    :return generator: (int, int, bytes) Offset of the line, offset of the next line, and the stripped line.
+
+    Notes:
+        - The buffer is searched in windows of BUFFER_CHUNK_SIZE bytes, the pages searched are released.
+    """
+    start = 0
+    while start < len(buf):
+        end = min(start + BUFFER_CHUNK_SIZE, len(buf))
+        pos = buf.find(b'*', start, end)
+        if pos < 0:
+            release_pages(buf, start, end)
+            start = end
+            continue
+        release_pages(buf, start, pos)
+        line_start = buf.rfind(b'\n', 0, pos) + 1
+        line_end = buf.find(b'\n', pos)
+        next_line = len(buf) if line_end < 0 else line_end + 1
+        if bytes(buf[line_start:pos]).strip() == b'':
+            yield line_start, next_line, bytes(buf[line_start:next_line]).strip()
+            start = next_line
+        else:
+            start = pos + 1
+
+
+def _count_lines(buf, start, end):
+    """ Returns the number of line breaks in the byte range. """
+    n_lines = 0
+    for a, b in chunk_ranges(buf, start, end):
+        n_lines += buf[a:b].count(b'\n')
+        release_pages(buf, a, b)
+    return n_lines
+
+
+def _node_id_range(buf, start, end):
+    """ Returns the range of the node IDs of a *Node block, and whether they are increasing.
+    :param buffer buf: Memory-mapped input file.
+    :param int start: Offset of the first data byte of the block.
+    :param int end: Offset after the last data byte of the block.
+    :return list: [int, int, bool] Smallest and largest node IDs, and True if the IDs are strictly increasing.
+    [None, None, True] if the block has no nodes.
+
+    Notes:
+        - The block is parsed in chunks of about BUFFER_CHUNK_SIZE bytes, the pages parsed are released.
+    """
+    min_id = None
+    max_id = None
+    increasing = True
+    last_id = None
+    for a, b in chunk_ranges(buf, start, end):
+        ids = buffer_node_arrays(buf, a, b)[0]
+        if len(ids) == 0:
+            continue
+        if last_id is not None and ids[0] <= last_id:
+            increasing = False
+        increasing = increasing and bool(np.all(ids[1:] > ids[:-1]))
+        min_id = int(ids.min()) if min_id is None else min(min_id, int(ids.min()))
+        max_id = int(ids.max()) if max_id is None else max(max_id, int(ids.max()))
+        last_id = ids[-1]
+    return [min_id, max_id, increasing]
+
+
+def build_inp_index(inp_file, node_ranges=True, with_hash=True):
+    """ Returns the index of the keyword blocks in the input file.
+    :param str inp_file: Path to the Abaqus input file.
+    :param bool node_ranges: If True, the range of the node IDs of each *Node block is included.
+    :param bool with_hash: If True, the content hash of the file is included, it is None otherwise.
+    :return dict: Index of the file, see Notes.
+
+    Notes:
+        - The index contains the file size, modification time, and hash, and the list of blocks in file order.
+        - Each block contains:
+            keyword: Lower-case keyword.
+            line: Keyword line as written in the file.
+            start, end: Byte range of the data lines.
+            first_line, last_line: Line numbers (1-based) of the keyword line and the last line of the block.
+            min_id, max_id: Smallest and largest node IDs (None if no nodes), for *Node blocks if node_ranges.
+            increasing: True if the node IDs are strictly increasing, for *Node blocks if node_ranges.
+        - Comment lines do not end a block.
+        - If node_ranges, the *Node blocks are parsed once while the index is built, see _node_id_range.
+    """
+    size, mtime_ns = _file_stamp(inp_file)
+    blocks = []
+    with open(inp_file, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        try:
+            block = None
+            line_number = 1
+            counted_to = 0
+            comment_start = COMMENT_START.encode()
+            for line_start, next_line, line in keyword_lines(buf):
+                if line[:len(comment_start)] == comment_start:
+                    continue
+                line_number += _count_lines(buf, counted_to, line_start)
+                counted_to = line_start
+                if block is not None:
+                    block['end'] = line_start
+                    block['last_line'] = line_number - 1
+                    blocks.append(block)
+                    block = None
+                keyword_line = line.decode()
+                keyword = parse_keyword_line(keyword_line)[0]
+                if keyword in INDEXED_KEYWORDS:
+                    block = {'keyword': keyword, 'line': keyword_line, 'start': next_line, 'first_line': line_number}
+            if block is not None:
+                block['end'] = len(buf)
+                block['last_line'] = line_number + _count_lines(buf, counted_to, len(buf) - 1)
+                blocks.append(block)
+            if node_ranges:
+                for block in blocks:
+                    if block['keyword'] == NODE_KEYW:
+                        block['min_id'], block['max_id'], block['increasing'] = \
+                            _node_id_range(buf, block['start'], block['end'])
+        finally:
+            if size > 0:
+                buf.close()
+    return {'version': INDEX_VERSION, 'size': size, 'mtime_ns': mtime_ns,
+            'hash': file_hash(inp_file) if with_hash else None, 'blocks': blocks}
+
+
+def save_inp_index(index_file, index):
+    """ Writes the index to a file, replacing any existing index in one step.
+    :raises OSError: If the index cannot be written, the temporary file is removed.
+    """
+    tmp_file = index_file + '.tmp'
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, index_file)
+    except OSError:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return
+
+
+def _try_save_inp_index(index_file, index):
+    """ Writes the index to a file, does nothing if it cannot be written (e.g., read-only directory).
+
+    The index is only a speed-up, so the index in memory is still used for the current read.
+    """
+    try:
+        save_inp_index(index_file, index)
+    except OSError:
+        pass
+    return
+
+
+def load_inp_index(inp_file):
+    """ Returns the index of the input file stored in its sidecar file, None if it does not exist or is not valid. """
+    index_file = index_file_path(inp_file)
+    if not os.path.isfile(index_file):
+        return None
+    try:
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+        if index['version'] != INDEX_VERSION:
+            return None
+        size, mtime_ns = _file_stamp(inp_file)
+        if index['size'] == size and index['mtime_ns'] == mtime_ns:
+            return index
+        # The file was touched, check if the contents changed
+        if index['size'] != size or index['hash'] != file_hash(inp_file):
+            return None
+        index['mtime_ns'] = mtime_ns
+    except (OSError, ValueError, KeyError, TypeError):
+        # Corrupt or incompatible index file, build it again
+        return None
+    _try_save_inp_index(index_file, index)
+    return index
+
+
+def get_inp_index(inp_file):
+    """ Returns the index of the input file, builds and saves the index if there is no valid one.
+    :param str inp_file: Path to the Abaqus input file.
+
+    Notes:
+        - If the index cannot be saved next to the input file, the index built in memory is returned.
+    """
+    index = load_inp_index(inp_file)
+    if index is None:
+        index = build_inp_index(inp_file)
+        _try_save_inp_index(index_file_path(inp_file), index)
+    return index
+
+
+class IndexedInpFile:
+    """ Random access to the indexed keyword blocks of a memory-mapped input file. """
+
+    def __init__(self, inp_file, index):
+        """ Constructor.
+        :param str inp_file: Path to the Abaqus input file.
+        :param dict index: Index of the input file, see build_inp_index.
+
+        Notes:
+            - Use as a context manager, the file is mapped on entry and unmapped on exit.
+        """
+        self.inp_file = inp_file
+        self.index = index
+        self._file = None
+        self._map = None
+
+    def __enter__(self):
+        self._file = open(self.inp_file, 'rb')
+        if self.index['size'] > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+        self._map = None
+        self._file = None
+        return False
+
+    def blocks(self, keyword=None):
+        """ Returns the index entries of the blocks, only of the keyword if not None. """
+        return [b for b in self.index['blocks'] if keyword is None or b['keyword'] == keyword]
+
+    def block_options(self, block):
+        """ Returns the options of the keyword line of the block. """
+        return parse_keyword_line(block['line'])[1]
+
+    def data_lines(self, block):
+        """ Returns the stripped data lines of the block, comments and empty lines are skipped. """
+        if self._map is None:
+            return []
+        return buffer_lines(self._map, block['start'], block['end'])
+
+    def node_arrays(self, block, workers=None, pool=None):
+        """ Returns the IDs and coordinates of a *Node block, parsed directly from the mapped file.
+        :param dict block: Index entry of the block.
+        :param int workers: If > 1, large blocks are parsed using this number of processes.
+        :param concurrent.futures.Executor pool: Pool of the worker processes, see inp_buffer.worker_pool.
+        """
+        if self._map is None:
+            return [np.zeros(0, dtype=np.int64), np.zeros((0, 3))]
+        return parallel_node_arrays(self._map, self.inp_file, block['start'], block['end'], workers, pool)
+
+    def n_set_ids(self, block, workers=None, pool=None):
+        """ Returns the IDs of the nodes in a *Nset block, parsed directly from the mapped file.
+        :param dict block: Index entry of the block.
+        :param int workers: If > 1, large blocks are parsed using this number of processes.
+        :param concurrent.futures.Executor pool: Pool of the worker processes, see inp_buffer.worker_pool.
+        """
+        if self._map is None:
+            return np.zeros(0, dtype=np.int64)
+        return parallel_n_set_ids(self._map, self.inp_file, block['start'], block['end'],
+                                  'generate' in self.block_options(block), workers, pool)
+
+    def n_set_first_id(self, block):
+        """ Returns the ID of the first node in a *Nset block, only the start of the block is read.
+        :param dict block: Index entry of the block.
+        :return np.ndarray: (1,) int64 ID of the first node, (0,) if the set is empty.
+        """
+        use_generate = 'generate' in self.block_options(block)
+        a = block['start']
+        while self._map is not None and a < block['end']:
+            # Read about HEAD_CHUNK_SIZE bytes up to a line break, more only if they have no data lines
+            b = self._map.find(b'\n', min(a + HEAD_CHUNK_SIZE, block['end']), block['end'])
+            b = block['end'] if b < 0 else b + 1
+            first_id = n_set_first_id(buffer_lines(self._map, a, b), use_generate)
+            if len(first_id) > 0:
+                return first_id
+            a = b
+        return np.zeros(0, dtype=np.int64)
@@ -0,0 +1,115 @@
+""" Single-pass tokenizer for Abaqus input files.
+
+The input file is split into keyword blocks, each block is a keyword line followed by its data lines.
+The file is only read forward, one line is kept as look-ahead so that no seeking is required.
+Keywords and option names are normalized to lower-case, option values are kept as written.
+"""
+import numpy as np
+
+NSET_KEYW = '*nset'
+NODE_KEYW = '*node'
+SYSTEM_KEYW = '*system'
+INCLUDE_KEYW = '*include'
+
+COMMENT_START = '**'
+
+
+def parse_keyword_line(line):
+    """ Returns the keyword and the options of a keyword line.
+    :param str line: Stripped keyword line, e.g., '*Nset, nset=Set-1, generate'.
+    :return list: [str, dict] The lower-case keyword and the {option: value} pairs, value is None for flags.
+    """
+    l_list = [li.strip() for li in line.split(',')]
+    keyword = l_list[0].lower()
+    options = dict()
+    for li in l_list[1:]:
+        if li == '':
+            continue
+        opt = li.split('=', 1)
+        if len(opt) == 2:
+            options[opt[0].strip().lower()] = opt[1].strip()
+        else:
+            options[opt[0].lower()] = None
+    return [keyword, options]
+
+
+def n_set_ids(data_lines, use_generate):
+    """ Returns the IDs of the nodes in a node set.
+    :param iterable data_lines: [str] Data lines of the *Nset keyword.
+    :param bool use_generate: If True, data lines are <first>, <last>, <increment>.
+    :return np.ndarray: (N,) int64 Node IDs in the set.
+    """
+    if use_generate:
+        ranges = []
+        for line in data_lines:
+            nodes = [n.strip() for n in line.split(',')]
+            inc = int(nodes[2]) if len(nodes) > 2 and nodes[2] != '' else 1
+            ranges.append(np.arange(int(nodes[0]), int(nodes[1]) + 1, inc, dtype=np.int64))
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(ranges)
+    else:
+        nodes = [n for n in ','.join(data_lines).split(',') if n.strip() != '']
+        return np.array(nodes, dtype=np.int64)
+
+
+def n_set_first_id(data_lines, use_generate):
+    """ Returns the ID of the first node in a node set, the remaining data lines are not parsed.
+    :param iterable data_lines: [str] Data lines of the *Nset keyword.
+    :param bool use_generate: If True, data lines are <first>, <last>, <increment>.
+    :return np.ndarray: (1,) int64 ID of the first node, (0,) if the set is empty.
+    """
+    for line in data_lines:
+        nodes = [n.strip() for n in line.split(',') if n.strip() != '']
+        if nodes and (not use_generate or int(nodes[0]) <= int(nodes[1])):
+            return np.array([int(nodes[0])], dtype=np.int64)
+    return np.zeros(0, dtype=np.int64)
+
+
+class InpTokenizer:
+    """ Splits an Abaqus input file into keyword blocks in a single forward pass. """
+
+    def __init__(self, file):
+        """ Constructor.
+        :param FileObject file: Open text file to read from the current position.
+
+        Notes:
+            - Comment lines (starting with '**') and empty lines are skipped.
+            - Data lines that appear before the first keyword are ignored.
+        """
+        self.file = file
+        self._line = ''
+
+    def blocks(self):
+        """ Yields the (keyword, options, data_lines) of every keyword block in the file.
+
+        data_lines is a generator over the stripped data lines of the block.
+        It should be consumed before requesting the next block, any lines not consumed are skipped.
+        """
+        self._line = self._next_line()
+        while self._line:
+            if self._line[0] == '*':
+                keyword, options = parse_keyword_line(self._line)
+                self._line = self._next_line()
+                data = self._data_lines()
+                yield keyword, options, data
+                # Skip the data lines not used by the consumer
+                for _ in data:
+                    pass
+            else:
+                self._line = self._next_line()
+
+    def _data_lines(self):
+        """ Yields the data lines up to the next keyword line. """
+        while self._line and self._line[0] != '*':
+            line = self._line
+            self._line = self._next_line()
+            yield line
+
+    def _next_line(self):
+        """ Returns the next stripped line that is not a comment or empty, '' at the end of the file. """
+        for line in self.file:
+            li = line.strip()
+            if li != '' and li[:len(COMMENT_START)] != COMMENT_START:
+                return li
+        return ''
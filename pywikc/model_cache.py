@@ -0,0 +1,120 @@
+""" On-disk cache of the data parsed from Abaqus input files.
+
+The cache stores the node sets, node coordinates, *System definitions, and node coordinate systems in a .npz file.
+Cache files are keyed on the content hash of the input file and the names of the requested node sets, so a cache
+file is only reused if the input file is unchanged and the same node sets are requested. The hashes of the files
+included by the input file are stored in the cache file and checked when it is loaded.
+"""
+import hashlib
+import os
+import zipfile
+import numpy as np
+from .dir_maker import dir_maker
+
+# Increment if the layout of the cache file changes
+CACHE_VERSION = 2
+HASH_BLOCK_SIZE = 2 ** 20
+
+
+def file_hash(file_path):
+    """ Returns the SHA-256 hex digest of the contents of a file. """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        block = f.read(HASH_BLOCK_SIZE)
+        while block:
+            h.update(block)
+            block = f.read(HASH_BLOCK_SIZE)
+    return h.hexdigest()
+
+
+def cache_key(inp_file, set_names, head_set_names=()):
+    """ Returns the key of the parsed model.
+    :param str inp_file: Path to the Abaqus input file.
+    :param iterable set_names: [str] Names of the node sets requested from the input file.
+    :param iterable head_set_names: [str] Names of the node sets of which only the first node is requested.
+    """
+    h = hashlib.sha256()
+    h.update('v{0}\n'.format(CACHE_VERSION).encode())
+    h.update(file_hash(inp_file).encode())
+    for name in sorted(set(set_names)):
+        h.update(('\n' + name).encode())
+    if head_set_names:
+        h.update('\n\nhead'.encode())
+        for name in sorted(set(head_set_names)):
+            h.update(('\n' + name).encode())
+    return h.hexdigest()
+
+
+def cache_file_path(cache_dir, inp_file, key):
+    """ Returns the path of the cache file for the input file and key. """
+    file_name = os.path.basename(os.path.normpath(inp_file))
+    return os.path.join(cache_dir, '{0}-{1}.npz'.format(file_name, key[:20]))
+
+
+def save_parsed_model(cache_file, key, node_sets, node_ids, node_coords, node_systems, coord_syss, include_files=()):
+    """ Writes the parsed model to a cache file.
+    :param str cache_file: Path to the cache file.
+    :param str key: Key of the parsed model.
+    :param dict node_sets: {str: np.ndarray} IDs of the nodes in each set.
+    :param np.ndarray node_ids: (N,) IDs of all the nodes in the sets.
+    :param np.ndarray node_coords: (N, 3) Coordinates of the nodes.
+    :param np.ndarray node_systems: (N,) Coord sys of each node.
+    :param dict coord_syss: {int: [float]} Data of each *System definition.
+    :param list include_files: [str] Paths to the files included by the input file.
+    """
+    dir_maker(os.path.dirname(os.path.abspath(cache_file)))
+    set_names = list(node_sets.keys())
+    set_ids = [np.asarray(node_sets[name], dtype=np.int64) for name in set_names]
+    cs_tags = list(coord_syss.keys())
+    cs_data = [np.asarray(coord_syss[t], dtype=np.float64) for t in cs_tags]
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, key=np.array(key),
+                 set_names=np.array(set_names, dtype=str),
+                 set_lengths=np.array([len(ids) for ids in set_ids], dtype=np.int64),
+                 set_ids=np.concatenate(set_ids + [np.zeros(0, dtype=np.int64)]),
+                 node_ids=node_ids, node_coords=node_coords, node_systems=node_systems,
+                 cs_tags=np.array(cs_tags, dtype=np.int64),
+                 cs_lengths=np.array([len(d) for d in cs_data], dtype=np.int64),
+                 cs_data=np.concatenate(cs_data + [np.zeros(0)]),
+                 include_files=np.array(list(include_files), dtype=str),
+                 include_hashes=np.array([file_hash(f) for f in include_files], dtype=str))
+    # Replace in one step so that an interrupted write never leaves a partial cache file
+    os.replace(tmp_file, cache_file)
+    return
+
+
+def load_parsed_model(cache_file, key):
+    """ Returns the parsed model stored in the cache file, None if it does not exist or is not valid.
+    :param str cache_file: Path to the cache file.
+    :param str key: Key of the parsed model.
+    :return dict: Contains node_sets, node_ids, node_coords, node_systems, coord_syss, and include_files.
+
+    Notes:
+        - The cache file is not valid if any of the included files changed or no longer exists.
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as data:
+            if str(data['key']) != key:
+                return None
+            include_files = data['include_files'].tolist()
+            for include_file, include_hash in zip(include_files, data['include_hashes'].tolist()):
+                if not os.path.isfile(include_file) or file_hash(include_file) != include_hash:
+                    return None
+            set_bounds = np.cumsum(np.concatenate(([0], data['set_lengths'])))
+            set_ids = data['set_ids']
+            node_sets = dict()
+            for i, name in enumerate(data['set_names'].tolist()):
+                node_sets[name] = set_ids[set_bounds[i]:set_bounds[i + 1]]
+            cs_bounds = np.cumsum(np.concatenate(([0], data['cs_lengths'])))
+            cs_data = data['cs_data']
+            coord_syss = dict()
+            for i, tag in enumerate(data['cs_tags'].tolist()):
+                coord_syss[tag] = cs_data[cs_bounds[i]:cs_bounds[i + 1]].tolist()
+            return {'node_sets': node_sets, 'node_ids': data['node_ids'], 'node_coords': data['node_coords'],
+                    'node_systems': data['node_systems'], 'coord_syss': coord_syss, 'include_files': include_files}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        # Corrupt or incompatible cache file, parse the input file again
+        return None
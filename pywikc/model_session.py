@@ -0,0 +1,113 @@
+import os
+from .imperfections.generate_imperfections import generate_all_imp
+from .imperfections.abaqus_txt_writer import AbaqusTxtWriter
+from .abaqus_i_coupling_writer import AbaqusICouplingWriter
+from .abaqus_inp_writer import AbaqusMergedInpWriter
+from .component_reader import AbaqusInpToComponentReader, READ_TARGETS
+from .compressed_io import compressed_name, strip_compression
+
+
+class ModelSession:
+    """ Parses a model once and generates the couplings, imperfections, and output files from it. """
+
+    def __init__(self, input_file, definition_file, cache_dir=None, use_index=False, use_mmap=False, compression=None,
+                 workers=None):
+        """ Constructor.
+        :param str input_file: Path to Abaqus input file that defines the model.
+        :param str definition_file: Path to the definition file for components.
+        :param str cache_dir: If not None, directory used to cache the data parsed from the input file.
+        :param bool use_index: If True, the input file is read using a sidecar index of its keyword blocks.
+        :param bool use_mmap: If True, the input file is memory-mapped and its data blocks are parsed in bulk.
+        :param str compression: If not None, the output files are compressed, 'gzip' or 'xz'.
+        :param int workers: If > 1, number of processes used to parse the input file, see AbaqusInpToComponentReader.
+
+        Notes:
+            - The files are read on the first request, and the couplings and imperfections are generated once.
+            - The imperfections can only be generated once per session, since generating them replaces the
+            definition file properties of the components.
+            - The input file can be compressed (.gz or .xz extension), see compressed_io.
+            - imperfection_counts is [int, int], the number of nodes written and skipped in the last imperfection file
+            written, see AbaqusTxtWriter.write_imperfections.
+        """
+        self.input_file = input_file
+        self.definition_file = definition_file
+        self.cache_dir = cache_dir
+        self.use_index = use_index
+        self.use_mmap = use_mmap
+        self.compression = compression
+        self.workers = workers
+        self._reader = None
+        self._couplings = None
+        self._imperfections_generated = False
+        self.imperfection_counts = None
+
+    def get_reader(self, *targets):
+        """ Returns the reader of the model after preparing the targets, see AbaqusInpToComponentReader.require.
+
+        Notes:
+            - Only the reader stages needed for the targets are run, all of them if no targets are given.
+            - All the node sets are read on the first request, so the input file is parsed once whatever the order of
+            the requests.
+        """
+        if self._reader is None:
+            self._reader = AbaqusInpToComponentReader(self.cache_dir, self.use_index, self.use_mmap, self.workers)
+            self._reader.read(self.input_file, self.definition_file, targets=[], all_sets=True)
+        if len(targets) == 0:
+            targets = READ_TARGETS
+        self._reader.require(*targets)
+        return self._reader
+
+    def get_components(self):
+        """ Returns the components of the model. """
+        return self.get_reader().components
+
+    def get_couplings(self):
+        """ Returns the couplings of all the components. """
+        if self._couplings is None:
+            couplings = []
+            for c in self.get_reader('couplings').components:
+                couplings += c.couplings
+            self._couplings = couplings
+        return self._couplings
+
+    def generate_imperfections(self, workers=None):
+        """ Generates the imperfections of all the components, does nothing if they are already generated.
+        :param int workers: If > 1, number of processes used to generate the imperfections of the components.
+        :return list: [IComponent] Components with the nodal imperfections.
+        """
+        if not self._imperfections_generated:
+            generate_all_imp(self.get_reader('imperfections').components, workers)
+            self._imperfections_generated = True
+        return self.get_reader('imperfections').components
+
+    def imperfection_file(self, output_dir):
+        """ Returns the path of the imperfection file in the output directory. """
+        file_name = strip_compression(os.path.basename(os.path.normpath(self.input_file)))
+        return os.path.join(output_dir, compressed_name(file_name[:-4] + '-Imp.txt', self.compression))
+
+    def write_imperfections(self, output_dir, workers=None, sparse_tol=None):
+        """ Writes the imperfection file, generates the imperfections if needed.
+        :param str output_dir: Directory that exists to write the output files.
+        :param int workers: If > 1, number of processes used to generate the imperfections of the components.
+        :param float sparse_tol: If not None, nodes with an imperfection magnitude <= sparse_tol are not written.
+        :return str: Path to the imperfection file, the number of nodes written and skipped are in imperfection_counts.
+        """
+        imp_file = self.imperfection_file(output_dir)
+        imp_writer = AbaqusTxtWriter(self.generate_imperfections(workers))
+        self.imperfection_counts = imp_writer.write_imperfections(imp_file, sparse_tol)
+        return imp_file
+
+    def write_couplings(self, output_dir, write_inp=False, imperfection_input=None):
+        """ Writes the coupling keyword files.
+        :param str output_dir: Directory that exists to write the output files.
+        :param bool write_inp: If True, also writes a copy of the input file with the keywords added.
+        :param str imperfection_input: If not None and write_inp, adds *Imperfection, input=<imperfection_input>.
+        """
+        couplings = self.get_couplings()
+        couple_writer = AbaqusICouplingWriter(output_dir, compression=self.compression)
+        couple_writer.write(couplings)
+        if write_inp:
+            merged_writer = AbaqusMergedInpWriter(output_dir, self.input_file, imperfection_input,
+                                                  compression=self.compression)
+            merged_writer.write(couplings)
+        return
@@ -0,0 +1,154 @@
+""" Array-backed storage of node IDs and coordinates.
+
+Nodes are stored as a contiguous (N,) int64 ID array and a (N, 3) float64 coordinate array.
+Node IDs are mapped to rows using a sorted index that is built the first time a lookup is made.
+"""
+import numpy as np
+
+# Number of data lines parsed at a time when reading *Node blocks
+NODE_CHUNK_SIZE = 65536
+
+
+def _parse_node_chunk(lines):
+    """ Returns the IDs and coordinates defined in a list of *Node data lines.
+    :param list lines: [str] Node data lines, <id>, <x>, <y>[, <z>].
+    :return list: [np.ndarray, np.ndarray] (N,) IDs and (N, 3) coordinates.
+    """
+    try:
+        data = np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2)
+    except ValueError:
+        # Irregular lines (missing values, differing number of values), parse line by line
+        data = np.zeros((len(lines), 4))
+        for i, line in enumerate(lines):
+            l_list = [li.strip() for li in line.split(',')][:4]
+            data[i, :len(l_list)] = [float(li) if li != '' else 0. for li in l_list]
+    return node_data_arrays(data)
+
+
+def node_data_arrays(data):
+    """ Returns the IDs and coordinates in a table of *Node data.
+    :param np.ndarray data: (N, M) Rows of <id>, <x>, <y>[, <z>, ...], missing coordinates are zero.
+    :return list: [np.ndarray, np.ndarray] (N,) IDs and (N, 3) coordinates.
+    """
+    coords = np.zeros((len(data), 3))
+    n_coords = min(data.shape[1] - 1, 3)
+    coords[:, :n_coords] = data[:, 1:n_coords + 1]
+    return [data[:, 0].astype(np.int64), coords]
+
+
+def parse_node_lines(data_lines):
+    """ Returns the IDs and coordinates of a *Node block, parsed in bulk.
+    :param iterable data_lines: [str] Data lines of the *Node keyword.
+    :return list: [np.ndarray, np.ndarray] (N,) IDs and (N, 3) coordinates.
+    """
+    id_chunks = []
+    coord_chunks = []
+    lines = []
+    for line in data_lines:
+        lines.append(line)
+        if len(lines) == NODE_CHUNK_SIZE:
+            ids, coords = _parse_node_chunk(lines)
+            id_chunks.append(ids)
+            coord_chunks.append(coords)
+            lines = []
+    if lines:
+        ids, coords = _parse_node_chunk(lines)
+        id_chunks.append(ids)
+        coord_chunks.append(coords)
+    if not id_chunks:
+        return [np.zeros(0, dtype=np.int64), np.zeros((0, 3))]
+    return [np.concatenate(id_chunks), np.concatenate(coord_chunks)]
+
+
+def unique_ids(ids):
+    """ Returns the IDs with duplicates removed, keeping the order of the first occurrences.
+    :param np.ndarray ids: (N,) Node IDs.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    _, first = np.unique(ids, return_index=True)
+    return ids[np.sort(first)]
+
+
+class NodeTable:
+    """ Contiguous table of node IDs and their coordinates (or any other 3-vector per node).
+
+    Provides read-only dict-like access, e.g., table[node_id] returns the coordinates of node_id.
+    """
+
+    def __init__(self, ids=None, coords=None):
+        """ Constructor.
+        :param np.ndarray ids: (N,) Node IDs, a duplicated ID refers to its last row, as in a dict.
+        :param np.ndarray coords: (N, 3) Node coordinates, defaults to zeros.
+        """
+        if ids is None:
+            ids = np.zeros(0, dtype=np.int64)
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if coords is None:
+            coords = np.zeros((len(self.ids), 3))
+        self.coords = np.ascontiguousarray(coords, dtype=np.float64).reshape((len(self.ids), 3))
+        self._sorter = None
+
+    def _build_index(self):
+        """ Builds the sorted index used to map the node IDs to rows. """
+        if len(self.ids) < 2 or np.all(self.ids[1:] > self.ids[:-1]):
+            self._sorter = np.arange(len(self.ids))
+        else:
+            self._sorter = np.argsort(self.ids, kind='stable')
+
+    def lookup(self, node_ids):
+        """ Returns the rows of the node IDs, -1 for IDs not in the table.
+        :param np.ndarray node_ids: (M,) Node IDs to find.
+        :return np.ndarray: (M,) Row indices.
+        """
+        if self._sorter is None:
+            self._build_index()
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(node_ids.shape, -1, dtype=np.int64)
+        # The sort is stable, so the last of the equal IDs is the last occurrence
+        pos = np.searchsorted(self.ids, node_ids, side='right', sorter=self._sorter) - 1
+        pos = np.maximum(pos, 0)
+        rows = self._sorter[pos]
+        return np.where(self.ids[rows] == node_ids, rows, -1)
+
+    def rows(self, node_ids):
+        """ Returns the rows of the node IDs.
+        :param np.ndarray node_ids: (M,) Node IDs to find.
+        :return np.ndarray: (M,) Row indices.
+        :raises KeyError: If any of the IDs are not in the table.
+        """
+        rows = self.lookup(node_ids)
+        if np.any(rows < 0):
+            missing = np.asarray(node_ids)[rows < 0]
+            raise KeyError('Nodes not found: {0}'.format(missing[:10].tolist()))
+        return rows
+
+    def row(self, node_id):
+        """ Returns the row of a single node ID. """
+        return int(self.rows([node_id])[0])
+
+    def subset(self, node_ids):
+        """ Returns a new NodeTable with only the node IDs, in the order provided. """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        return NodeTable(node_ids, self.coords[self.rows(node_ids)])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        return bool(self.lookup([node_id])[0] >= 0)
+
+    def __getitem__(self, node_id):
+        return self.coords[self.row(node_id)]
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def keys(self):
+        return self.ids.tolist()
+
+    def values(self):
+        return iter(self.coords)
+
+    def items(self):
+        return zip(self.ids.tolist(), self.coords)
@@ -1,74 +1,49 @@
 import os
-from .imperfections.generate_imperfections import set_imperfection_properties, generate_component_imp
-from .imperfections.abaqus_txt_writer import AbaqusTxtWriter
-from .abaqus_i_coupling_writer import AbaqusICouplingWriter
-from .component_reader import AbaqusInpToComponentReader
+from .model_session import ModelSession
+from .compressed_io import strip_compression
 
 
-def gen_aba_couples(input_file, definition_file, output_dir):
+def gen_aba_couples(input_file, definition_file, output_dir, cache_dir=None, write_inp=False):
     """ Generates the keywords for an Abaqus model.
     :param str input_file: Path to Abaqus input file that defines the model.
     :param str definition_file: Path to the definition file for components.
     :param str output_dir: Directory that exists to write the output files.
+    :param str cache_dir: If not None, directory used to cache the data parsed from the input file.
+    :param bool write_inp: If True, also writes a copy of the input file with the keywords added.
     """
-
-    # Read the .inp file
-    reader = AbaqusInpToComponentReader()
-    reader.read(input_file, definition_file)
-    imp_writer = AbaqusTxtWriter(reader.components)
-    # Write the coupling defintions
-    couplings = []
-    for c in reader.components:
-        couplings += c.couplings
-    couple_writer = AbaqusICouplingWriter(output_dir)
-    couple_writer.write(couplings)
-
+    session = ModelSession(input_file, definition_file, cache_dir)
+    session.write_couplings(output_dir, write_inp)
     return
 
 
-def gen_aba_imperfections(input_file, definition_file, output_dir):
+def gen_aba_imperfections(input_file, definition_file, output_dir, cache_dir=None, workers=None, sparse_tol=None):
     """ Generates the imperfections for an Abaqus model.
     :param str input_file: Path to Abaqus input file that defines the model.
     :param str definition_file: Path to the definition file for components.
     :param str output_dir: Directory that exists to write the output files.
+    :param str cache_dir: If not None, directory used to cache the data parsed from the input file.
+    :param int workers: If > 1, number of processes used to generate the imperfections of the components.
+    :param float sparse_tol: If not None, nodes with an imperfection magnitude <= sparse_tol are not written.
+    :return list: [int, int] Number of nodes written and number of nodes skipped in the imperfection file.
     """
-
-    # Read the .inp file
-    reader = AbaqusInpToComponentReader()
-    reader.read(input_file, definition_file)
-    imp_writer = AbaqusTxtWriter(reader.components)
-    # Generate the imperfections
-    file_name = os.path.basename(os.path.normpath(input_file))
-    imp_file = os.path.join(output_dir, file_name[:-4] + '-Imp.txt')
-    for c in reader.components:
-        set_imperfection_properties(c)
-        generate_component_imp(c)
-    imp_writer.write_imperfections(imp_file)
-    return
+    session = ModelSession(input_file, definition_file, cache_dir)
+    session.write_imperfections(output_dir, workers, sparse_tol)
+    return session.imperfection_counts
 
 
-def gen_aba_couples_imperfections(input_file, definition_file, output_dir):
+def gen_aba_couples_imperfections(input_file, definition_file, output_dir, cache_dir=None, workers=None,
+                                  write_inp=False, sparse_tol=None):
     """ Generates the keywords and imperfections for an Abaqus model.
     :param str input_file: Path to Abaqus input file that defines the model.
     :param str definition_file: Path to the definition file for components.
     :param str output_dir: Directory that exists to write the output files.
+    :param str cache_dir: If not None, directory used to cache the data parsed from the input file.
+    :param int workers: If > 1, number of processes used to generate the imperfections of the components.
+    :param bool write_inp: If True, also writes a copy of the input file with the keywords and imperfection added.
+    :param float sparse_tol: If not None, nodes with an imperfection magnitude <= sparse_tol are not written.
+    :return list: [int, int] Number of nodes written and number of nodes skipped in the imperfection file.
     """
-
-    # Read the .inp file
-    reader = AbaqusInpToComponentReader()
-    reader.read(input_file, definition_file)
-    imp_writer = AbaqusTxtWriter(reader.components)
-    # Generate the imperfections
-    file_name = os.path.basename(os.path.normpath(input_file))
-    imp_file = os.path.join(output_dir, file_name[:-4] + '-Imp.txt')
-    for c in reader.components:
-        set_imperfection_properties(c)
-        generate_component_imp(c)
-    imp_writer.write_imperfections(imp_file)
-    # Write the coupling defintions
-    couplings = []
-    for c in reader.components:
-        couplings += c.couplings
-    couple_writer = AbaqusICouplingWriter(output_dir)
-    couple_writer.write(couplings)
-    return
+    session = ModelSession(input_file, definition_file, cache_dir)
+    imp_file = session.write_imperfections(output_dir, workers, sparse_tol)
+    session.write_couplings(output_dir, write_inp, os.path.basename(strip_compression(imp_file)))
+    return session.imperfection_counts
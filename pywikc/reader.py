@@ -1,14 +1,14 @@
 import numpy as np
 from .coupling import BSCoupling
+from .inp_tokenizer import InpTokenizer, n_set_ids, NSET_KEYW, NODE_KEYW
+from .node_table import NodeTable, parse_node_lines, unique_ids
+from .compressed_io import open_text
 
 # definition file prototype:
 # *coupling
 # <beam_n_set_string>, <shell_n_set_string>, <local_coord_sys_string>
 # repeat lines
 
-NSET_KEYW = '*Nset'
-NODE_KEYW = '*Node'
-
 
 class AbaqusInpReader:
     """ Returns a set of Coupling objects that define beam-shell coupling constraints. """
@@ -18,11 +18,11 @@ class AbaqusInpReader:
         self.beam_sets = dict()
         self.shell_sets = dict()
         self.coord_syss = dict()
-        self.all_nodes = dict()
+        self.all_nodes = NodeTable()
 
     def _read_def_file(self, def_file):
         """ Reads the information in coupling definition file. """
-        with open(def_file, 'r') as file:
+        with open_text(def_file, 'r') as file:
             for line in file:
                 l_list = line.split(',')
                 l_list = [li.strip() for li in l_list]
@@ -47,37 +47,26 @@ class AbaqusInpReader:
         return
 
     def _read_inp_file(self, inp_file):
-        """ Reads the coupling information in the input file. """
-        node_reading = False
+        """ Reads the coupling information in a single pass of the input file. """
+        node_blocks = []
 
-        with open(inp_file, 'r') as file:
-            # Using file.readline() is necessary because next(file) does not allow file.tell()
-            line = file.readline()
-            while line:
-                l = line.strip()
-                if l[:len(NSET_KEYW)] == NSET_KEYW:
-                    n_set_name = l.split(',')[1].split('=')[1]
+        with open_text(inp_file, 'r') as file:
+            for keyword, options, data in InpTokenizer(file).blocks():
+                if keyword == NSET_KEYW:
+                    n_set_name = options['nset']
                     if n_set_name in self.shell_sets:
-                        self.shell_sets[n_set_name] = self._read_n_set(file)
+                        self.shell_sets[n_set_name] = n_set_ids(data, 'generate' in options)
                     elif n_set_name in self.beam_sets:
-                        self.beam_sets[n_set_name] = self._read_n_set(file)
+                        self.beam_sets[n_set_name] = n_set_ids(data, 'generate' in options)
                 # todo: add reading for the coord systems
-                line = file.readline()
-            # Get coordinates of all registered nodes
-            file.seek(0)
-            for line in file:
-                l = line.split(',')
-                l = [li.strip() for li in l]
-                if l[0][0] == '*':
-                    # Stop at any keyword
-                    node_reading = False
-                if l[0] == NODE_KEYW:
-                    node_reading = True
-                elif node_reading:
-                    node_id = int(l[0])
-                    if node_id in self.all_nodes:
-                        coords = [float(c) for c in l[1:]]
-                        self.all_nodes[node_id] = coords
+                elif keyword == NODE_KEYW:
+                    node_blocks.append(parse_node_lines(data))
+        # Keep the coordinates of all registered nodes
+        part_nodes = NodeTable(np.concatenate([b[0] for b in node_blocks] + [np.zeros(0, dtype=np.int64)]),
+                               np.concatenate([b[1] for b in node_blocks] + [np.zeros((0, 3))]))
+        registered = [np.asarray(ns, dtype=np.int64) for ns in list(self.beam_sets.values()) +
+                      list(self.shell_sets.values())]
+        self.all_nodes = part_nodes.subset(unique_ids(np.concatenate(registered + [np.zeros(0, dtype=np.int64)])))
         return
 
     def read(self, inp_file, definition_file):
@@ -119,26 +108,3 @@ class AbaqusInpReader:
         else:
             raise ValueError('Incorrect JTYPE provided.')
         return constr_def
-
-    def _read_n_set(self, fp):
-        """ Returns the IDs of the nodes in the node set.
-        :param FileObject fp: Pointer to the file being read.
-        """
-        # todo: add case of "generate" option in the Nset
-        def peek_line(f):
-            pos = f.tell()
-            line = f.readline()
-            f.seek(pos)
-            return line
-
-        node_set = []
-        peeked_line = 'START'
-        while peeked_line[0] != '*':
-            l = fp.readline().strip()
-            nodes = l.split(',')
-            for n in nodes:
-                if n != '':
-                    node_set.append(int(n))
-                    self.all_nodes[int(n)] = []
-            peeked_line = peek_line(fp).strip()
-        return node_set
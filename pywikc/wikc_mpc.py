@@ -0,0 +1,137 @@
+""" Batched NumPy reference of the WIKC MPC user subroutine (wikc_subroutine.for).
+
+The subroutine is evaluated for N (continuum node, beam node) pairs at once. Each pair is one call of MPC in Abaqus,
+where the first node is the continuum node (dependent DOFs 1-3) and the second node is the beam node (DOFs 1-7).
+The formulas follow the Fortran code line by line, including the linear form that only uses the in-plane link
+components for the displacement.
+
+Notes:
+    - UE is the value of the dependent displacement of the continuum node, so the constraint is satisfied if the
+    continuum node displacement equals UE.
+    - A of the continuum node is the identity on DOFs 1-3, A of the beam node is returned on DOFs 1-7. The DOF 7
+    column is zero for the JTYPEs without warping.
+"""
+import numpy as np
+
+JTYPES = [16, 17, 26, 27]
+LINEAR_JTYPES = [16, 17]
+WARPING_JTYPES = [17, 27]
+# Rotation vectors with a norm below this are the identity rotation
+SMALL_TOL = 1.e-14
+
+
+def skew(v):
+    """ Returns the skew-symmetric matrices of the vectors.
+    :param np.ndarray v: (N, 3) Vectors.
+    :return np.ndarray: (N, 3, 3) Matrices such that skew(v) . a = v x a.
+    """
+    v = np.asarray(v, dtype=np.float64)
+    m = np.zeros(v.shape[:-1] + (3, 3))
+    m[..., 0, 1] = -v[..., 2]
+    m[..., 0, 2] = v[..., 1]
+    m[..., 1, 0] = v[..., 2]
+    m[..., 1, 2] = -v[..., 0]
+    m[..., 2, 0] = -v[..., 1]
+    m[..., 2, 1] = v[..., 0]
+    return m
+
+
+def rvec2rmat(rvec):
+    """ Returns the rotation matrices of the rotation vectors using the Rodrigues formula.
+    :param np.ndarray rvec: (N, 3) Rotation vectors.
+    :return np.ndarray: (N, 3, 3) Rotation matrices, the identity for rotations smaller than SMALL_TOL.
+    """
+    rvec = np.asarray(rvec, dtype=np.float64)
+    r = np.linalg.norm(rvec, axis=-1)
+    is_small = r < SMALL_TOL
+    rr = rvec / np.where(is_small, 1., r)[..., np.newaxis]
+    cos_r = np.cos(r)[..., np.newaxis, np.newaxis]
+    sin_r = np.sin(r)[..., np.newaxis, np.newaxis]
+    rmat = cos_r * np.identity(3) + (1. - cos_r) * rr[..., :, np.newaxis] * rr[..., np.newaxis, :] + sin_r * skew(rr)
+    rmat[is_small] = np.identity(3)
+    return rmat
+
+
+def wikc_mpc(jtype, x_cont, x_beam, disp_beam, rot_beam, w_beam, warp_fun, t_vec=None):
+    """ Returns the dependent displacements and the beam node linearization of the WIKC constraint.
+    :param int jtype: Constraint type, one of JTYPES.
+    :param np.ndarray x_cont: (N, 3) Original coordinates of the continuum nodes.
+    :param np.ndarray x_beam: (N, 3) Original coordinates of the beam node of each continuum node.
+    :param np.ndarray disp_beam: (N, 3) Beam node displacements, U(1:3).
+    :param np.ndarray rot_beam: (N, 3) Beam node rotations, U(4:6).
+    :param np.ndarray w_beam: (N,) Beam node warping DOF, U(7).
+    :param np.ndarray warp_fun: (N,) Warping function at the continuum nodes, field variable 1.
+    :param np.ndarray t_vec: (N, 3) Normal direction at the beam nodes, field variables 2-4. (0, 0, 1) if None.
+    :return list: [np.ndarray, np.ndarray] (N, 3) UE and (N, 3, 7) A of the beam node.
+
+    Notes:
+        - The beam node arrays can also be given for a single beam node, (3,) and scalars, they are broadcast.
+    """
+    if jtype not in JTYPES:
+        raise ValueError('Incorrect JTYPE {0}, should be one of {1}.'.format(jtype, JTYPES))
+    x_cont = np.asarray(x_cont, dtype=np.float64)
+    n = len(x_cont)
+    link = x_cont - np.broadcast_to(x_beam, (n, 3))
+    disp_beam = np.broadcast_to(np.asarray(disp_beam, dtype=np.float64), (n, 3))
+    rot_beam = np.broadcast_to(np.asarray(rot_beam, dtype=np.float64), (n, 3))
+    w_beam = np.broadcast_to(np.asarray(w_beam, dtype=np.float64), (n,))
+    warp_fun = np.broadcast_to(np.asarray(warp_fun, dtype=np.float64), (n,))
+    if t_vec is None:
+        t_vec = np.array([0., 0., 1.])
+    t_vec = np.broadcast_to(np.asarray(t_vec, dtype=np.float64), (n, 3))
+    a_beam = np.zeros((n, 3, 7))
+    a_beam[:, :, 0:3] = -np.identity(3)
+    if jtype in LINEAR_JTYPES:
+        ue = np.column_stack((disp_beam[:, 0] - link[:, 1] * rot_beam[:, 2],
+                              disp_beam[:, 1] + link[:, 0] * rot_beam[:, 2],
+                              disp_beam[:, 2] - link[:, 0] * rot_beam[:, 1] + link[:, 1] * rot_beam[:, 0]))
+        a_beam[:, :, 3:6] = skew(link)
+    else:
+        rmat = rvec2rmat(rot_beam)
+        t_vec = np.einsum('nij,nj->ni', rmat, t_vec)
+        rotlink = np.einsum('nij,nj->ni', rmat, link)
+        ue = disp_beam + rotlink - link
+        a_beam[:, :, 3:6] = skew(rotlink)
+    if jtype in WARPING_JTYPES:
+        warp_disp = (warp_fun * w_beam)[:, np.newaxis] * t_vec
+        ue = ue + warp_disp
+        if jtype not in LINEAR_JTYPES:
+            a_beam[:, :, 3:6] += skew(warp_disp)
+        a_beam[:, :, 6] = -warp_fun[:, np.newaxis] * t_vec
+    return [ue, a_beam]
+
+
+def wikc_violation(jtype, x_cont, x_beam, disp_cont, disp_beam, rot_beam, w_beam, warp_fun, t_vec=None):
+    """ Returns the constraint violation, the continuum node displacement minus UE.
+    :param np.ndarray disp_cont: (N, 3) Continuum node displacements.
+    :return np.ndarray: (N, 3) Violation of each constraint equation.
+
+    See wikc_mpc for the other parameters.
+    """
+    ue = wikc_mpc(jtype, x_cont, x_beam, disp_beam, rot_beam, w_beam, warp_fun, t_vec)[0]
+    return np.asarray(disp_cont, dtype=np.float64) - ue
+
+
+def coupling_jtype(couple):
+    """ Returns the JTYPE of the coupling from its options. """
+    if couple.use_nonlinear:
+        return 27 if couple.include_warping else 26
+    return 17 if couple.include_warping else 16
+
+
+def coupling_mpc(couple, x_cont, x_beam, disp_beam, rot_beam, w_beam):
+    """ Returns UE and A of the beam node for all the continuum nodes of an ICoupling.
+    :param ICoupling couple: The coupling, gives the JTYPE, warping function, and normal direction fields.
+    :param np.ndarray x_cont: (N, 3) Original global coordinates of the continuum nodes, in the row order of
+    couple.continuum_nodes.
+    :param np.ndarray x_beam: (3,) Original global coordinates of the beam node.
+    :param np.ndarray disp_beam: (3,) Beam node displacements.
+    :param np.ndarray rot_beam: (3,) Beam node rotations.
+    :param float w_beam: Beam node warping DOF.
+    :return list: [np.ndarray, np.ndarray] See wikc_mpc.
+
+    Notes:
+        - The coordinates are the global coordinates used by Abaqus, not the local coordinates of the coupling.
+    """
+    return wikc_mpc(coupling_jtype(couple), x_cont, x_beam, disp_beam, rot_beam, w_beam, couple.warping_fun,
+                    couple.normal_direction)
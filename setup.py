@@ -11,4 +11,7 @@ setup(name='pywikc',
       install_requires=[
           'numpy', 'pandas>=0.24.1'
       ],
+      extras_require={
+          'check': ['scipy']
+      },
       zip_safe=False)
@@ -1,7 +1,30 @@
 import unittest
+import io
+import os
+import shutil
+import gzip
+import lzma
+import concurrent.futures
+import tempfile
+from unittest import mock
 import numpy as np
 from pywikc.reader import AbaqusInpReader
 from pywikc.component_reader import AbaqusInpToComponentReader
+from pywikc.inp_tokenizer import InpTokenizer, n_set_ids
+from pywikc.node_table import NodeTable, parse_node_lines
+from pywikc import inp_buffer
+from pywikc.inp_buffer import buffer_lines, buffer_node_arrays, buffer_n_set_ids, chunk_ranges, \
+    BUFFER_CHUNK_SIZE
+from pywikc.inp_index import build_inp_index, load_inp_index, get_inp_index, index_file_path
+from pywikc.dir_maker import dir_maker
+from pywikc.coupling import BSCoupling
+from pywikc.component import ICoupling
+from pywikc.constraint import TERM_SHELL, TERM_WARPING
+try:
+    from pywikc.constraint_matrix import constraint_matrix, check_constraints
+except ImportError:
+    # scipy is an optional dependency
+    constraint_matrix = None
 
 inp_file = 'testing/Job-1.inp'
 def_file = 'testing/def_file_1.txt'
@@ -25,6 +48,101 @@ class TestAbaqusReader(unittest.TestCase):
         pass
 
 
+class TestInpTokenizer(unittest.TestCase):
+
+    def test_blocks(self):
+        inp = io.StringIO('*Heading\n** comment\n*System\n*Node\n1, 0., 0., 0.\n\n2, 1., 0., 0.\n'
+                          '*Nset, nset=Set-1, generate\n1, 5, 2\n 7, 9, 1\n*Nset, nset=Set-2\n1, 2,\n')
+        blocks = [(k, o, list(d)) for k, o, d in InpTokenizer(inp).blocks()]
+        self.assertEqual([b[0] for b in blocks], ['*heading', '*system', '*node', '*nset', '*nset'])
+        self.assertEqual(blocks[1][2], [])
+        self.assertEqual(blocks[2][2], ['1, 0., 0., 0.', '2, 1., 0., 0.'])
+        self.assertEqual(blocks[3][1], {'nset': 'Set-1', 'generate': None})
+        self.assertEqual(n_set_ids(blocks[3][2], True).tolist(), [1, 3, 5, 7, 8, 9])
+        self.assertEqual(n_set_ids(blocks[4][2], False).tolist(), [1, 2])
+        pass
+
+
+class TestConstraintTable(unittest.TestCase):
+
+    def test_coupling_table(self):
+        shell_nodes = {5: np.array([2., 3., 0.]), 7: np.array([-1., 0.5, 0.])}
+        couple = BSCoupling(shell_nodes, 1, 'cs-1')
+        table = couple.constraint_table
+        self.assertEqual(len(table), 6)
+        self.assertEqual(len(table.terms), 22)
+        np.testing.assert_array_equal(table.bounds(), [0, 3, 6, 11, 14, 17, 22])
+        np.testing.assert_array_equal(table.terms['node'][table.terms['kind'] == TERM_SHELL], [5, 7])
+        np.testing.assert_array_equal(table.terms['coef'][table.terms['kind'] == TERM_WARPING], [-6., 0.5])
+        # Same equations as objects
+        constraints = couple.constraints
+        self.assertEqual([c.constr_name for c in constraints], ['disp-x', 'disp-y', 'disp-z'] * 2)
+        z_terms = [(t.node, t.dof, t.coef, t.name) for t in constraints[5].terms]
+        self.assertEqual(z_terms, [(7, 3, 1., 'shell-term'), (1, 3, -1., ''), (1, 4, -0.5, ''), (1, 5, -1., ''),
+                                   (1, 7, 0.5, 'warping-term')])
+        pass
+
+    @unittest.skipIf(constraint_matrix is None, 'scipy is not installed')
+    def test_constraint_matrix(self):
+        shell_nodes = {5: np.array([2., 3., 0.]), 7: np.array([-1., 0.5, 0.])}
+        bs_couple = BSCoupling(shell_nodes, 1, 'cs-1')
+        i_couple = ICoupling({1: np.zeros(3)}, shell_nodes, np.array([0., 0., 1.]), False, True)
+        bs_matrix, bs_columns, bs_dependents, _ = constraint_matrix([bs_couple])
+        i_matrix, i_columns, i_dependents, _ = constraint_matrix([i_couple])
+        # The linearized WIKC constraints are the *Equation constraints for a planar interface
+        np.testing.assert_array_equal(bs_columns, i_columns)
+        np.testing.assert_array_equal(bs_dependents, i_dependents)
+        np.testing.assert_array_equal(bs_matrix.toarray(), i_matrix.toarray())
+        self.assertEqual(bs_matrix.shape, (6, 13))
+        report = check_constraints([bs_couple, i_couple])
+        self.assertEqual(report['block_ranks'][0][:2], [6, 6])
+        self.assertEqual(report['shared_nodes'].tolist(), [5, 7])
+        self.assertEqual(len(report['duplicate_dofs']), 6)
+        self.assertFalse(report['is_valid'])
+        # Couplings read from a model
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        couplings = [cpl for c in reader.components for cpl in c.couplings]
+        report = check_constraints(couplings)
+        self.assertTrue(report['is_valid'])
+        self.assertEqual([r[0] for r in report['block_ranks']], [3 * len(c.continuum_nodes) for c in couplings])
+        # The WIKC equations have full row rank by construction, even if too large for an SVD
+        report = check_constraints(couplings, max_block_rows=1)
+        self.assertTrue(report['is_valid'])
+        self.assertTrue(all(r[1] == r[0] and r[2] is None for r in report['block_ranks']))
+        # Equations that use the dependent DOF of another equation need an SVD, unverified if too large
+        terms = bs_couple.constraint_table.terms
+        terms['node'][bs_couple.constraint_table.bounds()[1] + 1] = 5
+        terms['dof'][bs_couple.constraint_table.bounds()[1] + 1] = 1
+        report = check_constraints([bs_couple])
+        self.assertEqual(report['block_ranks'][0][:2], [6, 6])
+        self.assertIsNotNone(report['block_ranks'][0][2])
+        self.assertTrue(report['is_valid'])
+        report = check_constraints([bs_couple], max_block_rows=1)
+        self.assertEqual(report['block_ranks'][0], [6, None, None])
+        self.assertIsNone(report['is_valid'])
+        pass
+
+
+class TestNodeTable(unittest.TestCase):
+
+    def test_parse_and_lookup(self):
+        lines = ['10, 1., 2., 3.', '4, 4., 5., 6.', '7, 7., 8.']
+        ids, coords = parse_node_lines(lines)
+        self.assertEqual(ids.dtype, np.int64)
+        np.testing.assert_array_equal(coords[2], [7., 8., 0.])
+        table = NodeTable(ids, coords)
+        np.testing.assert_array_equal(table[4], [4., 5., 6.])
+        np.testing.assert_array_equal(table.lookup([7, 10, 5]), [2, 0, -1])
+        self.assertTrue(10 in table)
+        self.assertFalse(5 in table)
+        self.assertRaises(KeyError, table.rows, [5])
+        # Duplicated IDs refer to the last occurrence, as in a dict
+        table = NodeTable([3, 1, 3, 2, 3, 1], np.arange(18.).reshape((6, 3)))
+        np.testing.assert_array_equal(table.lookup([1, 2, 3, 0, 4]), [5, 3, 4, -1, -1])
+        pass
+
+
 class TestAbaqusComponentReader(unittest.TestCase):
     def test_read_component_def(self):
         reader = AbaqusInpToComponentReader()
@@ -129,6 +247,20 @@ class TestAbaqusComponentReader(unittest.TestCase):
         np.testing.assert_array_equal(couple.normal_direction, n3)
         pass
 
+    def test_coupling_warping_fun(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        couple = reader.components[0].couplings[0]
+        coords = couple.continuum_nodes.coords
+        np.testing.assert_array_equal(couple.warping_fun, coords[:, 0] * coords[:, 1])
+        self.assertEqual(couple.beam_id, list(couple.beam_node.keys())[0])
+        # Same coupling from a dict of nodes
+        cont_nodes = dict(couple.continuum_nodes.items())
+        dict_couple = ICoupling(couple.beam_node, cont_nodes, couple.normal_direction, True, True)
+        np.testing.assert_array_equal(dict_couple.continuum_nodes.ids, couple.continuum_nodes.ids)
+        np.testing.assert_array_equal(dict_couple.warping_fun, couple.warping_fun)
+        pass
+
     def test_coupling_orientation_z_align(self):
         inp_file_1 = 'testing/WIKC-V2-Base.inp'
         cdef_file_1 = 'testing/WIKC-V2-Base-CDef.txt'
@@ -160,4 +292,337 @@ class TestAbaqusComponentReader(unittest.TestCase):
         n3 = np.array([0., 1., 0.])
         np.testing.assert_array_equal(couple.normal_direction, n3)
         pass
-    
\ No newline at end of file
+
+    def test_cached_read(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for i in range(2):
+                cached_reader = AbaqusInpToComponentReader(cache_dir)
+                if i == 0:
+                    # First read parses the input file and writes the cache
+                    cached_reader.read(macro_inp_file, macro_cdef_file)
+                    self.assertEqual(len([f for f in os.listdir(cache_dir) if f.endswith('.npz')]), 1)
+                else:
+                    # Second read loads the cache, the input file is not parsed
+                    with mock.patch.object(AbaqusInpToComponentReader, '_parse_inp_file',
+                                           side_effect=AssertionError('The input file was parsed')):
+                        cached_reader.read(macro_inp_file, macro_cdef_file)
+                np.testing.assert_array_equal(cached_reader.all_nodes.coords, reader.all_nodes.coords)
+                np.testing.assert_array_equal(cached_reader.node_systems, reader.node_systems)
+                self.assertEqual(cached_reader.coord_syss, reader.coord_syss)
+                for c, cc in zip(reader.components, cached_reader.components):
+                    np.testing.assert_array_equal(c.continuum_nodes.coords, cc.continuum_nodes.coords)
+                    self.assertEqual(c.length, cc.length)
+        pass
+
+    def test_read_targets(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        # Imperfections only, couplings are not assembled
+        imp_reader = AbaqusInpToComponentReader()
+        imp_reader.read(macro_inp_file, macro_cdef_file, targets=['imperfections'])
+        for c, ci in zip(reader.components, imp_reader.components):
+            self.assertEqual(len(ci.couplings), 0)
+            np.testing.assert_array_equal(c.continuum_nodes.coords, ci.continuum_nodes.coords)
+            self.assertEqual(c.length, ci.length)
+        # Couplings only, the component domains are not built
+        cpl_reader = AbaqusInpToComponentReader()
+        cpl_reader.read(macro_inp_file, macro_cdef_file, targets=['couplings'])
+        for c, cc in zip(reader.components, cpl_reader.components):
+            self.assertEqual(len(cc.continuum_nodes), 0)
+            self.assertEqual(len(c.couplings), len(cc.couplings))
+            for cpl, ccpl in zip(c.couplings, cc.couplings):
+                np.testing.assert_array_equal(cpl.warping_fun, ccpl.warping_fun)
+        # Remaining stages are run on request
+        imp_reader.require('couplings')
+        self.assertEqual([len(c.couplings) for c in imp_reader.components],
+                         [len(c.couplings) for c in reader.components])
+        with self.assertRaises(ValueError):
+            imp_reader.require('nodes')
+        pass
+
+    def test_coupling_sets_only(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        coupling_sets = {ci[k] for c in reader.components for ci in c.couplings_info
+                         for k in ['beam_set', 'continuum_set']}
+        index_dir = 'testing/output_cache/'
+        dir_maker(index_dir)
+        indexed_inp_file = os.path.join(index_dir, os.path.basename(macro_inp_file))
+        shutil.copyfile(macro_inp_file, indexed_inp_file)
+        for reader_options, inp_file in [[{}, macro_inp_file], [{'use_mmap': True}, macro_inp_file],
+                                         [{'use_index': True}, indexed_inp_file]]:
+            cpl_reader = AbaqusInpToComponentReader(**reader_options)
+            cpl_reader.read(inp_file, macro_cdef_file, targets=['couplings'])
+            # Only the first node of the other sets is loaded, for its coord sys
+            all_sets = {**reader.beam_sets, **reader.continuum_sets}
+            for name, ids in {**cpl_reader.beam_sets, **cpl_reader.continuum_sets}.items():
+                if name in coupling_sets:
+                    np.testing.assert_array_equal(ids, all_sets[name])
+                else:
+                    np.testing.assert_array_equal(ids, all_sets[name][:1])
+            self.assertLess(len(cpl_reader.all_nodes), len(reader.all_nodes) / 10)
+            for c, cc in zip(reader.components, cpl_reader.components):
+                self.assertEqual(c.base_cys_id, cc.base_cys_id)
+                for cpl, ccpl in zip(c.couplings, cc.couplings):
+                    np.testing.assert_array_equal(cpl.continuum_nodes.coords, ccpl.continuum_nodes.coords)
+                    np.testing.assert_array_equal(cpl.normal_direction, ccpl.normal_direction)
+            # Only the other sets are read when the imperfections are required
+            with mock.patch.object(AbaqusInpToComponentReader, '_parse_inp_file', autospec=True,
+                                   side_effect=AbaqusInpToComponentReader._parse_inp_file) as parse:
+                cpl_reader.require('imperfections')
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(parse.call_args[0][2], set(all_sets) - coupling_sets)
+            self.assertEqual(len(cpl_reader.all_nodes), len(reader.all_nodes))
+            for c, cc in zip(reader.components, cpl_reader.components):
+                self.assertEqual(len(c.couplings), len(cc.couplings))
+                np.testing.assert_array_equal(c.continuum_nodes.coords, cc.continuum_nodes.coords)
+                self.assertEqual(c.length, cc.length)
+        pass
+
+    def test_duplicate_nodes(self):
+        dup_dir = 'testing/output_cache/'
+        dir_maker(dup_dir)
+        dup_inp_file = os.path.join(dup_dir, 'duplicate-' + os.path.basename(macro_inp_file))
+        # Redefine a node in a second *Node block after the one that defines it, the last definition is kept
+        with open(macro_inp_file) as f:
+            lines = f.readlines()
+        i = lines.index('*Node\n', lines.index('*Node\n') + 1)
+        j = next(k for k in range(i + 1, len(lines)) if lines[k].startswith('*'))
+        lines[j:j] = ['*Node\n', '600, 1., 2., 3.\n']
+        with open(dup_inp_file, 'w') as f:
+            f.writelines(lines)
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        self.assertNotEqual(reader.all_nodes[600].tolist(), [1., 2., 3.])
+        for use_mmap in [False, True]:
+            dup_reader = AbaqusInpToComponentReader(use_mmap=use_mmap)
+            dup_reader.read(dup_inp_file, macro_cdef_file)
+            self.assertEqual(dup_reader.all_nodes[600].tolist(), [1., 2., 3.])
+            np.testing.assert_array_equal(dup_reader.all_nodes.ids, reader.all_nodes.ids)
+            np.testing.assert_array_equal(dup_reader.node_systems, reader.node_systems)
+        pass
+
+    def test_indexed_read(self):
+        index_dir = 'testing/output_cache/'
+        dir_maker(index_dir)
+        indexed_inp_file = os.path.join(index_dir, os.path.basename(macro_inp_file))
+        shutil.copyfile(macro_inp_file, indexed_inp_file)
+        if os.path.isfile(index_file_path(indexed_inp_file)):
+            os.remove(index_file_path(indexed_inp_file))
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        for i in range(2):
+            # First read builds the index, second read loads it
+            indexed_reader = AbaqusInpToComponentReader(use_index=True)
+            indexed_reader.read(indexed_inp_file, macro_cdef_file)
+            self.assertTrue(os.path.isfile(index_file_path(indexed_inp_file)))
+            np.testing.assert_array_equal(indexed_reader.all_nodes.ids, reader.all_nodes.ids)
+            np.testing.assert_array_equal(indexed_reader.all_nodes.coords, reader.all_nodes.coords)
+            np.testing.assert_array_equal(indexed_reader.node_systems, reader.node_systems)
+            self.assertEqual(indexed_reader.coord_syss, reader.coord_syss)
+        # The index is rebuilt if the file changes
+        index = load_inp_index(indexed_inp_file)
+        with open(indexed_inp_file, 'a') as f:
+            f.write('**\n')
+        self.assertIsNone(load_inp_index(indexed_inp_file))
+        self.assertEqual(build_inp_index(indexed_inp_file)['blocks'], index['blocks'])
+        # The index has the range of the IDs of the *Node blocks
+        with open(macro_inp_file, 'rb') as f:
+            buf = f.read()
+        for block in index['blocks']:
+            if block['keyword'] == '*node':
+                ids = buffer_node_arrays(buf, block['start'], block['end'])[0]
+                self.assertEqual([block['min_id'], block['max_id'], block['increasing']],
+                                 [int(ids.min()), int(ids.max()), bool(np.all(np.diff(ids) > 0))])
+        # A block whose IDs are not increasing is read even if its ends are out of the registered range
+        cpl_reader = AbaqusInpToComponentReader()
+        cpl_reader.read(macro_inp_file, macro_cdef_file, targets=['couplings'])
+        registered = set(cpl_reader.all_nodes.ids.tolist())
+        with open(macro_inp_file) as f:
+            lines = f.readlines()
+        i = lines.index('*Node\n', lines.index('*Node\n') + 1)
+        j = next(k for k in range(i + 1, len(lines)) if lines[k].startswith('*'))
+        ids = [int(li.split(',')[0]) for li in lines[i + 1:j]]
+        self.assertTrue(registered & set(ids))
+        # Move two nodes that are not registered to the ends of the block
+        k = next(k for k in range(len(ids) - 1) if ids[k] not in registered and ids[k + 1] not in registered)
+        block_lines = lines[i + 1:j]
+        lines[i + 1:j] = [block_lines[k]] + block_lines[:k] + block_lines[k + 2:] + [block_lines[k + 1]]
+        with open(indexed_inp_file, 'w') as f:
+            f.writelines(lines)
+        indexed_reader = AbaqusInpToComponentReader(use_index=True)
+        indexed_reader.read(indexed_inp_file, macro_cdef_file, targets=['couplings'])
+        np.testing.assert_array_equal(indexed_reader.all_nodes.ids, cpl_reader.all_nodes.ids)
+        np.testing.assert_array_equal(indexed_reader.all_nodes.coords, cpl_reader.all_nodes.coords)
+        np.testing.assert_array_equal(indexed_reader.node_systems, cpl_reader.node_systems)
+        # A block whose IDs are not increasing and that redefines a registered node is read, the last definition is kept
+        node_id = min(registered)
+        with open(macro_inp_file) as f:
+            lines = f.readlines()
+        j = next(k for k in range(i + 1, len(lines)) if lines[k].startswith('*'))
+        lines[j:j] = ['*Node\n', '999999, 0., 0., 0.\n', '{0}, 1., 2., 3.\n'.format(node_id), '999998, 0., 0., 0.\n']
+        with open(indexed_inp_file, 'w') as f:
+            f.writelines(lines)
+        index = get_inp_index(indexed_inp_file)
+        self.assertFalse(next(b for b in index['blocks'] if b.get('max_id') == 999999)['increasing'])
+        indexed_reader = AbaqusInpToComponentReader(use_index=True)
+        indexed_reader.read(indexed_inp_file, macro_cdef_file, targets=['couplings'])
+        self.assertEqual(indexed_reader.all_nodes[node_id].tolist(), [1., 2., 3.])
+        pass
+
+    def test_index_not_saved(self):
+        index_dir = 'testing/output_cache/unsaved/'
+        shutil.rmtree(index_dir, ignore_errors=True)
+        dir_maker(index_dir)
+        unsaved_inp_file = os.path.join(index_dir, os.path.basename(macro_inp_file))
+        shutil.copyfile(macro_inp_file, unsaved_inp_file)
+        reader = AbaqusInpToComponentReader()
+        reader.read(macro_inp_file, macro_cdef_file)
+        # The index cannot be written (e.g., read-only directory), the index built in memory is used
+        with mock.patch('pywikc.inp_index.json.dump', side_effect=OSError('Read-only file system')):
+            self.assertEqual(get_inp_index(unsaved_inp_file)['blocks'], build_inp_index(unsaved_inp_file)['blocks'])
+            indexed_reader = AbaqusInpToComponentReader(use_index=True)
+            indexed_reader.read(unsaved_inp_file, macro_cdef_file)
+        self.assertEqual(os.listdir(index_dir), [os.path.basename(unsaved_inp_file)])
+        np.testing.assert_array_equal(indexed_reader.all_nodes.coords, reader.all_nodes.coords)
+        # Same when the stored index is valid but its modification time needs to be updated
+        index = get_inp_index(unsaved_inp_file)
+        os.utime(unsaved_inp_file, ns=(index['mtime_ns'] + 10 ** 9, index['mtime_ns'] + 10 ** 9))
+        with mock.patch('pywikc.inp_index.json.dump', side_effect=OSError('Read-only file system')):
+            self.assertEqual(load_inp_index(unsaved_inp_file)['blocks'], index['blocks'])
+        self.assertFalse(os.path.isfile(index_file_path(unsaved_inp_file) + '.tmp'))
+        pass
+
+    def test_mapped_read(self):
+        for inp, cdef in [(inp_file, cdef_file), (macro_inp_file, macro_cdef_file)]:
+            reader = AbaqusInpToComponentReader()
+            reader.read(inp, cdef)
+            mapped_reader = AbaqusInpToComponentReader(use_mmap=True)
+            mapped_reader.read(inp, cdef)
+            np.testing.assert_array_equal(mapped_reader.all_nodes.ids, reader.all_nodes.ids)
+            np.testing.assert_array_equal(mapped_reader.all_nodes.coords, reader.all_nodes.coords)
+            np.testing.assert_array_equal(mapped_reader.node_systems, reader.node_systems)
+            self.assertEqual(mapped_reader.coord_syss, reader.coord_syss)
+        pass
+
+    def test_include_read(self):
+        # Split the deck so that the *System of the input file is active in the included files
+        include_dir = 'testing/output_cache/include/'
+        dir_maker(os.path.join(include_dir, 'members'))
+        with open(inp_file, 'r') as f:
+            lines = f.readlines()
+        split_inp_file = os.path.join(include_dir, 'Job-1.inp')
+        with open(split_inp_file, 'w') as f:
+            f.writelines(lines[:11] + ['*Include, input=members/a.inp\n'] + lines[41:])
+        with open(os.path.join(include_dir, 'members', 'a.inp'), 'w') as f:
+            f.writelines(lines[11:30] + ['*INCLUDE, INPUT=b.inp\n'])
+        with open(os.path.join(include_dir, 'members', 'b.inp'), 'w') as f:
+            f.writelines(lines[30:41])
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        for split_reader in [AbaqusInpToComponentReader(), AbaqusInpToComponentReader(use_mmap=True),
+                             AbaqusInpToComponentReader(workers=2)]:
+            split_reader.read(split_inp_file, cdef_file)
+            self.assertEqual(len(split_reader.include_files), 2)
+            np.testing.assert_array_equal(split_reader.all_nodes.ids, reader.all_nodes.ids)
+            np.testing.assert_array_equal(split_reader.all_nodes.coords, reader.all_nodes.coords)
+            np.testing.assert_array_equal(split_reader.node_systems, reader.node_systems)
+            self.assertEqual(split_reader.coord_syss, reader.coord_syss)
+        # The cache is not reused if an included file changes
+        cache_dir = os.path.join(include_dir, 'cache')
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        AbaqusInpToComponentReader(cache_dir).read(split_inp_file, cdef_file)
+        with open(os.path.join(include_dir, 'members', 'b.inp'), 'w') as f:
+            f.writelines(lines[30:41] + ['*System\n', '0., 0., 0., 0., 1., 0., -1., 0., 0.\n'])
+        cached_reader = AbaqusInpToComponentReader(cache_dir)
+        cached_reader.read(split_inp_file, cdef_file)
+        self.assertEqual(len(cached_reader.coord_syss), len(reader.coord_syss) + 1)
+        pass
+
+    def test_compressed_read(self):
+        compressed_dir = 'testing/output_cache/compressed/'
+        dir_maker(compressed_dir)
+        gz_inp_file = os.path.join(compressed_dir, 'Job-1.inp.gz')
+        xz_inp_file = os.path.join(compressed_dir, 'subassem-macro.inp.xz')
+        with open(inp_file, 'rb') as f, gzip.open(gz_inp_file, 'wb') as gz:
+            shutil.copyfileobj(f, gz)
+        with open(macro_inp_file, 'rb') as f, lzma.open(xz_inp_file, 'wb') as xz:
+            shutil.copyfileobj(f, xz)
+        legacy = AbaqusInpReader().read(inp_file, def_file)
+        legacy_gz = AbaqusInpReader().read(gz_inp_file, def_file)
+        for c, c_gz in zip(legacy, legacy_gz):
+            np.testing.assert_array_equal(list(c.shell_nodes.values()), list(c_gz.shell_nodes.values()))
+        for inp, comp_inp, cdef in [(inp_file, gz_inp_file, cdef_file), (macro_inp_file, xz_inp_file, macro_cdef_file)]:
+            reader = AbaqusInpToComponentReader()
+            reader.read(inp, cdef)
+            for comp_reader in [AbaqusInpToComponentReader(), AbaqusInpToComponentReader(use_mmap=True)]:
+                comp_reader.read(comp_inp, cdef)
+                np.testing.assert_array_equal(comp_reader.all_nodes.ids, reader.all_nodes.ids)
+                np.testing.assert_array_equal(comp_reader.all_nodes.coords, reader.all_nodes.coords)
+                np.testing.assert_array_equal(comp_reader.node_systems, reader.node_systems)
+                self.assertEqual(comp_reader.coord_syss, reader.coord_syss)
+        pass
+
+
+class TestInpBuffer(unittest.TestCase):
+
+    def test_node_blocks(self):
+        blocks = [b'1, 0., 1., 2.\n2, 3.5, -4., 5e-3\n',
+                  b'1, 0., 1., 2.\r\n2,3.5,-4.,5e-3\r\n',
+                  b'1, 0., 1.\n2, 3.5, -4.\n',
+                  b'1, 0., 1., 2.\n** comment\n\n2, 3.5, -4., 5e-3\n',
+                  b'1, 0., 1.\n2, 3.5, -4., 5e-3\n3, 1., , 2.\n',
+                  b'1, 0., 1., 2., 7.\n2, 3.5, -4., 5e-3, 8.',
+                  b'']
+        for block in blocks:
+            expected = parse_node_lines(buffer_lines(block, 0, len(block)))
+            for chunk_size in [8, BUFFER_CHUNK_SIZE]:
+                ids = [parse_node_lines([])[0]]
+                coords = [parse_node_lines([])[1]]
+                for a, b in chunk_ranges(block, 0, len(block), chunk_size):
+                    chunk_ids, chunk_coords = buffer_node_arrays(block, a, b)
+                    ids.append(chunk_ids)
+                    coords.append(chunk_coords)
+                np.testing.assert_array_equal(np.concatenate(ids), expected[0])
+                np.testing.assert_array_equal(np.concatenate(coords), expected[1])
+        pass
+
+    def test_n_set_blocks(self):
+        blocks = [[b' 1, 2, 3\n 4, 5\n', False],
+                  [b' 1, 2, 3,\n 4, 5,\n', False],
+                  [b' 1, 10, 3\n 20, 22\n', True]]
+        for block, generate in blocks:
+            expected = n_set_ids(buffer_lines(block, 0, len(block)), generate)
+            self.assertEqual(buffer_n_set_ids(block, 0, len(block), generate).tolist(), expected.tolist())
+        pass
+
+    def test_parallel_blocks(self):
+        with open(macro_inp_file, 'rb') as f:
+            buf = f.read()
+        block = [b for b in build_inp_index(macro_inp_file)['blocks'] if b['keyword'] == '*node'][0]
+        expected = buffer_node_arrays(buf, block['start'], block['end'])
+        # Parse even small blocks in parallel
+        min_size = inp_buffer.PARALLEL_MIN_SIZE
+        chunk_size = inp_buffer.BUFFER_CHUNK_SIZE
+        inp_buffer.PARALLEL_MIN_SIZE = 0
+        inp_buffer.BUFFER_CHUNK_SIZE = 1024
+        try:
+            ids, coords = inp_buffer.parallel_node_arrays(buf, macro_inp_file, block['start'], block['end'], 2)
+            # One pool of worker processes for all the blocks of the read
+            with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                            wraps=concurrent.futures.ProcessPoolExecutor) as pool_class:
+                reader = AbaqusInpToComponentReader(workers=2)
+                reader.read(macro_inp_file, macro_cdef_file)
+            self.assertEqual(pool_class.call_count, 1)
+        finally:
+            inp_buffer.PARALLEL_MIN_SIZE = min_size
+            inp_buffer.BUFFER_CHUNK_SIZE = chunk_size
+        np.testing.assert_array_equal(ids, expected[0])
+        np.testing.assert_array_equal(coords, expected[1])
+        serial_reader = AbaqusInpToComponentReader()
+        serial_reader.read(macro_inp_file, macro_cdef_file)
+        np.testing.assert_array_equal(reader.all_nodes.coords, serial_reader.all_nodes.coords)
+        np.testing.assert_array_equal(reader.node_systems, serial_reader.node_systems)
+        pass
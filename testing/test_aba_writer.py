@@ -1,10 +1,14 @@
 import unittest
 import os
 import errno
+import gzip
+import shutil
 from pywikc.reader import AbaqusInpReader
 from pywikc.component_reader import AbaqusInpToComponentReader
 from pywikc.abaqus_equation_writer import AbaqusLinearCouplingWriter
 from pywikc.abaqus_i_coupling_writer import AbaqusNonLinearCouplingWriter, AbaqusICouplingWriter
+from pywikc.abaqus_inp_writer import AbaqusMergedInpWriter
+from pywikc.compressed_io import open_text
 
 
 def dir_maker(directory):
@@ -20,13 +24,30 @@ def dir_maker(directory):
 inp_file = 'testing/Job-1.inp'
 def_file = 'testing/def_file_1.txt'
 cdef_file = 'testing/cdef_file_1.txt'
+macro_inp_file = 'testing/subassem-macro.inp'
+macro_cdef_file = 'testing/subassem-macro_cdef.txt'
 
 out_dir = 'testing/output/'
 out_dir_nl = 'testing/output_nl/'
+out_dir_shards = 'testing/output_shards/'
+out_dir_compact = 'testing/output_compact/'
+out_dir_merged = 'testing/output_merged/'
+out_dir_external = 'testing/output_external/'
+out_dir_rewrite = 'testing/output_rewrite/'
 out_dir_comp = 'testing/output_component/'
+out_dir_compressed = 'testing/output_compressed/'
+out_dir_include = 'testing/output_include/'
 dir_maker(out_dir)
 dir_maker(out_dir_nl)
+dir_maker(out_dir_shards)
+dir_maker(out_dir_compact)
+dir_maker(out_dir_merged)
+dir_maker(out_dir_external)
+dir_maker(out_dir_rewrite)
 dir_maker(out_dir_comp)
+dir_maker(os.path.join(out_dir_compressed, 'plain'))
+dir_maker(os.path.join(out_dir_compressed, 'gzip'))
+dir_maker(os.path.join(out_dir_compressed, 'xz'))
 
 class TestAbaqusWriter(unittest.TestCase):
 
@@ -37,6 +58,27 @@ class TestAbaqusWriter(unittest.TestCase):
         writer.write(couplings)
         pass
 
+    def test_sharded_writer(self):
+        reader = AbaqusInpReader()
+        couplings = reader.read(inp_file, def_file)
+        AbaqusLinearCouplingWriter(out_dir).write(couplings)
+        writer = AbaqusLinearCouplingWriter(out_dir_shards, num_shards=4)
+        writer.write(couplings)
+        with open(os.path.join(out_dir_shards, writer.KEYWFILE_BASE)) as f:
+            self.assertEqual(len(f.readlines()), 4)
+        # The shards contain all the per-constraint files in order
+        num_constraints = sum(len(c.constraints) for c in couplings)
+        single_files = ''
+        for i in range(num_constraints):
+            with open(os.path.join(out_dir, writer.DATAFILE_BASE + str(i) + '.txt')) as f:
+                single_files += f.read()
+        shard_files = ''
+        for i in range(4):
+            with open(os.path.join(out_dir_shards, writer.DATAFILE_BASE + str(i) + '.txt')) as f:
+                shard_files += f.read()
+        self.assertEqual(single_files, shard_files)
+        pass
+
     def test_nl_writer(self):
         reader = AbaqusInpReader()
         writer = AbaqusNonLinearCouplingWriter(out_dir_nl)
@@ -56,3 +98,181 @@ class TestAbaqusComponentWriter(unittest.TestCase):
         writer = AbaqusICouplingWriter(out_dir_comp)
         writer.write(couplings)
         pass
+
+    def test_compact_component_writer(self):
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(inp_file, cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        writer = AbaqusICouplingWriter(out_dir_compact, compact_mpc=True)
+        writer.write(couplings)
+        with open(os.path.join(out_dir_compact, writer.KEYWFILE_BASE)) as f:
+            lines = f.readlines()
+        mpc_keyw = [li for li in lines if li.startswith('*MPC')]
+        mpc_data = [li for li in lines if li.startswith('27,')]
+        self.assertEqual(len(mpc_keyw), len(couplings))
+        self.assertEqual(len(mpc_data), sum(len(c.continuum_nodes) for c in couplings))
+        pass
+
+    def test_merged_inp_writer(self):
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(inp_file, cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        writer = AbaqusMergedInpWriter(out_dir_merged, inp_file, 'Job-1-Imp.txt')
+        merged_file = writer.write(couplings)
+        with open(inp_file) as f:
+            original = f.readlines()
+        with open(merged_file) as f:
+            merged = f.readlines()
+        keywords = [li.split(',')[0].strip() for li in merged if li.startswith('*') and not li.startswith('**')]
+        n_cont = sum(len(c.continuum_nodes) for c in couplings)
+        self.assertEqual(keywords.count('*MPC'), n_cont)
+        # MPC, amplitude, and imperfection before the first step, fields in the first step
+        i_step = keywords.index('*Step')
+        self.assertTrue(keywords.index('*Imperfection') < i_step)
+        self.assertTrue(keywords.index('*Amplitude') < i_step)
+        self.assertTrue(max(i for i, k in enumerate(keywords) if k == '*MPC') < i_step)
+        self.assertTrue(i_step < keywords.index('*Field') < keywords.index('*End Step'))
+        # All the original lines are kept in order
+        original_lines = iter(merged)
+        self.assertTrue(all(li in original_lines for li in original))
+        pass
+
+    def test_merged_inp_writer_include(self):
+        # Split the deck, the new input file is written to another directory
+        include_dir = os.path.join(out_dir_include, 'deck')
+        include_out_dir = os.path.join(out_dir_include, 'out')
+        dir_maker(os.path.join(include_dir, 'mesh'))
+        dir_maker(include_out_dir)
+        with open(inp_file) as f:
+            lines = f.readlines()
+        split_inp_file = os.path.join(include_dir, 'deck.inp')
+        with open(split_inp_file, 'w') as f:
+            f.writelines(lines[:41] + ['*Include, input=mesh/nodes.inp\n'] + lines[576:])
+        with open(os.path.join(include_dir, 'mesh', 'nodes.inp'), 'w') as f:
+            f.writelines(lines[41:576])
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(inp_file, cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        merged_file = AbaqusMergedInpWriter(include_out_dir, split_inp_file).write(couplings)
+        with open(merged_file) as f:
+            include_lines = [li for li in f if li.lower().startswith('*include')]
+        include_file = os.path.join('..', 'deck', 'mesh', 'nodes.inp')
+        self.assertEqual(include_lines, ['*Include, input={0}\n'.format(include_file)])
+        merged_reader = AbaqusInpToComponentReader()
+        merged_reader.read(merged_file, cdef_file)
+        self.assertEqual(merged_reader.all_nodes.ids.tolist(), reader.all_nodes.ids.tolist())
+        self.assertEqual(merged_reader.all_nodes.coords.tolist(), reader.all_nodes.coords.tolist())
+        # The first step cannot be in an included file
+        i_step = next(i for i, li in enumerate(lines) if li.startswith('*Step'))
+        with open(split_inp_file, 'w') as f:
+            f.writelines(lines[:i_step] + ['*Include, input=mesh/step.inp\n'])
+        with open(os.path.join(include_dir, 'mesh', 'step.inp'), 'w') as f:
+            f.writelines(lines[i_step:])
+        with self.assertRaisesRegex(ValueError, '\\*Include'):
+            AbaqusMergedInpWriter(include_out_dir, split_inp_file).write(couplings)
+        pass
+
+    def test_external_data_writer(self):
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(inp_file, cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        writer = AbaqusICouplingWriter(out_dir_external, external_data=True, input_path_prepend='data/')
+        writer.write(couplings)
+        with open(os.path.join(out_dir_external, writer.KEYWFILE_BASE)) as f:
+            keywords = [li for li in f.readlines() if li.startswith('*') and not li.startswith('**')]
+        # One MPC and one warping field per coupling, the amplitude, and three normal direction fields
+        self.assertEqual(len(keywords), 1 + 2 * len(couplings) + 3)
+        mpc_line = [li for li in keywords if li.startswith('*MPC')][0]
+        self.assertEqual(mpc_line, '*MPC, MODE=NODE, USER, input=data/WIKC_Data_MPC_0.txt\n')
+        with open(os.path.join(out_dir_external, 'WIKC_Data_MPC_0.txt')) as f:
+            self.assertEqual(len(f.readlines()), len(couplings[0].continuum_nodes))
+        # Unchanged data files are not re-written
+        mtime = os.path.getmtime(os.path.join(out_dir_external, 'WIKC_Data_Warp_0.txt'))
+        writer = AbaqusICouplingWriter(out_dir_external, external_data=True, input_path_prepend='data/')
+        writer.write(couplings)
+        self.assertEqual(mtime, os.path.getmtime(os.path.join(out_dir_external, 'WIKC_Data_Warp_0.txt')))
+        self.assertEqual([f for f in os.listdir(out_dir_external) if f.endswith('.tmp')], [])
+        # The merged input file writer keeps the keyword and data files of the coupling writer
+        coupling_files = sorted(os.listdir(out_dir_external))
+        for external_data in [True, False]:
+            AbaqusMergedInpWriter(out_dir_external, inp_file, external_data=external_data).write(couplings)
+            self.assertTrue(set(coupling_files) <= set(os.listdir(out_dir_external)))
+        self.assertEqual(mtime, os.path.getmtime(os.path.join(out_dir_external, 'WIKC_Data_Warp_0.txt')))
+        pass
+
+    def test_external_data_rewrite(self):
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(macro_inp_file, macro_cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        self.assertGreater(len(couplings), 1)
+        writer = AbaqusICouplingWriter(out_dir_rewrite, external_data=True)
+        writer.write(couplings)
+        self.assertTrue(os.path.isfile(os.path.join(out_dir_rewrite, 'WIKC_Data_MPC_1.txt')))
+        # Fewer couplings with the same writer, the data files of the other couplings are removed
+        writer.write(couplings[:1])
+        data_files = sorted(f for f in os.listdir(out_dir_rewrite) if f.startswith('WIKC_Data_'))
+        self.assertEqual(data_files, ['WIKC_Data_MPC_0.txt', 'WIKC_Data_Normal_2.txt', 'WIKC_Data_Normal_3.txt',
+                                      'WIKC_Data_Normal_4.txt', 'WIKC_Data_Warp_0.txt'])
+        # Changed data files are re-written, whether they are shorter, longer, or differ
+        mpc_file = os.path.join(out_dir_rewrite, 'WIKC_Data_MPC_0.txt')
+        with open(mpc_file) as f:
+            expected = f.read()
+        for changed in [expected[:-10], expected + '1, 2, 3\n', expected.replace('1', '2', 1), '']:
+            with open(mpc_file, 'w') as f:
+                f.write(changed)
+            writer.write(couplings[:1])
+            with open(mpc_file) as f:
+                self.assertEqual(f.read(), expected)
+        self.assertEqual([f for f in os.listdir(out_dir_rewrite) if f.endswith('.tmp')], [])
+        pass
+
+    def test_compressed_writers(self):
+        reader = AbaqusInpToComponentReader()
+        components = reader.read(inp_file, cdef_file)
+        couplings = []
+        for c in components:
+            couplings += c.couplings
+        legacy_couplings = AbaqusInpReader().read(inp_file, def_file)
+        plain_dir = os.path.join(out_dir_compressed, 'plain')
+        for compression in ['gzip', 'xz']:
+            out = os.path.join(out_dir_compressed, compression)
+            ext = {'gzip': '.gz', 'xz': '.xz'}[compression]
+            for d in [plain_dir, out]:
+                shutil.rmtree(d)
+                dir_maker(d)
+            writers = [[AbaqusICouplingWriter(plain_dir, external_data=True),
+                        AbaqusICouplingWriter(out, external_data=True, compression=compression)],
+                       [AbaqusMergedInpWriter(plain_dir, inp_file),
+                        AbaqusMergedInpWriter(out, inp_file, compression=compression)]]
+            for plain_writer, compressed_writer in writers:
+                plain_writer.write(couplings)
+                compressed_writer.write(couplings)
+            AbaqusLinearCouplingWriter(plain_dir, num_shards=2).write(legacy_couplings)
+            AbaqusLinearCouplingWriter(out, num_shards=2, compression=compression).write(legacy_couplings)
+            # Same files with the extension appended, the contents are identical once decompressed
+            plain_files = sorted(os.listdir(plain_dir))
+            self.assertEqual(sorted(os.listdir(out)), [f + ext for f in plain_files])
+            for f in plain_files:
+                with open(os.path.join(plain_dir, f)) as plain, open_text(os.path.join(out, f + ext)) as comp:
+                    self.assertEqual(plain.read(), comp.read())
+        with self.assertRaises(ValueError):
+            AbaqusICouplingWriter(out_dir_compressed, compression='zip')
+        # Compressed input file
+        gz_inp_file = os.path.join(out_dir_compressed, 'Job-1.inp.gz')
+        with open(inp_file, 'rb') as f, gzip.open(gz_inp_file, 'wb') as gz:
+            shutil.copyfileobj(f, gz)
+        merged_file = AbaqusMergedInpWriter(out_dir_compressed, gz_inp_file).write(couplings)
+        self.assertEqual(os.path.basename(merged_file), 'Job-1-WIKC.inp')
+        with open(merged_file) as f, open(os.path.join(plain_dir, 'Job-1-WIKC.inp')) as plain:
+            self.assertEqual(f.read(), plain.read())
+        pass
@@ -1,10 +1,17 @@
 import unittest
+from unittest import mock
 import numpy as np
 import os
 import errno
 from pywikc.reader import AbaqusInpReader
 from pywikc.component_reader import AbaqusInpToComponentReader
-from pywikc.imperfections.generate_imperfections import set_imperfection_properties, generate_component_imp
+from pywikc.imperfections.generate_imperfections import set_imperfection_properties, generate_component_imp, \
+    generate_all_imp, i_straight_imp, i_plumb_imp, i_local_imp, i_twist_imp, i_local_imp_array, local_imp_rows
+from pywikc.imperfections.imperfection_modes import ImperfectionModes
+from pywikc.imperfections import generate_imperfections
+from pywikc.model_session import ModelSession
+from pywikc.processing import gen_aba_couples_imperfections, gen_aba_imperfections
+from pywikc.imperfections.abaqus_txt_writer import AbaqusTxtWriter, format_imperfections, IMP_LINE_FORMAT
 
 
 def dir_maker(directory):
@@ -21,7 +28,11 @@ inp_file = 'testing/subassem.inp'
 cdef_file = 'testing/subassem_cdef.txt'
 
 out_dir = 'testing/output_subassem/'
+out_dir_session = 'testing/output_session/'
+out_dir_sparse = 'testing/output_sparse/'
 dir_maker(out_dir)
+dir_maker(out_dir_session)
+dir_maker(out_dir_sparse)
 
 
 class TestIImperfections(unittest.TestCase):
@@ -42,3 +53,171 @@ class TestIImperfections(unittest.TestCase):
             beam_2_imp_amps.append(np.linalg.norm(np.array(imp)))
         self.assertAlmostEqual(max(beam_1_imp_amps), max(beam_2_imp_amps))
         pass
+
+    def test_array_matches_scalar(self):
+        for num_waves, is_rbs in [(1, False), (2, False), (1, True), (2, True)]:
+            reader = AbaqusInpToComponentReader()
+            reader.read(inp_file, cdef_file)
+            c = reader.components[1]
+            c.imperfection_props.update({'num_of_waves': num_waves, 'is_RBS': is_rbs, 'RBS_offset': 228.6,
+                                         'straight_scale': 1., 'twist_scale': 1.})
+            set_imperfection_properties(c)
+            generate_component_imp(c)
+            props = c.imperfection_props
+            for node_id, coords in c.beam_nodes.items():
+                imp = i_straight_imp(coords, props) + i_plumb_imp(coords, props)
+                np.testing.assert_allclose(c.node_imperfections[node_id], imp, rtol=1.e-12, atol=1.e-12)
+            for node_id, coords in c.continuum_nodes.items():
+                is_top = coords[2] > c.length / 2. and not is_rbs
+                imp = i_straight_imp(coords, props) + i_plumb_imp(coords, props) + \
+                    i_local_imp(coords, props, is_top) + i_twist_imp(coords, props)
+                np.testing.assert_allclose(c.node_imperfections[node_id], imp, rtol=1.e-12, atol=1.e-12)
+        pass
+
+    def test_modes_match_generate(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        c = reader.components[0]
+        definition_props = dict(c.imperfection_props)
+        modes = ImperfectionModes(c)
+        for scales in [{'local_scale': 1., 'straight_scale': 1., 'twist_scale': 1.},
+                       {'local_scale': -0.5, 'straight_scale': 2., 'twist_scale': 0.},
+                       {'local_scale': 0., 'straight_scale': 0., 'twist_scale': 3.}]:
+            c.imperfection_props = {**definition_props, **scales}
+            set_imperfection_properties(c)
+            generate_component_imp(c)
+            np.testing.assert_array_equal(modes.ids, c.node_imperfections.ids)
+            np.testing.assert_allclose(modes.imperfections(**scales), c.node_imperfections.coords, atol=1.e-10)
+        # Construction after set_imperfection_properties gives the same modes and default scales
+        modes_after = ImperfectionModes(c)
+        self.assertEqual(modes_after.default_scales, modes.default_scales)
+        np.testing.assert_array_equal(modes_after.imperfections(), modes.imperfections())
+        pass
+
+    def test_parallel_matches_serial(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        generate_all_imp(reader.components)
+        reader_par = AbaqusInpToComponentReader()
+        reader_par.read(inp_file, cdef_file)
+        generate_all_imp(reader_par.components, workers=2)
+        for c, c_par in zip(reader.components, reader_par.components):
+            np.testing.assert_array_equal(c.node_imperfections.ids, c_par.node_imperfections.ids)
+            np.testing.assert_array_equal(c.node_imperfections.coords, c_par.node_imperfections.coords)
+        pass
+
+    def test_bulk_format_matches_lines(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        generate_all_imp(reader.components)
+        imp = reader.components[0].node_imperfections
+        # Add negative zeros, ties, and large values
+        ids = np.concatenate((imp.ids, [1, 22, 333, 4444]))
+        coords = np.concatenate((imp.coords, [[-0., 0., -1.e-9], [5.e-7, 1.5e-6, -2.5e-6],
+                                              [1.e12, -123.4567895, 0.1], [np.nan, np.inf, 1.]]))
+        expected = ''.join(IMP_LINE_FORMAT.format(nid, c[0], c[1], c[2]) for nid, c in zip(ids.tolist(), coords))
+        self.assertEqual(format_imperfections(ids, coords), expected)
+        self.assertEqual(format_imperfections(imp.ids, imp.coords),
+                         ''.join(IMP_LINE_FORMAT.format(nid, c[0], c[1], c[2]) for nid, c in imp.items()))
+        pass
+
+    def test_sparse_output(self):
+        reader = AbaqusInpToComponentReader()
+        reader.read(inp_file, cdef_file)
+        generate_all_imp(reader.components)
+        writer = AbaqusTxtWriter(reader.components)
+        n_nodes = sum(len(c.node_imperfections) for c in reader.components)
+        full_file = os.path.join(out_dir, 'full-Imp.txt')
+        sparse_file = os.path.join(out_dir, 'sparse-Imp.txt')
+        self.assertEqual(writer.write_imperfections(full_file), [n_nodes, 0])
+        with open(full_file) as f:
+            full_lines = f.readlines()
+        magnitudes = np.concatenate([np.linalg.norm(c.node_imperfections.coords, axis=1) for c in reader.components])
+        for sparse_tol in [0., np.median(magnitudes)]:
+            n_kept = int(np.count_nonzero(magnitudes > sparse_tol))
+            self.assertEqual(writer.write_imperfections(sparse_file, sparse_tol=sparse_tol),
+                             [n_kept, n_nodes - n_kept])
+            self.assertGreater(n_nodes - n_kept, 0)
+            with open(sparse_file) as f:
+                sparse_lines = f.readlines()
+            self.assertEqual(len(sparse_lines), n_kept)
+            # The written lines are the same as in the full file, every skipped node is within the tolerance
+            self.assertTrue(set(sparse_lines) <= set(full_lines))
+            skipped = set(full_lines) - set(sparse_lines)
+            self.assertEqual(len(skipped), n_nodes - n_kept)
+            for li in skipped:
+                self.assertLessEqual(np.linalg.norm([float(v) for v in li.split(',')[1:]]), sparse_tol + 1.e-6)
+        # The counts are returned by the processing functions and stored by the session
+        n_kept = int(np.count_nonzero(magnitudes > 0.))
+        self.assertEqual(gen_aba_imperfections(inp_file, cdef_file, out_dir_sparse, sparse_tol=0.),
+                         [n_kept, n_nodes - n_kept])
+        self.assertEqual(gen_aba_couples_imperfections(inp_file, cdef_file, out_dir_sparse, sparse_tol=0.),
+                         [n_kept, n_nodes - n_kept])
+        session = ModelSession(inp_file, cdef_file)
+        session.write_imperfections(out_dir_sparse)
+        self.assertEqual(session.imperfection_counts, [n_nodes, 0])
+        pass
+
+    def test_local_windows(self):
+        for is_rbs in [False, True]:
+            reader = AbaqusInpToComponentReader()
+            reader.read(inp_file, cdef_file)
+            c = reader.components[1]
+            c.imperfection_props.update({'is_RBS': is_rbs, 'RBS_offset': 228.6})
+            set_imperfection_properties(c)
+            props = c.imperfection_props
+            coords = c.continuum_nodes.coords
+            is_top = (coords[:, 2] > c.length / 2.) & (not is_rbs)
+            rows = local_imp_rows(coords[:, 2], props, c.get_continuum_z_order())
+            self.assertLess(len(rows), len(coords))
+            local_imp = i_local_imp_array(coords, props, is_top, c.get_continuum_z_order())
+            # Windows that contain all the nodes
+            window_tol = generate_imperfections.WINDOW_TOL
+            generate_imperfections.WINDOW_TOL = 1.e12
+            try:
+                self.assertEqual(len(local_imp_rows(coords[:, 2], props)), len(coords))
+                expected = i_local_imp_array(coords, props, is_top)
+            finally:
+                generate_imperfections.WINDOW_TOL = window_tol
+            # Identical, including the sign of zeros
+            np.testing.assert_array_equal(local_imp.view(np.int64), expected.view(np.int64))
+            outside = np.setdiff1d(np.arange(len(coords)), rows)
+            self.assertFalse(np.any(expected[outside]))
+        pass
+
+    def test_model_session(self):
+        session = ModelSession(inp_file, cdef_file)
+        reader = session.get_reader()
+        imp_file = session.write_imperfections(out_dir_session)
+        session.write_couplings(out_dir_session)
+        # The model is read and the imperfections are generated only once
+        self.assertIs(session.get_reader(), reader)
+        imps = [c.node_imperfections for c in session.get_components()]
+        session.write_imperfections(out_dir_session)
+        self.assertEqual(imps, [c.node_imperfections for c in session.get_components()])
+        self.assertIs(session.get_couplings(), session.get_couplings())
+        # Same files as the processing functions
+        gen_aba_couples_imperfections(inp_file, cdef_file, out_dir)
+        for file_name in [os.path.basename(imp_file), 'MPC_Keywords.txt']:
+            with open(os.path.join(out_dir_session, file_name)) as f1, open(os.path.join(out_dir, file_name)) as f2:
+                self.assertEqual(f1.read(), f2.read())
+        # The number of processes is passed to the reader
+        parallel_reader = ModelSession(inp_file, cdef_file, workers=2).get_reader()
+        self.assertEqual(parallel_reader.workers, 2)
+        np.testing.assert_array_equal(parallel_reader.all_nodes.coords, reader.all_nodes.coords)
+        pass
+
+    def test_model_session_couplings_first(self):
+        reader = ModelSession(inp_file, cdef_file).get_reader()
+        session = ModelSession(inp_file, cdef_file)
+        # The input file is parsed once, whatever the order of the requests
+        with mock.patch.object(AbaqusInpToComponentReader, '_parse_inp_file', autospec=True,
+                               side_effect=AbaqusInpToComponentReader._parse_inp_file) as parse:
+            couplings = session.get_couplings()
+            session.generate_imperfections()
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(len(couplings), sum(len(c.couplings) for c in reader.components))
+        np.testing.assert_array_equal(session.get_reader().all_nodes.coords, reader.all_nodes.coords)
+        for c, cs in zip(reader.components, session.get_components()):
+            np.testing.assert_array_equal(c.continuum_nodes.coords, cs.continuum_nodes.coords)
+        pass
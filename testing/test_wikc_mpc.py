@@ -0,0 +1,163 @@
+import unittest
+import os
+import gzip
+import numpy as np
+from pywikc.component import ICoupling
+from pywikc.component_reader import AbaqusInpToComponentReader
+from pywikc.dir_maker import dir_maker
+from pywikc.wikc_mpc import skew, rvec2rmat, wikc_mpc, wikc_violation, coupling_mpc, JTYPES
+from pywikc.constraint_residuals import check_result_constraints, global_node_coords
+
+macro_inp_file = 'testing/subassem-macro.inp'
+macro_cdef_file = 'testing/subassem-macro_cdef.txt'
+out_dir = 'testing/output_residuals/'
+
+
+def fortran_mpc(jtype, x_cont, x_beam, u_beam, warp_fun, t_vec):
+    """ Line by line transcription of the MPC subroutine for a single continuum node. """
+    link = x_cont - x_beam
+    a_beam = np.zeros((3, 7))
+    a_beam[:, 0:3] = -np.identity(3)
+    t = np.array(t_vec, dtype=np.float64)
+    if jtype in [16, 17]:
+        ue = np.array([u_beam[0] - link[1] * u_beam[5],
+                       u_beam[1] + link[0] * u_beam[5],
+                       u_beam[2] - link[0] * u_beam[4] + link[1] * u_beam[3]])
+        a_beam[:, 3:6] = np.cross(link, -np.identity(3))
+        if jtype == 17:
+            ue += warp_fun * u_beam[6] * t
+            a_beam[:, 6] = -warp_fun * t
+    else:
+        rvec = np.array(u_beam[3:6])
+        r = np.linalg.norm(rvec)
+        rmat = np.identity(3)
+        if r >= 1.e-14:
+            k = np.cross(rvec / r, -np.identity(3))
+            rmat = np.identity(3) + np.sin(r) * k + (1. - np.cos(r)) * np.dot(k, k)
+        t = np.dot(rmat, t)
+        rotlink = np.dot(rmat, link)
+        ue = np.array(u_beam[0:3]) + rotlink - link
+        a_beam[:, 3:6] = np.cross(rotlink, -np.identity(3))
+        if jtype == 27:
+            ue += warp_fun * u_beam[6] * t
+            a_beam[:, 3:6] += np.cross(warp_fun * u_beam[6] * t, -np.identity(3))
+            a_beam[:, 6] = -warp_fun * t
+    return [ue, a_beam]
+
+
+class TestWikcMpc(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.n = 50
+        self.x_cont = rng.normal(size=(self.n, 3))
+        self.x_beam = rng.normal(size=3)
+        self.u_beam = rng.normal(size=(self.n, 7)) * 0.3
+        self.u_beam[0, 3:6] = 0.
+        self.warp_fun = rng.normal(size=self.n)
+        self.t_vec = np.array([0.6, 0., 0.8])
+
+    def test_skew_and_rotation(self):
+        v = np.array([[1., 2., 3.], [-0.5, 0.2, 0.1]])
+        a = np.array([[0.3, -1., 2.], [1., 1., 1.]])
+        np.testing.assert_allclose(np.einsum('nij,nj->ni', skew(v), a), np.cross(v, a))
+        rmat = rvec2rmat(np.array([[0., 0., np.pi / 2.], [0., 0., 0.], [0.3, -0.2, 1.1]]))
+        np.testing.assert_allclose(np.dot(rmat[0], [1., 0., 0.]), [0., 1., 0.], atol=1.e-15)
+        np.testing.assert_array_equal(rmat[1], np.identity(3))
+        np.testing.assert_allclose(np.dot(rmat[2], rmat[2].T), np.identity(3), atol=1.e-15)
+        pass
+
+    def test_matches_subroutine(self):
+        for jtype in JTYPES:
+            ue, a_beam = wikc_mpc(jtype, self.x_cont, self.x_beam, self.u_beam[:, 0:3], self.u_beam[:, 3:6],
+                                  self.u_beam[:, 6], self.warp_fun, self.t_vec)
+            for i in range(self.n):
+                ue_i, a_beam_i = fortran_mpc(jtype, self.x_cont[i], self.x_beam, self.u_beam[i], self.warp_fun[i],
+                                             self.t_vec)
+                np.testing.assert_allclose(ue[i], ue_i, rtol=1.e-12, atol=1.e-14)
+                np.testing.assert_allclose(a_beam[i], a_beam_i, rtol=1.e-12, atol=1.e-14)
+        pass
+
+    def test_linearization(self):
+        # At the reference configuration A of the beam node is -dUE/dU, the linear UE neglects the link along z
+        h = 1.e-7
+        x_cont = self.x_cont.copy()
+        x_cont[:, 2] = self.x_beam[2]
+        for jtype in JTYPES:
+            a_beam = wikc_mpc(jtype, x_cont, self.x_beam, np.zeros(3), np.zeros(3), 0., self.warp_fun, self.t_vec)[1]
+            for dof in range(7):
+                du = np.zeros(7)
+                du[dof] = h
+                ue = wikc_mpc(jtype, x_cont, self.x_beam, du[0:3], du[3:6], du[6], self.warp_fun, self.t_vec)[0]
+                np.testing.assert_allclose(-ue / h, a_beam[:, :, dof], atol=1.e-6)
+        pass
+
+    def test_coupling_violation(self):
+        nodes = {10: [1., 2., 0.], 11: [-1., 2., 0.], 12: [0.5, -2., 0.]}
+        couple = ICoupling({1: [0., 0., 0.]}, nodes, np.array([0., 0., 1.]), True, True)
+        x_cont = np.array(list(nodes.values()))
+        disp_beam, rot_beam, w_beam = np.array([0.1, 0., 0.2]), np.array([0., 0., 0.5]), 0.01
+        ue = coupling_mpc(couple, x_cont, np.zeros(3), disp_beam, rot_beam, w_beam)[0]
+        u_beam = np.concatenate((disp_beam, rot_beam, [w_beam]))
+        for i in range(len(x_cont)):
+            ue_i = fortran_mpc(27, x_cont[i], np.zeros(3), u_beam, couple.warping_fun[i], [0., 0., 1.])[0]
+            np.testing.assert_allclose(ue[i], ue_i, atol=1.e-15)
+        violation = wikc_violation(27, x_cont, np.zeros(3), ue, disp_beam, rot_beam, w_beam, couple.warping_fun)
+        np.testing.assert_array_equal(violation, np.zeros((3, 3)))
+        pass
+
+
+class TestConstraintResiduals(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = AbaqusInpToComponentReader()
+        self.reader.read(macro_inp_file, macro_cdef_file)
+        dir_maker(out_dir)
+
+    def _write_results(self, file_name, n_frames):
+        """ Writes a result table where the continuum nodes follow the nonlinear form of the couplings. """
+        rng = np.random.default_rng(2)
+        nodes = global_node_coords(self.reader)
+        rows = []
+        for frame in range(n_frames):
+            # Nodes that are not in a coupling are skipped
+            for node in range(10 ** 6, 10 ** 6 + 20):
+                rows.append([frame, node] + [0.] * 7)
+            for c in self.reader.components:
+                for couple in c.couplings:
+                    u_beam = rng.normal(size=7) * 0.1 * (frame + 1)
+                    rows.append([frame, couple.beam_id] + u_beam.tolist())
+                    x_cont = nodes.coords[nodes.rows(couple.continuum_nodes.ids)]
+                    ue = coupling_mpc(couple, x_cont, nodes[couple.beam_id], u_beam[0:3], u_beam[3:6], u_beam[6])[0]
+                    for node, u in zip(couple.continuum_nodes.ids.tolist(), ue.tolist()):
+                        rows.append([frame, node] + u + [0.] * 4)
+        order = rng.permutation(len(rows))
+        with open(os.path.join(out_dir, file_name), 'w') as f:
+            f.write('frame, node, U1, U2, U3, UR1, UR2, UR3, W\n')
+            f.writelines(', '.join(repr(v) for v in rows[i]) + '\n' for i in order.tolist())
+        return os.path.join(out_dir, file_name)
+
+    def test_residuals(self):
+        results_file = self._write_results('results.csv', 2)
+        report = check_result_constraints(self.reader, results_file)
+        n_nodes = [len(couple.continuum_nodes) for c in self.reader.components for couple in c.couplings]
+        self.assertEqual(sorted(report['frames']), [0., 1.])
+        self.assertEqual(len(report['interfaces']), 4)
+        np.testing.assert_array_equal(report['counts'], [n_nodes, n_nodes])
+        self.assertLess(np.max(report['nonlinear']['max']), 1.e-9)
+        self.assertTrue(np.all(report['linear']['max'] > 1.e-3))
+        self.assertTrue(np.all(report['linear']['rms'] <= report['linear']['max']))
+        pass
+
+    def test_chunked_residuals(self):
+        results_file = self._write_results('results.csv', 3)
+        report = check_result_constraints(self.reader, results_file)
+        with open(results_file, 'rb') as f_in, gzip.open(results_file + '.gz', 'wb') as f_out:
+            f_out.write(f_in.read())
+        chunked_report = check_result_constraints(self.reader, results_file + '.gz', chunk_rows=7)
+        self.assertEqual(chunked_report['frames'], report['frames'])
+        np.testing.assert_array_equal(chunked_report['counts'], report['counts'])
+        for form in ['linear', 'nonlinear']:
+            np.testing.assert_array_equal(chunked_report[form]['max'], report[form]['max'])
+            np.testing.assert_allclose(chunked_report[form]['rms'], report[form]['rms'], rtol=1.e-12)
+        pass